@@ -15,8 +15,27 @@ class Settings:
     
     # JWT配置
     SECRET_KEY: str = os.getenv("SECRET_KEY", "your-secret-key-here")
+    # 轮换 SECRET_KEY 期间填旧密钥：托管私钥与公开记录先按新密钥、再按旧密钥解密，轮换任务完成后移除
+    SECRET_KEY_PREVIOUS: Optional[str] = os.getenv("SECRET_KEY_PREVIOUS") or None
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
+    # 私钥校验结果缓存：同一用户重复提交同一私钥时跳过哈希与地址推导（椭圆曲线运算）
+    PRIVATE_KEY_VERIFY_CACHE_TTL_SECONDS: float = float(os.getenv("PRIVATE_KEY_VERIFY_CACHE_TTL_SECONDS", "300"))
+    PRIVATE_KEY_VERIFY_CACHE_SIZE: int = int(os.getenv("PRIVATE_KEY_VERIFY_CACHE_SIZE", "1024"))
+    # 由私钥派生的 Fernet 对象缓存：列表、汇总逐条解密时不再重复派生密钥
+    CIPHER_CACHE_SIZE: int = int(os.getenv("CIPHER_CACHE_SIZE", "256"))
+    CIPHER_CACHE_TTL_SECONDS: float = float(os.getenv("CIPHER_CACHE_TTL_SECONDS", "600"))
+    # 新写入密文的格式：aesgcm（版本化二进制信封）或 fernet（旧格式）；读取时自动识别
+    STORAGE_ENCRYPTION_FORMAT: str = os.getenv("STORAGE_ENCRYPTION_FORMAT", "aesgcm").lower()
+    # 二进制大字段（PDF）分段加密的段大小：下载任意区间时最多多解密两段
+    STORAGE_SEGMENT_SIZE: int = int(os.getenv("STORAGE_SEGMENT_SIZE", str(64 * 1024)))
+    # 列表接口批量解密：线程池大小，以及一页中至少有多少条密文记录才分发到线程池（单条详情仍在当前线程解密）
+    RECORD_DECRYPT_WORKERS: int = max(1, int(os.getenv("RECORD_DECRYPT_WORKERS", str(min(8, os.cpu_count() or 1)))))
+    RECORD_DECRYPT_PARALLEL_MIN_RECORDS: int = int(os.getenv("RECORD_DECRYPT_PARALLEL_MIN_RECORDS", "2"))
+    # 后台把旧的 Fernet 密文改写为信封格式：是否启用、每批行数、两批之间的间隔
+    STORAGE_MIGRATION_ENABLED: bool = os.getenv("STORAGE_MIGRATION_ENABLED", "true").lower() in {"1", "true", "yes"}
+    STORAGE_MIGRATION_BATCH_SIZE: int = int(os.getenv("STORAGE_MIGRATION_BATCH_SIZE", "50"))
+    STORAGE_MIGRATION_PAUSE_SECONDS: float = float(os.getenv("STORAGE_MIGRATION_PAUSE_SECONDS", "0.5"))
 
     # 初始管理员账号
     ADMIN_USERNAME: str = os.getenv("ADMIN_USERNAME", "admin")
@@ -30,9 +49,52 @@ class Settings:
 
     # 链上配置（Ganache / EVM）
     WEB3_PROVIDER_URI: str = os.getenv("WEB3_PROVIDER_URI", "http://127.0.0.1:7545")
+    # 多节点：逗号分隔，可用 "uri|权重" 指定读请求权重；第一个为写交易的主节点。未配置时只用 WEB3_PROVIDER_URI
+    WEB3_PROVIDER_URIS: Optional[str] = os.getenv("WEB3_PROVIDER_URIS")
     HEALTH_DATA_CONTRACT_ADDRESS: Optional[str] = os.getenv("HEALTH_DATA_CONTRACT_ADDRESS")
     # 合约 ABI 建议用 JSON 字符串放环境变量；未配置时后端自动降级为“仅数据库模式”
     HEALTH_DATA_CONTRACT_ABI_JSON: Optional[str] = os.getenv("HEALTH_DATA_CONTRACT_ABI_JSON")
+    WEB3_REQUEST_TIMEOUT_SECONDS: float = float(os.getenv("WEB3_REQUEST_TIMEOUT_SECONDS", "10"))
+    # async 路由使用的链上连接池：同时在途的 RPC 上限、keep-alive 时长与等待交易回执的超时
+    WEB3_MAX_CONCURRENT_CALLS: int = int(os.getenv("WEB3_MAX_CONCURRENT_CALLS", "16"))
+    WEB3_KEEPALIVE_SECONDS: float = float(os.getenv("WEB3_KEEPALIVE_SECONDS", "30"))
+    WEB3_RECEIPT_TIMEOUT_SECONDS: float = float(os.getenv("WEB3_RECEIPT_TIMEOUT_SECONDS", "120"))
+    # 链上节点熔断：连续失败次数阈值、断开后放行试探请求的冷却时间、后台探活间隔
+    CHAIN_BREAKER_FAILURE_THRESHOLD: int = int(os.getenv("CHAIN_BREAKER_FAILURE_THRESHOLD", "3"))
+    CHAIN_BREAKER_RESET_SECONDS: float = float(os.getenv("CHAIN_BREAKER_RESET_SECONDS", "30"))
+    CHAIN_BREAKER_PROBE_SECONDS: float = float(os.getenv("CHAIN_BREAKER_PROBE_SECONDS", "5"))
+    # 固定 gas price（gwei）；置空时使用节点的 eth_gasPrice，并与 chain id 一起按 TTL 缓存
+    WEB3_GAS_PRICE_GWEI: str = os.getenv("WEB3_GAS_PRICE_GWEI", "2")
+    WEB3_CHAIN_PARAMS_CACHE_SECONDS: float = float(os.getenv("WEB3_CHAIN_PARAMS_CACHE_SECONDS", "60"))
+    # 批量上链（合约 storeHealthDataBatch / updateHealthDataBatch）：每笔交易最多条数（合约上限 100）、
+    # 单笔 gas 上限（估算超出时对半拆分）、估算值的放大系数
+    CHAIN_BATCH_MAX_RECORDS: int = int(os.getenv("CHAIN_BATCH_MAX_RECORDS", "50"))
+    CHAIN_BATCH_GAS_LIMIT: int = int(os.getenv("CHAIN_BATCH_GAS_LIMIT", "6000000"))
+    CHAIN_BATCH_GAS_MARGIN: float = float(os.getenv("CHAIN_BATCH_GAS_MARGIN", "1.2"))
+    # 链上校验结果缓存：按 (onchain_data_id, data_hash) 缓存，重新上链时主动失效
+    ONCHAIN_VERIFY_CACHE_TTL_SECONDS: int = int(os.getenv("ONCHAIN_VERIFY_CACHE_TTL_SECONDS", "300"))
+    ONCHAIN_VERIFY_CACHE_SIZE: int = int(os.getenv("ONCHAIN_VERIFY_CACHE_SIZE", "10000"))
+    # direct 模式下的写链方式：async 先入库再由后台发件箱任务发送交易；sync 在请求内等待交易确认
+    ONCHAIN_WRITE_MODE: str = os.getenv("ONCHAIN_WRITE_MODE", "async").lower()
+    ONCHAIN_OUTBOX_POLL_SECONDS: float = float(os.getenv("ONCHAIN_OUTBOX_POLL_SECONDS", "2"))
+    ONCHAIN_OUTBOX_BATCH_SIZE: int = int(os.getenv("ONCHAIN_OUTBOX_BATCH_SIZE", "20"))
+    ONCHAIN_OUTBOX_MAX_ATTEMPTS: int = int(os.getenv("ONCHAIN_OUTBOX_MAX_ATTEMPTS", "8"))
+    ONCHAIN_OUTBOX_BACKOFF_SECONDS: float = float(os.getenv("ONCHAIN_OUTBOX_BACKOFF_SECONDS", "5"))
+    ONCHAIN_OUTBOX_MAX_BACKOFF_SECONDS: float = float(os.getenv("ONCHAIN_OUTBOX_MAX_BACKOFF_SECONDS", "600"))
+    # 合约事件索引器：只处理确认深度之后的区块，把链上记录镜像到本地表，校验时查表代替 RPC
+    CHAIN_INDEXER_ENABLED: bool = os.getenv("CHAIN_INDEXER_ENABLED", "true").lower() in {"1", "true", "yes"}
+    CHAIN_INDEXER_START_BLOCK: int = int(os.getenv("CHAIN_INDEXER_START_BLOCK", "0"))
+    CHAIN_INDEXER_CONFIRMATIONS: int = int(os.getenv("CHAIN_INDEXER_CONFIRMATIONS", "6"))
+    CHAIN_INDEXER_BATCH_BLOCKS: int = int(os.getenv("CHAIN_INDEXER_BATCH_BLOCKS", "2000"))
+    CHAIN_INDEXER_POLL_SECONDS: float = float(os.getenv("CHAIN_INDEXER_POLL_SECONDS", "5"))
+    # 保留多少个区块内的事件快照用于重组回滚
+    CHAIN_INDEXER_REORG_HISTORY_BLOCKS: int = int(os.getenv("CHAIN_INDEXER_REORG_HISTORY_BLOCKS", "1000"))
+    # 上链方式：direct 每条记录单独发交易；merkle 按时间窗口把记录摘要聚合成 Merkle 树，只锚定根哈希
+    ONCHAIN_ANCHOR_MODE: str = os.getenv("ONCHAIN_ANCHOR_MODE", "direct").lower()
+    ONCHAIN_ANCHOR_WINDOW_SECONDS: int = int(os.getenv("ONCHAIN_ANCHOR_WINDOW_SECONDS", "60"))
+    ONCHAIN_ANCHOR_MAX_LEAVES: int = int(os.getenv("ONCHAIN_ANCHOR_MAX_LEAVES", "4096"))
+    # 发送锚定交易的平台钱包私钥；merkle 模式下未配置时记录只在本地排队、不会锚定
+    ONCHAIN_ANCHOR_PRIVATE_KEY: Optional[str] = os.getenv("ONCHAIN_ANCHOR_PRIVATE_KEY")
 
     # 跨域配置
     BACKEND_CORS_ORIGINS: list = ["http://localhost:3000", "http://localhost:8080"]
@@ -52,6 +52,12 @@ def _ensure_schema_updates() -> None:
             "is_public": "ALTER TABLE health_data_user ADD COLUMN is_public BOOLEAN NOT NULL DEFAULT 0",
             "onchain_data_id": "ALTER TABLE health_data_user ADD COLUMN onchain_data_id VARCHAR(66) NULL",
             "onchain_tx_hash": "ALTER TABLE health_data_user ADD COLUMN onchain_tx_hash VARCHAR(66) NULL",
+            "data_hash": "ALTER TABLE health_data_user ADD COLUMN data_hash VARCHAR(66) NULL",
+            "data_hash_version": "ALTER TABLE health_data_user ADD COLUMN data_hash_version VARCHAR(32) NULL",
+            "merkle_batch_id": "ALTER TABLE health_data_user ADD COLUMN merkle_batch_id INT NULL",
+            "onchain_status": "ALTER TABLE health_data_user ADD COLUMN onchain_status VARCHAR(16) NULL",
+            "merkle_proof": "ALTER TABLE health_data_user ADD COLUMN merkle_proof TEXT NULL",
+            "wrapped_data_key": "ALTER TABLE health_data_user ADD COLUMN wrapped_data_key TEXT NULL",
         }
 
         with engine.begin() as conn:
@@ -60,6 +66,21 @@ def _ensure_schema_updates() -> None:
                     conn.execute(text(sql))
 
 
+def _ensure_composite_indexes() -> None:
+    """为已存在的旧表补建模型里声明的复合索引（create_all 只会给新表建索引）。"""
+    from app import models  # noqa: F401
+
+    inspector = inspect(engine)
+    table_names = set(inspector.get_table_names())
+    for table in Base.metadata.sorted_tables:
+        if table.name not in table_names:
+            continue
+        existing = {item["name"] for item in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if len(index.columns) > 1 and index.name not in existing:
+                index.create(bind=engine)
+
+
 def init_db() -> None:
     """Create all database tables defined by ORM models."""
     from app import models  # noqa: F401 - ensures model metadata is registered
@@ -67,6 +88,7 @@ def init_db() -> None:
 
     Base.metadata.create_all(bind=engine)
     _ensure_schema_updates()
+    _ensure_composite_indexes()
 
     db = SessionLocal()
     try:
@@ -1,9 +1,11 @@
 from fastapi import APIRouter, Depends, Query
+from fastapi.responses import PlainTextResponse
 from sqlalchemy.orm import Session
 
 from app.database import get_db
 from app.features.admin.service import AdminSystemService
 from app.features.auth.dependencies import get_current_admin
+from app.features.blockchain.service import chain_service
 from app.schemas import AdminSystemLogResponse, AdminSystemSettings
 
 
@@ -54,3 +56,9 @@ async def list_admin_system_logs(
     )
     db.commit()
     return service.list_logs(limit=limit, module=module)
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def get_admin_system_metrics(current_admin=Depends(get_current_admin)):
+    """Prometheus 文本格式的运行指标，包含各链上节点的熔断器状态与读请求延迟。"""
+    return PlainTextResponse(chain_service.pool.render_metrics(), media_type="text/plain; version=0.0.4")
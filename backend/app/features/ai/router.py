@@ -1,5 +1,5 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy import or_
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from sqlalchemy import func, or_
 from sqlalchemy.orm import Session
 from typing import List, Optional
 from datetime import datetime
@@ -8,13 +8,18 @@ import json
 from app.database import get_db
 from app import models, schemas
 from app.features.auth.dependencies import get_current_user
+from app.features.health_data.metrics import record_metrics
+from app.pagination import paginate_keyset
 
 
 router = APIRouter()
 
 
 def _extract_metrics_from_record(record: models.HealthData) -> dict:
-    if not record.data_content:
+    # 优先读指标时序表；AI 接口不持有用户私钥，只使用公开记录的指标
+    metrics = record_metrics(record, public_only=True)
+    if metrics or not record.data_content:
+        return metrics
         return {}
     try:
         payload = json.loads(record.data_content)
@@ -32,7 +37,7 @@ def _load_public_health_records(db: Session, user_id: int, limit: int = 10) -> l
         .filter(
             models.HealthData.user_id == user_id,
             models.HealthData.is_public.is_(True),
-            models.HealthData.data_content.isnot(None),
+            or_(models.HealthData.data_content.isnot(None), models.HealthData.metric_points.any()),
         )
         .order_by(models.HealthData.created_at.desc())
         .limit(limit)
@@ -201,15 +206,30 @@ async def get_chat_history(
 @router.get("/chat/{chat_id}/messages")
 async def get_chat_messages(
     chat_id: int,
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=500),
+    cursor: Optional[str] = None,
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_user)
 ):
-    """获取特定对话的消息"""
+    """获取特定对话的消息；传入 limit 时按游标分页，下一页游标通过 X-Next-Cursor 响应头返回"""
     # 获取从该消息ID开始的所有消息
-    messages = db.query(models.ChatMessage).filter(
+    query = db.query(models.ChatMessage).filter(
         models.ChatMessage.user_id == current_user.id,
         models.ChatMessage.id >= chat_id
-    ).order_by(models.ChatMessage.created_at.asc()).all()
+    )
+    if limit is None:
+        messages = query.order_by(models.ChatMessage.created_at.asc(), models.ChatMessage.id.asc()).all()
+    else:
+        messages, next_cursor = paginate_keyset(
+            query,
+            (models.ChatMessage.created_at, models.ChatMessage.id),
+            limit=limit,
+            cursor=cursor,
+            descending=False,
+        )
+        if next_cursor:
+            response.headers["X-Next-Cursor"] = next_cursor
     
     return [
         {
@@ -365,10 +385,13 @@ async def analyze_health_data(
     if current_user.id != user_id and current_user.role != "admin":
         raise HTTPException(status_code=403, detail="无权分析其他用户的数据")
     
-    # 获取健康数据
+    # 获取健康数据：总数用 SQL 统计，趋势只需要最近两条
+    record_count = db.query(func.count(models.HealthData.id)).filter(
+        models.HealthData.user_id == user_id
+    ).scalar()
     health_records = db.query(models.HealthData).filter(
         models.HealthData.user_id == user_id
-    ).order_by(models.HealthData.created_at.desc()).all()
+    ).order_by(models.HealthData.created_at.desc()).limit(2).all()
     
     if not health_records:
         return {"analysis": "暂无健康数据可供分析", "insights": []}
@@ -409,10 +432,10 @@ async def analyze_health_data(
     insights.append(f"健康评分：{health_score}/100分")
     
     return {
-        "analysis": f"基于您最近的{len(health_records)}条健康数据记录进行分析",
+        "analysis": f"基于您最近的{record_count}条健康数据记录进行分析",
         "insights": insights,
         "health_score": health_score,
-        "data_points": len(health_records)
+        "data_points": record_count
     }
 
 
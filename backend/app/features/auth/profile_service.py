@@ -17,7 +17,7 @@ class UserProfileService:
     @staticmethod
     def _resolve_private_key(user: models.User, provided_private_key: str | None) -> str:
         if provided_private_key:
-            if not verify_user_private_key(provided_private_key, user.wallet_address, user.private_key_hash):
+            if not verify_user_private_key(provided_private_key, user.wallet_address, user.private_key_hash, user.id):
                 raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="私钥校验失败")
             return normalize_private_key(provided_private_key)
 
@@ -7,6 +7,7 @@ from app.config import settings
 from app.database import get_db
 from app import models
 from app.features.auth.dependencies import create_access_token, get_current_admin, get_current_user
+from app.pagination import paginate_keyset
 from app.schemas import (
     AdminUserListResponse,
     AdminUserResponse,
@@ -208,6 +209,7 @@ async def list_admin_users(
     keyword: str = Query(""),
     status_filter: str = Query("", alias="status"),
     role: str = Query(""),
+    cursor: str | None = Query(None),
     db: Session = Depends(get_db),
     _: models.User = Depends(get_current_admin),
 ):
@@ -229,14 +231,21 @@ async def list_admin_users(
         query = query.filter(models.User.role == role)
 
     total = query.count()
-    items = (
-        query.order_by(models.User.created_at.desc())
-        .offset((page - 1) * page_size)
-        .limit(page_size)
-        .all()
+    items, next_cursor = paginate_keyset(
+        query,
+        (models.User.created_at, models.User.id),
+        limit=page_size,
+        cursor=cursor,
+        offset=(page - 1) * page_size,
     )
 
-    return AdminUserListResponse(items=items, total=total, page=page, page_size=page_size)
+    return AdminUserListResponse(
+        items=items,
+        total=total,
+        page=page,
+        page_size=page_size,
+        next_cursor=next_cursor,
+    )
 
 
 @router.get("/admin/users/{user_id}", response_model=AdminUserResponse)
@@ -1,8 +1,7 @@
-import base64
 import hashlib
 from datetime import datetime, timedelta
 
-from cryptography.fernet import Fernet, InvalidToken
+from cryptography.fernet import Fernet, InvalidToken, MultiFernet
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from passlib.exc import UnknownHashError
@@ -11,7 +10,12 @@ from eth_account import Account
 
 from app import models, schemas
 from app.config import settings
-from app.features.blockchain.encryption import normalize_private_key, private_key_hash
+from app.features.blockchain.encryption import (
+    build_fernet_from_secret,
+    invalidate_verified_private_keys,
+    normalize_private_key,
+    private_key_hash,
+)
 
 
 pwd_context = CryptContext(schemes=["pbkdf2_sha256"], deprecated="auto")
@@ -28,8 +32,15 @@ class AuthService:
 
     @staticmethod
     def _build_server_fernet() -> Fernet:
-        digest = hashlib.sha256((settings.SECRET_KEY or "").encode("utf-8")).digest()
-        return Fernet(base64.urlsafe_b64encode(digest))
+        return build_fernet_from_secret(settings.SECRET_KEY or "")
+
+    @staticmethod
+    def _build_server_fernet_for_read() -> MultiFernet:
+        # 轮换期间兼容旧密钥加密的托管私钥；加密始终只用当前 SECRET_KEY
+        fernets = [build_fernet_from_secret(settings.SECRET_KEY or "")]
+        if settings.SECRET_KEY_PREVIOUS:
+            fernets.append(build_fernet_from_secret(settings.SECRET_KEY_PREVIOUS))
+        return MultiFernet(fernets)
 
     @classmethod
     def encrypt_private_key_for_storage(cls, private_key: str) -> str:
@@ -38,7 +49,7 @@ class AuthService:
     @classmethod
     def decrypt_private_key_from_storage(cls, encrypted_value: str) -> str:
         try:
-            return cls._build_server_fernet().decrypt((encrypted_value or "").encode("utf-8")).decode("utf-8")
+            return cls._build_server_fernet_for_read().decrypt((encrypted_value or "").encode("utf-8")).decode("utf-8")
         except InvalidToken as exc:
             raise ValueError("私钥存储损坏，无法解密") from exc
 
@@ -151,6 +162,8 @@ class AuthService:
         self.db.add(db_user)
         self.db.commit()
         self.db.refresh(db_user)
+        # 删除账号后主键可能被复用，新钱包不能沿用旧的私钥校验缓存
+        invalidate_verified_private_keys(db_user.id)
 
         return db_user, generated_private_key
 
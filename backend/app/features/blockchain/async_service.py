@@ -0,0 +1,332 @@
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Optional
+
+import aiohttp
+from anyio import to_thread
+from eth_abi import decode as abi_decode
+from web3 import AsyncHTTPProvider, AsyncWeb3, Web3
+
+from app.config import settings
+from app.features.blockchain.breaker import ChainUnavailableError
+from app.features.blockchain.cache import TTLCache
+from app.features.blockchain.pool import RpcEndpoint
+from app.features.blockchain.service import (
+    HealthDataChainService,
+    chain_service,
+    is_nonce_error,
+    raw_transaction_bytes,
+)
+
+
+# 供 async 路由使用的链上服务：AsyncWeb3 + 共享的 aiohttp 连接池（keep-alive），每次调用有超时，
+# 并用信号量限制同时在途的 RPC 数量，节点变慢时只影响等待链上结果的请求，不阻塞事件循环。
+# 合约编码、记录格式化、nonce 分配、本地事件镜像与节点池（选点、熔断、延迟统计）复用同步服务，后台线程仍使用同步服务。
+
+# 连接失败与超时计入熔断；HTTP 状态错误说明节点可达
+_TRANSPORT_ERRORS = (aiohttp.ClientConnectionError, asyncio.TimeoutError, ConnectionError)
+
+
+class AsyncHealthDataChainService:
+    def __init__(self, sync_service: HealthDataChainService) -> None:
+        self._sync = sync_service
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        # 每个节点一套 AsyncWeb3 与合约对象，共用同一个 aiohttp 连接池
+        self._clients: dict[str, tuple[AsyncWeb3, Any]] = {}
+        self._chain_params = TTLCache(maxsize=4, ttl_seconds=settings.WEB3_CHAIN_PARAMS_CACHE_SECONDS)
+
+    @property
+    def enabled(self) -> bool:
+        return self._sync.enabled
+
+    async def _ensure_client(self) -> None:
+        # 连接池与信号量绑定事件循环，按当前循环惰性创建（测试客户端等场景可能更换循环）
+        loop = asyncio.get_running_loop()
+        if self._loop is loop and self._session is not None and not self._session.closed:
+            return
+        self._loop = loop
+        self._session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(
+                limit=settings.WEB3_MAX_CONCURRENT_CALLS,
+                keepalive_timeout=settings.WEB3_KEEPALIVE_SECONDS,
+            ),
+            timeout=aiohttp.ClientTimeout(total=settings.WEB3_REQUEST_TIMEOUT_SECONDS),
+        )
+        self._semaphore = asyncio.Semaphore(settings.WEB3_MAX_CONCURRENT_CALLS)
+        self._clients = {}
+        for endpoint in self._sync.pool.endpoints:
+            provider = AsyncHTTPProvider(
+                endpoint.uri,
+                request_kwargs={"timeout": aiohttp.ClientTimeout(total=settings.WEB3_REQUEST_TIMEOUT_SECONDS)},
+            )
+            await provider.cache_async_session(self._session)
+            web3 = AsyncWeb3(provider)
+            self._clients[endpoint.uri] = (
+                web3,
+                web3.eth.contract(address=self._sync.contract.address, abi=self._sync.contract.abi),
+            )
+
+    def _web3_for(self, endpoint: RpcEndpoint) -> AsyncWeb3:
+        return self._clients[endpoint.uri][0]
+
+    def _contract_for(self, endpoint: RpcEndpoint) -> Any:
+        return self._clients[endpoint.uri][1]
+
+    async def _call_endpoints(
+        self,
+        endpoints: list[RpcEndpoint],
+        operation: Callable[[RpcEndpoint], Awaitable[Any]],
+        timeout: float,
+        *,
+        track_latency: bool,
+    ) -> Any:
+        # 与同步服务 _call_endpoints 相同的故障转移规则
+        last_error: Optional[BaseException] = None
+        for endpoint in endpoints:
+            if not endpoint.breaker.allow_request():
+                continue
+            started = time.perf_counter()
+            try:
+                result = await asyncio.wait_for(operation(endpoint), timeout)
+            except _TRANSPORT_ERRORS as exc:
+                endpoint.breaker.record_failure(exc)
+                last_error = exc
+                continue
+            except Exception:
+                endpoint.breaker.record_success()
+                raise
+            endpoint.breaker.record_success()
+            if track_latency:
+                self._sync.pool.record_latency(endpoint, time.perf_counter() - started)
+            return result
+        raise ChainUnavailableError("链上节点暂不可用") from last_error
+
+    async def _read(self, operation: Callable[[RpcEndpoint], Awaitable[Any]]) -> Any:
+        async with self._semaphore:
+            return await self._call_endpoints(
+                self._sync.pool.read_endpoints(),
+                operation,
+                settings.WEB3_REQUEST_TIMEOUT_SECONDS,
+                track_latency=True,
+            )
+
+    async def _write(self, operation: Callable[[RpcEndpoint], Awaitable[Any]]) -> Any:
+        async with self._semaphore:
+            return await self._call_endpoints(
+                self._sync.pool.write_endpoints(),
+                operation,
+                settings.WEB3_REQUEST_TIMEOUT_SECONDS,
+                track_latency=False,
+            )
+
+    async def _post_batch(self, uri: str, payload: Any) -> Any:
+        async with self._session.post(uri, json=payload) as response:
+            if response.status >= 400:
+                raise ValueError(f"节点不支持 JSON-RPC 批量请求：HTTP {response.status}")
+            return await response.json(content_type=None)
+
+    async def _post_rpc(self, payload: Any) -> Any:
+        return await self._read(lambda endpoint: self._post_batch(endpoint.uri, payload))
+
+    async def get_health_record(self, *, data_id_hex: str, use_index: bool = True) -> dict[str, Any] | None:
+        records = await self.get_health_records_batch(data_id_hexes=[data_id_hex], use_index=use_index)
+        return records.get(data_id_hex)
+
+    async def get_health_records_batch(
+        self,
+        *,
+        data_id_hexes: list[str],
+        use_index: bool = True,
+    ) -> dict[str, dict[str, Any] | None]:
+        """与同步版本语义一致：先查本地事件镜像，其余合并为一次 JSON-RPC 批量请求。"""
+        if not self.enabled or not data_id_hexes:
+            return {}
+
+        unique_ids = list(dict.fromkeys(data_id_hexes))
+        results: dict[str, dict[str, Any] | None] = {}
+        if use_index and self._sync.index_enabled:
+            results.update(await to_thread.run_sync(self._sync.read_indexed, unique_ids))
+        unique_ids = [data_id for data_id in unique_ids if data_id not in results]
+        if not unique_ids:
+            return results
+
+        await self._ensure_client()
+        contract = self._sync.contract
+        payload = [
+            {
+                "jsonrpc": "2.0",
+                "id": index,
+                "method": "eth_call",
+                "params": [
+                    {
+                        "to": contract.address,
+                        "data": contract.encodeABI(fn_name="healthRecords", args=[self._sync.to_bytes32(data_id)]),
+                    },
+                    "latest",
+                ],
+            }
+            for index, data_id in enumerate(unique_ids)
+        ]
+        try:
+            replies = await self._post_rpc(payload)
+            if not isinstance(replies, list):
+                raise ValueError("节点不支持 JSON-RPC 批量请求")
+        except ValueError:
+            # 个别节点不支持批量请求时退回并发的逐条读取
+            raws = await asyncio.gather(
+                *(
+                    self._read(
+                        lambda endpoint, data_id=data_id: self._contract_for(endpoint)
+                        .functions.healthRecords(self._sync.to_bytes32(data_id))
+                        .call()
+                    )
+                    for data_id in unique_ids
+                )
+            )
+            results.update({data_id: self._sync.format_health_record(raw) for data_id, raw in zip(unique_ids, raws)})
+            return results
+
+        output_types = self._sync.health_record_output_types()
+        for reply in replies:
+            data_id = unique_ids[int(reply["id"])]
+            if reply.get("error"):
+                raise RuntimeError(reply["error"].get("message") or "链上读取失败")
+            raw = abi_decode(output_types, Web3.to_bytes(hexstr=reply.get("result") or "0x"))
+            results[data_id] = self._sync.format_health_record(raw)
+        return results
+
+    async def _cached_chain_param(self, key: str, fetch: Callable[[AsyncWeb3], Awaitable[Any]]) -> Any:
+        value = self._chain_params.get(key)
+        if value is None:
+            value = await self._write(lambda endpoint: fetch(self._web3_for(endpoint)))
+            self._chain_params.set(key, value)
+        return value
+
+    async def _build_tx_options(self, from_address: str, nonce: int) -> dict[str, Any]:
+        if settings.WEB3_GAS_PRICE_GWEI:
+            gas_price = Web3.to_wei(settings.WEB3_GAS_PRICE_GWEI, "gwei")
+        else:
+            gas_price = await self._cached_chain_param("gas_price", lambda web3: web3.eth.gas_price)
+        return {
+            "from": from_address,
+            "nonce": nonce,
+            "gas": 400000,
+            "gasPrice": gas_price,
+            "chainId": await self._cached_chain_param("chain_id", lambda web3: web3.eth.chain_id),
+        }
+
+    async def _sign_and_send(self, function_call: Any, owner_private_key: str, from_address: str) -> tuple[Any, int]:
+        nonce_manager = self._sync.nonce_manager
+        # nonce 分配与后台线程共用同一个管理器；首次分配需要查询节点，放到线程池里执行
+        nonce = await to_thread.run_sync(nonce_manager.allocate, from_address)
+        try:
+            tx = await function_call.build_transaction(await self._build_tx_options(from_address, nonce))
+            raw = raw_transaction_bytes(self._sync.web3.eth.account.sign_transaction(tx, private_key=owner_private_key))
+            return await self._write(lambda endpoint: self._web3_for(endpoint).eth.send_raw_transaction(raw)), nonce
+        except Exception as exc:
+            nonce_manager.release(from_address, nonce)
+            if is_nonce_error(exc):
+                nonce_manager.resync(from_address)
+            raise
+
+    async def _send_transaction(self, function_call: Any, owner_private_key: str) -> dict[str, Any] | None:
+        if not self.enabled:
+            return None
+
+        account = self._sync.web3.eth.account.from_key(owner_private_key)
+        try:
+            tx_hash, nonce = await self._sign_and_send(function_call, owner_private_key, account.address)
+        except Exception as exc:  # noqa: BLE001
+            if not is_nonce_error(exc):
+                raise
+            tx_hash, nonce = await self._sign_and_send(function_call, owner_private_key, account.address)
+        try:
+            # 等待回执期间不占用并发名额，慢交易不会挤占读请求
+            receipt = await self._call_endpoints(
+                self._sync.pool.write_endpoints(),
+                lambda endpoint: self._web3_for(endpoint).eth.wait_for_transaction_receipt(
+                    tx_hash, timeout=settings.WEB3_RECEIPT_TIMEOUT_SECONDS
+                ),
+                settings.WEB3_RECEIPT_TIMEOUT_SECONDS,
+                track_latency=False,
+            )
+        finally:
+            self._sync.nonce_manager.confirm(account.address, nonce)
+        return {
+            "tx_hash": receipt.transactionHash.hex(),
+            "status": receipt.status,
+            "receipt": receipt,
+            "owner": account.address,
+        }
+
+    def _extract_data_stored_event(self, receipt: Any) -> Optional[str]:
+        try:
+            events = self._sync.contract.events.DataStored().process_receipt(receipt)
+            if not events:
+                return None
+            data_id = events[0]["args"].get("dataId")
+            return Web3.to_hex(data_id) if data_id is not None else None
+        except Exception:
+            return None
+
+    async def store_health_data(
+        self,
+        *,
+        owner_private_key: str,
+        data_hash_hex: str,
+        data_type: str,
+        encrypted_digest_source: Optional[str] = None,
+        encrypted_digest_hex: Optional[str] = None,
+    ) -> dict[str, Any] | None:
+        if not self.enabled:
+            return None
+
+        await self._ensure_client()
+        function_call = self._contract_for(self._sync.pool.primary).functions.storeHealthData(
+            self._sync.to_bytes32(data_hash_hex),
+            self._sync.resolve_encrypted_digest(encrypted_digest_source, encrypted_digest_hex),
+            data_type,
+        )
+        result = await self._send_transaction(function_call, owner_private_key)
+        if not result:
+            return None
+        result["data_id"] = self._extract_data_stored_event(result.get("receipt"))
+        result.pop("receipt", None)
+        return result
+
+    async def update_health_data(
+        self,
+        *,
+        owner_private_key: str,
+        data_id_hex: str,
+        data_hash_hex: str,
+        encrypted_digest_source: Optional[str] = None,
+        encrypted_digest_hex: Optional[str] = None,
+    ) -> dict[str, Any] | None:
+        if not self.enabled:
+            return None
+
+        await self._ensure_client()
+        function_call = self._contract_for(self._sync.pool.primary).functions.updateHealthData(
+            self._sync.to_bytes32(data_id_hex),
+            self._sync.to_bytes32(data_hash_hex),
+            self._sync.resolve_encrypted_digest(encrypted_digest_source, encrypted_digest_hex),
+        )
+        result = await self._send_transaction(function_call, owner_private_key)
+        if not result:
+            return None
+        result["data_id"] = data_id_hex
+        result.pop("receipt", None)
+        return result
+
+    async def close(self) -> None:
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+        self._loop = None
+        self._clients = {}
+
+
+async_chain_service = AsyncHealthDataChainService(chain_service)
@@ -0,0 +1,154 @@
+import logging
+import threading
+import time
+from typing import Any, Callable, Optional
+
+
+# 链上节点熔断器：连续 N 次连接类错误后断开，断开期间请求直接失败，不再等待 HTTP 超时；
+# 后台探测线程定期用 eth_blockNumber 探活，成功即恢复。探测线程未运行时，
+# 冷却期过后放行一个试探请求（半开），成功则恢复、失败则重新计时。
+
+logger = logging.getLogger(__name__)
+
+STATE_CLOSED = "closed"
+STATE_OPEN = "open"
+STATE_HALF_OPEN = "half_open"
+STATE_VALUES = {STATE_CLOSED: 0, STATE_OPEN: 1, STATE_HALF_OPEN: 2}
+
+
+class ChainUnavailableError(RuntimeError):
+    """熔断器断开时的快速失败。"""
+
+
+class CircuitBreaker:
+    def __init__(self, name: str, failure_threshold: int, reset_timeout_seconds: float) -> None:
+        self.name = name
+        self.failure_threshold = max(1, int(failure_threshold))
+        self.reset_timeout_seconds = float(reset_timeout_seconds)
+        self._lock = threading.Lock()
+        self._state = STATE_CLOSED
+        self._consecutive_failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._failures_total = 0
+        self._rejected_total = 0
+        self._opened_total = 0
+        self._last_error: Optional[str] = None
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._state
+
+    def allow_request(self) -> bool:
+        with self._lock:
+            if self._state == STATE_CLOSED:
+                return True
+            if (
+                self._state == STATE_OPEN
+                and not self._probe_in_flight
+                and time.monotonic() - self._opened_at >= self.reset_timeout_seconds
+            ):
+                self._state = STATE_HALF_OPEN
+                self._probe_in_flight = True
+                return True
+            self._rejected_total += 1
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            if self._state != STATE_CLOSED:
+                logger.info("Chain circuit %s closed", self.name)
+            self._state = STATE_CLOSED
+            self._consecutive_failures = 0
+            self._probe_in_flight = False
+
+    def record_failure(self, exc: Optional[BaseException] = None) -> None:
+        with self._lock:
+            self._failures_total += 1
+            self._consecutive_failures += 1
+            self._last_error = str(exc)[:200] if exc is not None else None
+            self._probe_in_flight = False
+            if self._state == STATE_HALF_OPEN or (
+                self._state == STATE_CLOSED and self._consecutive_failures >= self.failure_threshold
+            ):
+                if self._state == STATE_CLOSED:
+                    self._opened_total += 1
+                    logger.warning("Chain circuit %s opened after %s failures: %s", self.name, self._consecutive_failures, exc)
+                self._state = STATE_OPEN
+            if self._state == STATE_OPEN:
+                self._opened_at = time.monotonic()
+
+    def snapshot(self) -> dict[str, Any]:
+        with self._lock:
+            return {
+                "name": self.name,
+                "state": self._state,
+                "consecutive_failures": self._consecutive_failures,
+                "failures_total": self._failures_total,
+                "rejected_total": self._rejected_total,
+                "opened_total": self._opened_total,
+                "last_error": self._last_error,
+            }
+
+    def render_metrics(self) -> str:
+        return render_breaker_metrics([self])
+
+
+def render_breaker_metrics(breakers: list[CircuitBreaker]) -> str:
+    """Prometheus 文本格式，每个熔断器一组样本，以 provider 标签区分。"""
+    snapshots = [breaker.snapshot() for breaker in breakers]
+    lines: list[str] = []
+    for metric, kind, key in (
+        ("chain_circuit_state", "gauge", "state"),
+        ("chain_circuit_consecutive_failures", "gauge", "consecutive_failures"),
+        ("chain_circuit_failures_total", "counter", "failures_total"),
+        ("chain_circuit_rejected_total", "counter", "rejected_total"),
+        ("chain_circuit_opened_total", "counter", "opened_total"),
+    ):
+        if metric == "chain_circuit_state":
+            lines.append("# HELP chain_circuit_state 链上节点熔断器状态（0 闭合，1 断开，2 半开）")
+        lines.append(f"# TYPE {metric} {kind}")
+        for snapshot in snapshots:
+            value = STATE_VALUES[snapshot["state"]] if key == "state" else snapshot[key]
+            lines.append(f'{metric}{{provider="{snapshot["name"]}"}} {value}')
+    return "\n".join(lines) + "\n"
+
+
+class ChainHealthMonitor:
+    """断开期间在后台探活，节点恢复后立即闭合熔断器，不依赖用户请求去试探。多节点时逐个探测。"""
+
+    def __init__(self, targets: list[tuple[CircuitBreaker, Callable[[], Any]]], interval_seconds: float) -> None:
+        self._targets = targets
+        self._interval_seconds = interval_seconds
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def probe_once(self) -> bool:
+        """探测所有断开的节点，返回是否全部可用。"""
+        healthy = True
+        for breaker, probe in self._targets:
+            if breaker.state == STATE_CLOSED:
+                continue
+            try:
+                probe()
+            except Exception as exc:  # noqa: BLE001
+                breaker.record_failure(exc)
+                healthy = False
+                continue
+            breaker.record_success()
+        return healthy
+
+    def _run(self) -> None:
+        while not self._stop.wait(self._interval_seconds):
+            self.probe_once()
+
+    def start(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="chain-health-monitor", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
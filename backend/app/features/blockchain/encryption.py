@@ -1,9 +1,36 @@
 import base64
+import binascii
 import hashlib
+import os
+import secrets
+import struct
+from dataclasses import dataclass
+from typing import Callable, Iterator
 
+from cryptography.exceptions import InvalidTag
 from cryptography.fernet import Fernet, InvalidToken
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
 from eth_account import Account
 
+from app.config import settings
+from app.features.blockchain.cache import TTLCache
+
+# 两个进程内缓存都以私钥的带密钥哈希为键，哈希密钥每个进程随机生成，缓存里不保留可直接比对的私钥摘要。
+# 私钥校验结果缓存：键为 (用户 id, 带密钥哈希)，值为校验通过时用户的 (钱包地址, 私钥哈希)，
+# 用户换绑钱包后自然失配，重新走完整校验。只缓存校验通过的结果。
+_key_fingerprint_secret = secrets.token_bytes(32)
+_verified_keys = TTLCache(
+    maxsize=settings.PRIVATE_KEY_VERIFY_CACHE_SIZE,
+    ttl_seconds=settings.PRIVATE_KEY_VERIFY_CACHE_TTL_SECONDS,
+)
+# 密码对象缓存：键为带密钥哈希（AES-GCM 另加 "aesgcm" 前缀），值为派生好的 Fernet / AESGCM
+_ciphers = TTLCache(maxsize=settings.CIPHER_CACHE_SIZE, ttl_seconds=settings.CIPHER_CACHE_TTL_SECONDS)
+
+
+def _key_fingerprint(normalized_key: str) -> bytes:
+    # 带密钥的 BLAKE2b，开销约为 hmac.new 的四分之一，查缓存不能比直接派生还慢
+    return hashlib.blake2b(normalized_key.encode("utf-8"), key=_key_fingerprint_secret, digest_size=32).digest()
+
 # 工具函数：标准化私钥格式
 # 将输入的私钥字符串标准化。
 # 处理空值或仅包含空格的情况
@@ -26,37 +53,355 @@ def private_key_hash(private_key: str) -> str:
     return hashlib.sha256(normalized_key.encode("utf-8")).hexdigest()
 
 
-def build_fernet_from_private_key(private_key: str) -> Fernet:
-    normalized_key = normalize_private_key(private_key)
+def _derive_fernet(normalized_key: str) -> Fernet:
     # 获取 SHA-256 的二进制摘要 (32 bytes)
     digest = hashlib.sha256(normalized_key.encode("utf-8")).digest()
     # 转换为 Fernet 需要的 base64 格式
     key = base64.urlsafe_b64encode(digest)
     return Fernet(key)
 
+
+# 由私钥派生 Fernet；同一私钥在缓存有效期内复用同一个对象（Fernet 无内部状态，可跨线程共用）
+def build_fernet_from_private_key(private_key: str) -> Fernet:
+    normalized_key = normalize_private_key(private_key)
+    return _ciphers.get_or_create(_key_fingerprint(normalized_key), lambda: _derive_fernet(normalized_key))
+
+
+# 由服务端密钥（如 SECRET_KEY）派生 Fernet：与私钥派生规则相同，但不做私钥格式标准化
+def build_fernet_from_secret(secret: str) -> Fernet:
+    return _ciphers.get_or_create(("secret", _key_fingerprint(secret)), lambda: _derive_fernet(secret))
+
+
+# 加解密接口接受的密钥：私钥 / 服务端存储密钥字符串，或记录的 32 字节数据密钥
+StorageKey = str | bytes
+
+
+def _derive_aesgcm(normalized_key: str) -> AESGCM:
+    # 与 Fernet 同源的 32 字节摘要再做一次带用途标签的哈希，两种格式不共用同一把密钥
+    digest = hashlib.sha256(normalized_key.encode("utf-8")).digest()
+    return AESGCM(hashlib.sha256(_AES_GCM_KEY_LABEL + digest).digest())
+
+
+def _aesgcm_for(private_key: StorageKey) -> AESGCM:
+    # bytes 是记录的随机数据密钥，本身就是 AES-256 密钥，直接使用且不进缓存（每条记录各不相同）
+    if isinstance(private_key, bytes):
+        return AESGCM(private_key)
+    normalized_key = normalize_private_key(private_key)
+    return _ciphers.get_or_create(("aesgcm", _key_fingerprint(normalized_key)), lambda: _derive_aesgcm(normalized_key))
+
+
+# 清除某个私钥派生的密码对象缓存（如私钥轮换后），返回是否存在
+def discard_cached_cipher(private_key: str) -> bool:
+    fingerprint = _key_fingerprint(normalize_private_key(private_key))
+    removed = _ciphers.pop(fingerprint) is not None
+    return (_ciphers.pop(("aesgcm", fingerprint)) is not None) or removed
+
+
+# 清空 Fernet 与私钥校验缓存，例如 SECRET_KEY 轮换或需要尽快从内存移除密钥材料时
+def purge_key_caches() -> None:
+    _ciphers.clear()
+    _verified_keys.clear()
+
+
+def cipher_cache_stats() -> dict[str, float]:
+    return _ciphers.stats()
+
+# 存储格式：
+# - Fernet（旧格式）：AES-CBC + HMAC，再整体 base64，令牌以 0x80 开头，文本形式总以 "g" 开头；
+# - 信封 v1：1 字节版本号 0x01 + 12 字节随机 nonce + AES-256-GCM 密文（含 16 字节认证标签），
+#   版本号同时作为附加认证数据。文本列存信封的 base64；二进制列改用下面的分段信封，旧的单段信封仍可读取。
+# 解密按首字节自动识别格式，各种格式可以在同一张表里并存；新写入的格式由 STORAGE_ENCRYPTION_FORMAT 决定。
+ENVELOPE_AES_GCM_V1 = 0x01
+# 包装后的记录数据密钥：与信封 v1 结构相同，版本号不同，两者的密文不能互相冒充
+ENVELOPE_WRAPPED_KEY_V1 = 0x03
+DATA_KEY_BYTES = 32
+_AES_GCM_KEY_LABEL = b"health-data/aes-256-gcm/v1\x00"
+_AES_GCM_NONCE_BYTES = 12
+# Fernet 令牌 base64 后的固定开头（版本号 0x80 加时间戳高位的零字节），迁移任务用它筛选旧格式
+FERNET_TOKEN_PREFIX = "gAAAAA"
+
+
+def _use_envelope() -> bool:
+    return settings.STORAGE_ENCRYPTION_FORMAT != "fernet"
+
+
+def is_legacy_ciphertext(value: str | bytes | None) -> bool:
+    """是否为旧的 Fernet 令牌（文本或二进制形式）。"""
+    if not value:
+        return False
+    return value[:1] in ("g", b"g")
+
+
+def _seal_envelope(version: int, raw: bytes, private_key: StorageKey) -> bytes:
+    header = bytes([version])
+    nonce = os.urandom(_AES_GCM_NONCE_BYTES)
+    return header + nonce + _aesgcm_for(private_key).encrypt(nonce, raw or b"", header)
+
+
+def _open_envelope(version: int, envelope: bytes, private_key: StorageKey) -> bytes:
+    if len(envelope) < 1 + _AES_GCM_NONCE_BYTES or envelope[0] != version:
+        raise ValueError("未知的加密数据格式")
+    nonce = envelope[1 : 1 + _AES_GCM_NONCE_BYTES]
+    try:
+        return _aesgcm_for(private_key).decrypt(nonce, envelope[1 + _AES_GCM_NONCE_BYTES :], envelope[:1])
+    except InvalidTag as exc:
+        raise ValueError("私钥错误或数据已损坏，无法解密") from exc
+
+
+def encrypt_envelope(raw: bytes, private_key: StorageKey) -> bytes:
+    return _seal_envelope(ENVELOPE_AES_GCM_V1, raw, private_key)
+
+
+def decrypt_envelope(envelope: bytes, private_key: StorageKey) -> bytes:
+    return _open_envelope(ENVELOPE_AES_GCM_V1, envelope, private_key)
+
+
+# 信封加密：每条记录的正文 / PDF 用独立的随机数据密钥加密一次，
+# 数据密钥再用私钥或公共存储密钥包装后单独存放（约 80 字节）。
+# 切换公开状态或轮换密钥时只需重新包装数据密钥，不必重新加密正文和 PDF。
+def generate_data_key() -> bytes:
+    return os.urandom(DATA_KEY_BYTES)
+
+
+def wrap_data_key(data_key: bytes, private_key: str) -> str:
+    return base64.urlsafe_b64encode(_seal_envelope(ENVELOPE_WRAPPED_KEY_V1, data_key, private_key)).decode("ascii")
+
+
+def unwrap_data_key(wrapped_key: str, private_key: str) -> bytes:
+    try:
+        envelope = base64.urlsafe_b64decode(wrapped_key.encode("ascii"))
+    except (binascii.Error, UnicodeEncodeError) as exc:
+        raise ValueError("私钥错误或数据已损坏，无法解密") from exc
+    data_key = _open_envelope(ENVELOPE_WRAPPED_KEY_V1, envelope, private_key)
+    if len(data_key) != DATA_KEY_BYTES:
+        raise ValueError("私钥错误或数据已损坏，无法解密")
+    return data_key
+
+
+def rewrap_data_key(wrapped_key: str, old_private_key: str, new_private_key: str) -> str:
+    """换用新密钥包装数据密钥；旧密钥不正确时抛出 ValueError。"""
+    return wrap_data_key(unwrap_data_key(wrapped_key, old_private_key), new_private_key)
+
+
+# 分段信封 v2（二进制大字段，如 PDF）：
+# 头部 12 字节 = 版本号 0x02 + 4 字节段大小（大端）+ 7 字节随机 nonce 前缀，头部作为每段的附加认证数据；
+# 之后是逐段的 AES-256-GCM 密文，每段明文最多一个段大小，另带 16 字节认证标签。
+# 第 i 段的 nonce = 前缀 + 4 字节段序号 + 1 字节末段标记，段被重排、删减或截断都无法通过认证。
+# 由密文总长即可算出段数与明文大小，任意字节区间只需读取并解密覆盖它的几个段。
+ENVELOPE_SEGMENTED_V1 = 0x02
+_SEGMENT_PREFIX_BYTES = 7
+_SEGMENT_HEADER = struct.Struct(">BI")
+SEGMENTED_HEADER_BYTES = _SEGMENT_HEADER.size + _SEGMENT_PREFIX_BYTES
+_SEGMENT_TAG_BYTES = 16
+_MAX_SEGMENTS = 2**32
+
+
+@dataclass(frozen=True)
+class SegmentLayout:
+    header: bytes
+    segment_size: int
+    segment_count: int
+    plaintext_size: int
+    stored_size: int
+
+    def segment_span(self, index: int) -> tuple[int, int]:
+        """第 index 段在密文中的 (偏移, 长度)。"""
+        stored_segment = self.segment_size + _SEGMENT_TAG_BYTES
+        offset = SEGMENTED_HEADER_BYTES + index * stored_segment
+        return offset, min(stored_segment, self.stored_size - offset)
+
+
+def is_segmented_ciphertext(value: bytes | None) -> bool:
+    return bool(value) and value[0] == ENVELOPE_SEGMENTED_V1
+
+
+def segmented_layout(header: bytes, stored_size: int) -> SegmentLayout:
+    """由头部与密文总长推算分段布局；格式不符时抛出 ValueError。"""
+    if len(header) < SEGMENTED_HEADER_BYTES or header[0] != ENVELOPE_SEGMENTED_V1:
+        raise ValueError("未知的加密数据格式")
+    _, segment_size = _SEGMENT_HEADER.unpack_from(header)
+    body = stored_size - SEGMENTED_HEADER_BYTES
+    if segment_size <= 0 or body < _SEGMENT_TAG_BYTES:
+        raise ValueError("私钥错误或文件已损坏，无法解密")
+    stored_segment = segment_size + _SEGMENT_TAG_BYTES
+    segment_count = -(-body // stored_segment)
+    # 末段至少要有认证标签
+    if body - (segment_count - 1) * stored_segment < _SEGMENT_TAG_BYTES:
+        raise ValueError("私钥错误或文件已损坏，无法解密")
+    return SegmentLayout(
+        header=bytes(header[:SEGMENTED_HEADER_BYTES]),
+        segment_size=segment_size,
+        segment_count=segment_count,
+        plaintext_size=body - segment_count * _SEGMENT_TAG_BYTES,
+        stored_size=stored_size,
+    )
+
+
+def _segment_nonce(header: bytes, index: int, last: bool) -> bytes:
+    return header[_SEGMENT_HEADER.size : SEGMENTED_HEADER_BYTES] + struct.pack(">IB", index, 1 if last else 0)
+
+
+class SegmentedEncryptor:
+    """增量加密：上传时边读边加密，内存中只保留不足一段的明文。
+
+    update() 返回已完成的密文段（首次调用时带头部）；finalize() 返回末段，之后不可再调用。
+    """
+
+    def __init__(self, private_key: StorageKey, segment_size: int | None = None) -> None:
+        self._aesgcm = _aesgcm_for(private_key)
+        self._segment_size = segment_size or settings.STORAGE_SEGMENT_SIZE
+        self._header = _SEGMENT_HEADER.pack(ENVELOPE_SEGMENTED_V1, self._segment_size) + os.urandom(_SEGMENT_PREFIX_BYTES)
+        self._buffer = bytearray()
+        self._index = 0
+        self._header_pending = True
+
+    def _seal(self, chunk: bytes, last: bool) -> bytes:
+        if self._index >= _MAX_SEGMENTS:
+            raise ValueError("文件过大，超出分段加密的段数上限")
+        sealed = self._aesgcm.encrypt(_segment_nonce(self._header, self._index, last), chunk, self._header)
+        self._index += 1
+        return sealed
+
+    def _take_header(self) -> list[bytes]:
+        if not self._header_pending:
+            return []
+        self._header_pending = False
+        return [self._header]
+
+    def update(self, data: bytes) -> bytes:
+        self._buffer.extend(data)
+        output = self._take_header()
+        # 恰好满一段时先留着：只有看到后续数据才能确定它不是末段
+        while len(self._buffer) > self._segment_size:
+            output.append(self._seal(bytes(self._buffer[: self._segment_size]), last=False))
+            del self._buffer[: self._segment_size]
+        return b"".join(output)
+
+    def finalize(self) -> bytes:
+        output = self._take_header()
+        output.append(self._seal(bytes(self._buffer), last=True))
+        self._buffer.clear()
+        return b"".join(output)
+
+
+class _FernetBufferedEncryptor:
+    # STORAGE_ENCRYPTION_FORMAT=fernet 时的同接口实现：Fernet 只能整体加密，先缓存全部明文
+    def __init__(self, private_key: str) -> None:
+        self._fernet = build_fernet_from_private_key(private_key)
+        self._buffer = bytearray()
+
+    def update(self, data: bytes) -> bytes:
+        self._buffer.extend(data)
+        return b""
+
+    def finalize(self) -> bytes:
+        token = self._fernet.encrypt(bytes(self._buffer))
+        self._buffer.clear()
+        return token
+
+
+def new_binary_encryptor(private_key: StorageKey) -> SegmentedEncryptor | _FernetBufferedEncryptor:
+    """按当前存储格式返回增量加密器，输出拼接后与 encrypt_binary 的结果格式相同。"""
+    if _use_envelope():
+        return SegmentedEncryptor(private_key)
+    return _FernetBufferedEncryptor(private_key)
+
+
+def encrypt_segmented(raw: bytes, private_key: StorageKey) -> bytes:
+    encryptor = SegmentedEncryptor(private_key)
+    return encryptor.update(raw or b"") + encryptor.finalize()
+
+
+def decrypt_segment(layout: SegmentLayout, index: int, sealed: bytes, private_key: StorageKey) -> bytes:
+    last = index == layout.segment_count - 1
+    try:
+        return _aesgcm_for(private_key).decrypt(_segment_nonce(layout.header, index, last), sealed, layout.header)
+    except InvalidTag as exc:
+        raise ValueError("私钥错误或文件已损坏，无法解密") from exc
+
+
+def iter_decrypt_range(
+    layout: SegmentLayout,
+    read_at: Callable[[int, int], bytes],
+    private_key: StorageKey,
+    start: int,
+    end: int,
+) -> Iterator[bytes]:
+    """逐段解密明文闭区间 [start, end]：read_at(偏移, 长度) 读取密文片段，每次只持有一个段。"""
+    if layout.plaintext_size == 0 or start > end:
+        return
+    end = min(end, layout.plaintext_size - 1)
+    first, last = start // layout.segment_size, end // layout.segment_size
+    for index in range(first, last + 1):
+        offset, length = layout.segment_span(index)
+        plaintext = decrypt_segment(layout, index, read_at(offset, length), private_key)
+        segment_start = index * layout.segment_size
+        yield plaintext[max(start - segment_start, 0) : end - segment_start + 1]
+
+
+def decrypt_segmented(cipher_bytes: bytes, private_key: StorageKey) -> bytes:
+    view = memoryview(cipher_bytes)
+    layout = segmented_layout(bytes(view[:SEGMENTED_HEADER_BYTES]), len(view))
+    output = bytearray()
+    for chunk in iter_decrypt_range(
+        layout,
+        lambda offset, length: view[offset : offset + length],
+        private_key,
+        0,
+        layout.plaintext_size - 1,
+    ):
+        output.extend(chunk)
+    return bytes(output)
+
+
+def _legacy_fernet(private_key: StorageKey) -> Fernet:
+    # 数据密钥只用于信封格式，带数据密钥的记录不会出现 Fernet 密文
+    if isinstance(private_key, bytes):
+        raise ValueError("私钥错误或数据已损坏，无法解密")
+    return build_fernet_from_private_key(private_key)
+
+
 # 使用私钥加密文本内容。
-# 返回 Base64 编码的密文字符串
-def encrypt_text(content: str, private_key: str) -> str:
+# 返回可存入文本列的字符串（信封的 base64，或 STORAGE_ENCRYPTION_FORMAT=fernet 时的 Fernet 令牌）
+def encrypt_text(content: str, private_key: StorageKey) -> str:
+    raw = (content or "").encode("utf-8")
+    if _use_envelope():
+        return base64.urlsafe_b64encode(encrypt_envelope(raw, private_key)).decode("ascii")
     fernet = build_fernet_from_private_key(private_key)
-    return fernet.encrypt((content or "").encode("utf-8")).decode("utf-8")
+    return fernet.encrypt(raw).decode("utf-8")
 
 # 使用私钥解密密文。
 # 如果私钥错误或数据被篡改，抛出 ValueError。
-def decrypt_text(cipher_text: str, private_key: str) -> str:
-    fernet = build_fernet_from_private_key(private_key)
+def decrypt_text(cipher_text: str, private_key: StorageKey) -> str:
+    if not is_legacy_ciphertext(cipher_text):
+        try:
+            envelope = base64.urlsafe_b64decode(cipher_text.encode("ascii"))
+        except (binascii.Error, UnicodeEncodeError) as exc:
+            raise ValueError("私钥错误或数据已损坏，无法解密") from exc
+        return decrypt_envelope(envelope, private_key).decode("utf-8")
+    fernet = _legacy_fernet(private_key)
     try:
         return fernet.decrypt(cipher_text.encode("utf-8")).decode("utf-8")
     except InvalidToken as exc:
         raise ValueError("私钥错误或数据已损坏，无法解密") from exc
 
-# 加密二进制数据
-def encrypt_binary(raw: bytes, private_key: str) -> bytes:
+# 加密二进制数据：使用分段信封（不再 base64，比 Fernet 令牌小约四分之一，且支持按区间解密）
+def encrypt_binary(raw: bytes, private_key: StorageKey) -> bytes:
+    if _use_envelope():
+        return encrypt_segmented(raw, private_key)
     fernet = build_fernet_from_private_key(private_key)
     return fernet.encrypt(raw or b"")
 
 # 解密二进制数据
-def decrypt_binary(cipher_bytes: bytes, private_key: str) -> bytes:
-    fernet = build_fernet_from_private_key(private_key)
+def decrypt_binary(cipher_bytes: bytes, private_key: StorageKey) -> bytes:
+    if is_segmented_ciphertext(cipher_bytes):
+        return decrypt_segmented(cipher_bytes, private_key)
+    if cipher_bytes and not is_legacy_ciphertext(cipher_bytes):
+        try:
+            return decrypt_envelope(bytes(cipher_bytes), private_key)
+        except ValueError as exc:
+            raise ValueError("私钥错误或文件已损坏，无法解密") from exc
+    fernet = _legacy_fernet(private_key)
     try:
         return fernet.decrypt(cipher_bytes or b"")
     except InvalidToken as exc:
@@ -65,11 +410,34 @@ def decrypt_binary(cipher_bytes: bytes, private_key: str) -> bytes:
 
 # 验证用户私钥是否正确。
 # 检查私钥哈希是否匹配，并且推导出的地址与记录的地址一致。
-def verify_user_private_key(private_key: str, wallet_address: str | None, saved_hash: str | None) -> bool:
+# 传入 user_id 时使用校验结果缓存，同一用户重复提交同一私钥不再做地址推导。
+def verify_user_private_key(
+    private_key: str,
+    wallet_address: str | None,
+    saved_hash: str | None,
+    user_id: int | None = None,
+) -> bool:
     if not private_key or not wallet_address or not saved_hash:
         return False
 
+    binding = (wallet_address.lower(), saved_hash)
+    cache_key = None
+    if user_id is not None:
+        cache_key = (user_id, _key_fingerprint(normalize_private_key(private_key)))
+        if _verified_keys.get(cache_key) == binding:
+            return True
+
     if private_key_hash(private_key) != saved_hash:
         return False
 
-    return private_key_to_address(private_key).lower() == wallet_address.lower()
+    if private_key_to_address(private_key).lower() != binding[0]:
+        return False
+
+    if cache_key is not None:
+        _verified_keys.set(cache_key, binding)
+    return True
+
+
+# 用户钱包或私钥变更、账号删除时调用，清掉该用户的私钥校验缓存
+def invalidate_verified_private_keys(user_id: int) -> int:
+    return _verified_keys.discard_where(lambda key: key[0] == user_id)
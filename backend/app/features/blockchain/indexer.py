@@ -0,0 +1,343 @@
+import json
+import logging
+import threading
+from typing import Any, Callable, Optional
+
+from eth_utils import event_abi_to_log_topic
+from sqlalchemy.orm import Session
+from web3 import Web3
+
+from app import models
+from app.config import settings
+from app.database import SessionLocal
+from app.features.blockchain.service import chain_service
+
+
+# HealthDataAccess 合约事件索引器：按区块区间拉取 DataStored / DataUpdated / DataStatusChanged 日志，
+# 只处理确认深度之后的区块，把 healthRecords 的状态镜像到 chain_health_records 表。
+# 每个事件都保存应用前的镜像快照；检查点区块哈希与链上不一致时找到分叉点，倒序恢复快照后重扫。
+# 事件本身不携带 dataHash，从交易 calldata 解出（批量写入按 dataId 找到对应的那一项）；
+# 调用方不是已知函数时退回按事件区块读取合约状态。
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINT_NAME = "health_data_access"
+INDEXED_EVENTS = ("DataStored", "DataUpdated", "DataStatusChanged")
+_STATE_COLUMNS = ("data_hash", "encrypted_digest", "timestamp", "owner", "is_active", "data_type", "status", "block_number")
+_ZERO_ADDRESS = "0x0000000000000000000000000000000000000000"
+
+_worker_thread: Optional[threading.Thread] = None
+_worker_stop = threading.Event()
+
+
+def _row_state(row: Optional[models.ChainHealthRecord]) -> Optional[dict[str, Any]]:
+    if row is None:
+        return None
+    return {column: getattr(row, column) for column in _STATE_COLUMNS}
+
+
+def _format_indexed_record(row: models.ChainHealthRecord) -> Optional[dict[str, Any]]:
+    # 与 chain_service.format_health_record 的输出保持一致
+    if not row.owner or row.owner == _ZERO_ADDRESS or not row.is_active:
+        return None
+    return {
+        "data_hash": row.data_hash,
+        "encrypted_digest": row.encrypted_digest,
+        "timestamp": row.timestamp,
+        "owner": row.owner,
+        "is_active": row.is_active,
+        "data_type": row.data_type,
+        "status": row.status,
+    }
+
+
+def read_indexed_records(data_id_hexes: list[str]) -> dict[str, Optional[dict[str, Any]]]:
+    """按 data_id 查镜像表；尚未索引到的 data_id 不出现在结果里，由调用方改走 RPC。"""
+    requested = {data_id.lower(): data_id for data_id in data_id_hexes}
+    db = SessionLocal()
+    try:
+        rows = (
+            db.query(models.ChainHealthRecord)
+            .filter(models.ChainHealthRecord.data_id.in_(list(requested)))
+            .all()
+        )
+    finally:
+        db.close()
+    return {requested[row.data_id]: _format_indexed_record(row) for row in rows}
+
+
+class ChainEventIndexer:
+    def __init__(
+        self,
+        web3: Web3,
+        contract: Any,
+        session_factory: Callable[[], Session] = SessionLocal,
+        *,
+        confirmations: Optional[int] = None,
+        start_block: Optional[int] = None,
+        batch_blocks: Optional[int] = None,
+        reorg_history_blocks: Optional[int] = None,
+    ) -> None:
+        self._web3 = web3
+        self._contract = contract
+        self._session_factory = session_factory
+        self.confirmations = settings.CHAIN_INDEXER_CONFIRMATIONS if confirmations is None else confirmations
+        self.start_block = settings.CHAIN_INDEXER_START_BLOCK if start_block is None else start_block
+        self.batch_blocks = max(1, batch_blocks or settings.CHAIN_INDEXER_BATCH_BLOCKS)
+        self.reorg_history_blocks = (
+            settings.CHAIN_INDEXER_REORG_HISTORY_BLOCKS if reorg_history_blocks is None else reorg_history_blocks
+        )
+        self._topics = {
+            event_abi_to_log_topic(item): item["name"]
+            for item in contract.abi
+            if item.get("type") == "event" and item.get("name") in INDEXED_EVENTS
+        }
+        self.caught_up = False
+
+    def _block_hash(self, block_number: int) -> Optional[str]:
+        if block_number < 0:
+            return None
+        return Web3.to_hex(self._web3.eth.get_block(block_number)["hash"])
+
+    def _load_checkpoint(self, db: Session) -> models.ChainIndexerCheckpoint:
+        checkpoint = db.get(models.ChainIndexerCheckpoint, CHECKPOINT_NAME, with_for_update=True)
+        if checkpoint is None:
+            checkpoint = models.ChainIndexerCheckpoint(name=CHECKPOINT_NAME, block_number=self.start_block - 1)
+            db.add(checkpoint)
+        return checkpoint
+
+    def run_once(self) -> int:
+        """处理一段已确认区块，返回应用的事件数；已追上确认高度时返回 0。"""
+        db = self._session_factory()
+        try:
+            checkpoint = self._load_checkpoint(db)
+            if checkpoint.block_hash and self._block_hash(checkpoint.block_number) != checkpoint.block_hash:
+                self._rollback(db, checkpoint)
+
+            safe_block = self._web3.eth.block_number - self.confirmations
+            from_block = checkpoint.block_number + 1
+            if from_block > safe_block:
+                self.caught_up = True
+                db.commit()
+                return 0
+            to_block = min(safe_block, from_block + self.batch_blocks - 1)
+            self.caught_up = to_block >= safe_block
+
+            logs = self._web3.eth.get_logs(
+                {
+                    "address": self._contract.address,
+                    "fromBlock": from_block,
+                    "toBlock": to_block,
+                    "topics": [[Web3.to_hex(topic) for topic in self._topics]],
+                }
+            )
+            applied = 0
+            for log in sorted(logs, key=lambda item: (item["blockNumber"], item["logIndex"])):
+                if log.get("removed"):
+                    continue
+                self._apply_log(db, log)
+                applied += 1
+
+            checkpoint.block_number = to_block
+            checkpoint.block_hash = self._block_hash(to_block)
+            # 超出回滚窗口的快照不再需要
+            db.query(models.ChainIndexedEvent).filter(
+                models.ChainIndexedEvent.block_number < to_block - self.reorg_history_blocks
+            ).delete(synchronize_session=False)
+            db.commit()
+            return applied
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def _apply_log(self, db: Session, log: Any) -> None:
+        event_name = self._topics[bytes(log["topics"][0])]
+        args = getattr(self._contract.events, event_name)().process_log(log)["args"]
+        data_id = Web3.to_hex(args["dataId"])
+        row = db.get(models.ChainHealthRecord, data_id)
+        previous = _row_state(row)
+
+        db.add(
+            models.ChainIndexedEvent(
+                block_number=log["blockNumber"],
+                block_hash=Web3.to_hex(log["blockHash"]),
+                tx_hash=Web3.to_hex(log["transactionHash"]),
+                log_index=log["logIndex"],
+                event_name=event_name,
+                data_id=data_id,
+                previous_state=json.dumps(previous) if previous else None,
+            )
+        )
+        state = self._next_state(event_name, args, log, data_id, previous)
+        if row is None:
+            row = models.ChainHealthRecord(data_id=data_id)
+            db.add(row)
+        for column, value in state.items():
+            setattr(row, column, value)
+        db.flush()
+
+    def _next_state(
+        self,
+        event_name: str,
+        args: Any,
+        log: Any,
+        data_id: str,
+        previous: Optional[dict[str, Any]],
+    ) -> dict[str, Any]:
+        block_number = log["blockNumber"]
+        if event_name == "DataStored":
+            params = self._decode_call(log, "storeHealthData", lambda batch: self._match_stored(batch, args, data_id))
+            if params is None:
+                return self._read_state_at(data_id, block_number)
+            return {
+                "data_hash": Web3.to_hex(params["dataHash"]),
+                "encrypted_digest": Web3.to_hex(params["encryptedData"]),
+                "timestamp": args["timestamp"],
+                "owner": Web3.to_checksum_address(args["owner"]),
+                "is_active": True,
+                "data_type": args["dataType"],
+                "status": 0,
+                "block_number": block_number,
+            }
+
+        if previous is None:
+            # 记录存储早于起始区块，先按事件区块读出完整状态
+            return self._read_state_at(data_id, block_number)
+        state = dict(previous, block_number=block_number)
+        if event_name == "DataUpdated":
+            params = self._decode_call(log, "updateHealthData", lambda batch: self._match_updated(batch, data_id))
+            if params is None:
+                return self._read_state_at(data_id, block_number)
+            state.update(
+                data_hash=Web3.to_hex(params["newDataHash"]),
+                encrypted_digest=Web3.to_hex(params["newEncryptedData"]),
+                timestamp=args["timestamp"],
+            )
+        else:
+            state["status"] = int(args["newStatus"])
+        return state
+
+    def _decode_call(
+        self,
+        log: Any,
+        fn_name: str,
+        match_batch: Callable[[dict[str, Any]], Optional[dict[str, Any]]],
+    ) -> Optional[dict[str, Any]]:
+        transaction = self._web3.eth.get_transaction(log["transactionHash"])
+        try:
+            function, params = self._contract.decode_function_input(transaction["input"])
+        except ValueError:
+            return None
+        if function.fn_name == fn_name:
+            return params
+        if function.fn_name == f"{fn_name}Batch":
+            return match_batch(params)
+        return None
+
+    @staticmethod
+    def _match_stored(batch: dict[str, Any], args: Any, data_id: str) -> Optional[dict[str, Any]]:
+        # 合约的 dataId = keccak256(abi.encodePacked(owner, dataHash, timestamp))
+        for data_hash, encrypted_data in zip(batch["dataHashes"], batch["encryptedData"]):
+            candidate = Web3.solidity_keccak(["address", "bytes32", "uint256"], [args["owner"], data_hash, args["timestamp"]])
+            if Web3.to_hex(candidate) == data_id:
+                return {"dataHash": data_hash, "encryptedData": encrypted_data}
+        return None
+
+    @staticmethod
+    def _match_updated(batch: dict[str, Any], data_id: str) -> Optional[dict[str, Any]]:
+        # 同一批次重复更新同一条记录时，以最后一项为准（每个事件都应用最终值）
+        matched = None
+        for batch_data_id, data_hash, encrypted_data in zip(batch["dataIds"], batch["newDataHashes"], batch["newEncryptedData"]):
+            if Web3.to_hex(batch_data_id) == data_id:
+                matched = {"newDataHash": data_hash, "newEncryptedData": encrypted_data}
+        return matched
+
+    def _read_state_at(self, data_id: str, block_number: int) -> dict[str, Any]:
+        raw = self._contract.functions.healthRecords(Web3.to_bytes(hexstr=data_id)).call(block_identifier=block_number)
+        return {
+            "data_hash": Web3.to_hex(raw[0]),
+            "encrypted_digest": Web3.to_hex(raw[1]),
+            "timestamp": raw[2],
+            "owner": Web3.to_checksum_address(raw[3]),
+            "is_active": bool(raw[4]),
+            "data_type": raw[5],
+            "status": int(raw[6]),
+            "block_number": block_number,
+        }
+
+    def _find_fork_block(self, db: Session, checkpoint: models.ChainIndexerCheckpoint) -> int:
+        """从新到旧比对已处理事件所在区块的哈希，返回最后一个仍在主链上的区块号。"""
+        indexed_blocks = (
+            db.query(models.ChainIndexedEvent.block_number, models.ChainIndexedEvent.block_hash)
+            .filter(models.ChainIndexedEvent.block_number <= checkpoint.block_number)
+            .distinct()
+            .order_by(models.ChainIndexedEvent.block_number.desc())
+            .all()
+        )
+        for block_number, block_hash in indexed_blocks:
+            if self._block_hash(block_number) == block_hash:
+                return block_number
+        if indexed_blocks:
+            return max(self.start_block - 1, indexed_blocks[-1][0] - 1)
+        return max(self.start_block - 1, checkpoint.block_number - self.reorg_history_blocks)
+
+    def _rollback(self, db: Session, checkpoint: models.ChainIndexerCheckpoint) -> None:
+        fork_block = self._find_fork_block(db, checkpoint)
+        logger.warning("Chain reorg detected at block %s, rolling back to %s", checkpoint.block_number, fork_block)
+        events = (
+            db.query(models.ChainIndexedEvent)
+            .filter(models.ChainIndexedEvent.block_number > fork_block)
+            .order_by(
+                models.ChainIndexedEvent.block_number.desc(),
+                models.ChainIndexedEvent.log_index.desc(),
+                models.ChainIndexedEvent.id.desc(),
+            )
+            .all()
+        )
+        for event in events:
+            row = db.get(models.ChainHealthRecord, event.data_id)
+            if event.previous_state is None:
+                if row is not None:
+                    db.delete(row)
+            else:
+                if row is None:
+                    row = models.ChainHealthRecord(data_id=event.data_id)
+                    db.add(row)
+                for column, value in json.loads(event.previous_state).items():
+                    setattr(row, column, value)
+            db.delete(event)
+            db.flush()
+        checkpoint.block_number = fork_block
+        checkpoint.block_hash = self._block_hash(fork_block)
+
+
+def _run_indexer_worker(indexer: ChainEventIndexer) -> None:
+    while not _worker_stop.is_set():
+        try:
+            indexer.run_once()
+            # 落后较多时连续追块，追上确认高度后再按轮询间隔等待
+            caught_up = indexer.caught_up
+        except Exception:  # noqa: BLE001
+            logger.exception("Chain event indexer iteration failed")
+            caught_up = True
+        if caught_up:
+            _worker_stop.wait(settings.CHAIN_INDEXER_POLL_SECONDS)
+
+
+def start_chain_indexer() -> None:
+    global _worker_thread
+    if not settings.CHAIN_INDEXER_ENABLED or not chain_service.enabled:
+        return
+    if _worker_thread is not None and _worker_thread.is_alive():
+        return
+    indexer = ChainEventIndexer(chain_service.web3, chain_service.contract)
+    chain_service.attach_index_reader(read_indexed_records)
+    _worker_stop.clear()
+    _worker_thread = threading.Thread(target=_run_indexer_worker, args=(indexer,), name="chain-event-indexer", daemon=True)
+    _worker_thread.start()
+
+
+def stop_chain_indexer() -> None:
+    _worker_stop.set()
@@ -0,0 +1,69 @@
+import hashlib
+from typing import Sequence
+
+
+# 批量锚定用的 Merkle 树：叶子与内部节点加不同前缀，防止把内部节点伪造成叶子；
+# 某层节点数为奇数时最后一个节点直接提升到上一层（不复制），证明里不会出现该层的兄弟节点。
+
+LEAF_PREFIX = b"\x00"
+NODE_PREFIX = b"\x01"
+
+
+def _bytes32(hex_value: str) -> bytes:
+    raw = bytes.fromhex(hex_value[2:] if hex_value.startswith("0x") else hex_value)
+    if len(raw) != 32:
+        raise ValueError("摘要长度必须为 32 字节")
+    return raw
+
+
+def record_leaf(record_id: int, data_hash_hex: str) -> bytes:
+    """叶子绑定记录 ID 与内容摘要，证明不能被挪用到别的记录上。"""
+    return hashlib.sha256(LEAF_PREFIX + int(record_id).to_bytes(8, "big") + _bytes32(data_hash_hex)).digest()
+
+
+def _node(left: bytes, right: bytes) -> bytes:
+    return hashlib.sha256(NODE_PREFIX + left + right).digest()
+
+
+def build_merkle_tree(leaves: Sequence[bytes]) -> tuple[bytes, list[list[bytes]]]:
+    """返回 (根, 每个叶子的兄弟节点列表)。"""
+    if not leaves:
+        raise ValueError("Merkle 树至少需要一个叶子")
+
+    proofs: list[list[bytes]] = [[] for _ in leaves]
+    # positions[i] 为第 i 个叶子在当前层的下标
+    positions = list(range(len(leaves)))
+    level = list(leaves)
+    while len(level) > 1:
+        for leaf_index, position in enumerate(positions):
+            sibling = position ^ 1
+            if sibling < len(level):
+                proofs[leaf_index].append(level[sibling])
+            positions[leaf_index] = position // 2
+        level = [
+            _node(level[index], level[index + 1]) if index + 1 < len(level) else level[index]
+            for index in range(0, len(level), 2)
+        ]
+    return level[0], proofs
+
+
+def compute_merkle_root(leaf: bytes, leaf_index: int, leaf_count: int, siblings: Sequence[bytes]) -> bytes:
+    if leaf_count < 1 or not 0 <= leaf_index < leaf_count:
+        raise ValueError("叶子位置无效")
+
+    current = leaf
+    position = leaf_index
+    width = leaf_count
+    remaining = list(siblings)
+    while width > 1:
+        sibling = position ^ 1
+        if sibling < width:
+            if not remaining:
+                raise ValueError("Merkle 证明不完整")
+            neighbour = remaining.pop(0)
+            current = _node(current, neighbour) if position % 2 == 0 else _node(neighbour, current)
+        position //= 2
+        width = (width + 1) // 2
+    if remaining:
+        raise ValueError("Merkle 证明包含多余节点")
+    return current
@@ -0,0 +1,76 @@
+import threading
+from dataclasses import dataclass, field
+from typing import Callable, Optional
+
+
+# 本地 nonce 分配：同一钱包的并发交易在进程内按账户加锁依次取号，不必每笔交易都查询节点；
+# 取号后未能广播的 nonce 会留下空洞，此时标记账户需要重新同步，下次取号前从节点的 pending 计数校正。
+
+
+@dataclass
+class _AccountNonces:
+    lock: threading.Lock = field(default_factory=threading.Lock)
+    next_nonce: Optional[int] = None
+    # 已广播但尚未拿到回执的 nonce
+    in_flight: set[int] = field(default_factory=set)
+
+
+class NonceManager:
+    def __init__(self, fetch_pending_count: Callable[[str], int]) -> None:
+        self._fetch_pending_count = fetch_pending_count
+        self._accounts: dict[str, _AccountNonces] = {}
+        self._accounts_lock = threading.Lock()
+
+    def _account(self, address: str) -> _AccountNonces:
+        key = address.lower()
+        with self._accounts_lock:
+            state = self._accounts.get(key)
+            if state is None:
+                state = _AccountNonces()
+                self._accounts[key] = state
+            return state
+
+    def _resync_locked(self, address: str, state: _AccountNonces) -> None:
+        # pending 计数包含交易池里已有的交易；本地仍在途的 nonce 跳过，空洞会被优先补上
+        state.next_nonce = self._fetch_pending_count(address)
+        while state.next_nonce in state.in_flight:
+            state.next_nonce += 1
+
+    def allocate(self, address: str) -> int:
+        state = self._account(address)
+        with state.lock:
+            if state.next_nonce is None:
+                self._resync_locked(address, state)
+            nonce = state.next_nonce
+            state.in_flight.add(nonce)
+            state.next_nonce = nonce + 1
+            while state.next_nonce in state.in_flight:
+                state.next_nonce += 1
+            return nonce
+
+    def confirm(self, address: str, nonce: int) -> None:
+        """交易已上链（无论执行成功与否 nonce 都已消耗）。"""
+        state = self._account(address)
+        with state.lock:
+            state.in_flight.discard(nonce)
+
+    def release(self, address: str, nonce: int) -> None:
+        """交易未能广播，归还 nonce：是最后一个号时直接复用，否则留下空洞，下次取号前重新同步。"""
+        state = self._account(address)
+        with state.lock:
+            state.in_flight.discard(nonce)
+            if state.next_nonce == nonce + 1:
+                state.next_nonce = nonce
+            else:
+                state.next_nonce = None
+
+    def resync(self, address: str) -> None:
+        """节点返回 nonce 过低/过高等错误时丢弃本地计数，下次取号重新查询。"""
+        state = self._account(address)
+        with state.lock:
+            state.next_nonce = None
+
+    def pending_count(self, address: str) -> int:
+        state = self._account(address)
+        with state.lock:
+            return len(state.in_flight)
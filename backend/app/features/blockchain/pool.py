@@ -0,0 +1,138 @@
+import threading
+from dataclasses import dataclass, field
+from typing import Any, Optional
+from urllib.parse import urlsplit
+
+from web3 import Web3
+
+from app.config import settings
+from app.features.blockchain.breaker import STATE_CLOSED, CircuitBreaker, render_breaker_metrics
+
+
+# 多节点 RPC 池：读请求按权重做平滑加权轮询，并按延迟（EWMA）下调慢节点的有效权重；
+# 写请求固定走主节点（配置里的第一个），主节点熔断时切到下一个健康节点，主节点恢复后切回。
+# 每个节点有独立的熔断器，调用方按返回的顺序逐个尝试即可完成故障转移。
+
+LATENCY_EWMA_ALPHA = 0.2
+# 慢节点的有效权重最低降到配置权重的这个比例，避免完全不再被选中而无法更新延迟
+MIN_LATENCY_FACTOR = 0.1
+
+
+def parse_provider_uris(raw: Optional[str], fallback_uri: str) -> list[tuple[str, float]]:
+    """解析 "uri|权重,uri|权重"；未配置时只使用 fallback_uri。"""
+    endpoints: list[tuple[str, float]] = []
+    for item in (raw or "").split(","):
+        item = item.strip()
+        if not item:
+            continue
+        uri, _, weight = item.partition("|")
+        endpoints.append((uri.strip(), max(float(weight), 0.0) if weight.strip() else 1.0))
+    return endpoints or [(fallback_uri, 1.0)]
+
+
+def endpoint_label(uri: str) -> str:
+    # 指标与日志里只保留主机和端口，URL 路径或用户信息中可能带有服务商的 API key
+    parts = urlsplit(uri)
+    host = parts.hostname or uri
+    return f"{host}:{parts.port}" if parts.port else host
+
+
+@dataclass(eq=False)
+class RpcEndpoint:
+    uri: str
+    weight: float
+    breaker: CircuitBreaker
+    web3: Web3
+    contract: Any = None
+    latency_ewma: Optional[float] = None
+    current_weight: float = field(default=0.0, repr=False)
+
+
+class RpcEndpointPool:
+    def __init__(self, endpoints: list[tuple[str, float]]) -> None:
+        self.endpoints = [
+            RpcEndpoint(
+                uri=uri,
+                weight=weight,
+                breaker=CircuitBreaker(
+                    endpoint_label(uri),
+                    settings.CHAIN_BREAKER_FAILURE_THRESHOLD,
+                    settings.CHAIN_BREAKER_RESET_SECONDS,
+                ),
+                web3=Web3(Web3.HTTPProvider(uri, request_kwargs={"timeout": settings.WEB3_REQUEST_TIMEOUT_SECONDS})),
+            )
+            for uri, weight in endpoints
+        ]
+        self._lock = threading.Lock()
+
+    @property
+    def primary(self) -> RpcEndpoint:
+        return self.endpoints[0]
+
+    def record_latency(self, endpoint: RpcEndpoint, seconds: float) -> None:
+        with self._lock:
+            if endpoint.latency_ewma is None:
+                endpoint.latency_ewma = seconds
+            else:
+                endpoint.latency_ewma += LATENCY_EWMA_ALPHA * (seconds - endpoint.latency_ewma)
+
+    def _effective_weight(self, endpoint: RpcEndpoint, best_latency: Optional[float]) -> float:
+        if not endpoint.latency_ewma or not best_latency:
+            return endpoint.weight
+        return endpoint.weight * max(MIN_LATENCY_FACTOR, min(1.0, best_latency / endpoint.latency_ewma))
+
+    def read_endpoints(self) -> list[RpcEndpoint]:
+        """本次读请求的尝试顺序：加权轮询选出的节点在前，其余健康节点按延迟排序，熔断中的节点最后。"""
+        with self._lock:
+            healthy = [endpoint for endpoint in self.endpoints if endpoint.breaker.state == STATE_CLOSED]
+            unhealthy = [endpoint for endpoint in self.endpoints if endpoint.breaker.state != STATE_CLOSED]
+            candidates = [endpoint for endpoint in healthy if endpoint.weight > 0] or healthy
+            if not candidates:
+                return unhealthy
+
+            latencies = [endpoint.latency_ewma for endpoint in candidates if endpoint.latency_ewma]
+            best_latency = min(latencies) if latencies else None
+            # 平滑加权轮询（同 nginx）：累加有效权重，选当前值最大者，再减去总权重
+            total = 0.0
+            chosen = candidates[0]
+            for endpoint in candidates:
+                effective = self._effective_weight(endpoint, best_latency)
+                endpoint.current_weight += effective
+                total += effective
+                if endpoint.current_weight > chosen.current_weight:
+                    chosen = endpoint
+            chosen.current_weight -= total
+
+            rest = sorted(
+                (endpoint for endpoint in healthy if endpoint is not chosen),
+                key=lambda endpoint: endpoint.latency_ewma if endpoint.latency_ewma is not None else float("inf"),
+            )
+            return [chosen, *rest, *unhealthy]
+
+    def write_endpoints(self) -> list[RpcEndpoint]:
+        """写请求按配置顺序：主节点健康时总是主节点，否则依次降级，保证同一钱包的交易尽量发往同一个节点。"""
+        healthy = [endpoint for endpoint in self.endpoints if endpoint.breaker.state == STATE_CLOSED]
+        unhealthy = [endpoint for endpoint in self.endpoints if endpoint.breaker.state != STATE_CLOSED]
+        return healthy + unhealthy
+
+    def health_state(self) -> str:
+        states = [endpoint.breaker.state == STATE_CLOSED for endpoint in self.endpoints]
+        if all(states):
+            return "ok"
+        return "degraded" if any(states) else "down"
+
+    def snapshot(self) -> list[dict[str, Any]]:
+        return [
+            {**endpoint.breaker.snapshot(), "weight": endpoint.weight, "latency_ewma": endpoint.latency_ewma}
+            for endpoint in self.endpoints
+        ]
+
+    def render_metrics(self) -> str:
+        lines = [
+            "# HELP chain_rpc_latency_seconds 节点读请求延迟（EWMA）",
+            "# TYPE chain_rpc_latency_seconds gauge",
+        ]
+        for endpoint in self.endpoints:
+            if endpoint.latency_ewma is not None:
+                lines.append(f'chain_rpc_latency_seconds{{provider="{endpoint.breaker.name}"}} {endpoint.latency_ewma:.6f}')
+        return render_breaker_metrics([endpoint.breaker for endpoint in self.endpoints]) + "\n".join(lines) + "\n"
@@ -1,27 +1,135 @@
 import hashlib
 import json
-from typing import Any, Optional
+import logging
+import time
+from typing import Any, Callable, Optional, TypeVar
 
+import requests
+from eth_abi import decode as abi_decode
 from web3 import Web3
 
 from app.config import settings
+from app.features.blockchain.breaker import ChainHealthMonitor, ChainUnavailableError, CircuitBreaker
+from app.features.blockchain.cache import TTLCache
+from app.features.blockchain.nonce import NonceManager
+from app.features.blockchain.pool import RpcEndpoint, RpcEndpointPool, parse_provider_uris
+
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+# 只有连接失败和超时计入熔断；合约回滚等错误说明节点可达
+TRANSPORT_ERRORS = (requests.ConnectionError, requests.Timeout, ConnectionError, TimeoutError)
+
+
+def raw_transaction_bytes(signed: Any) -> bytes:
+    # eth-account 0.13 起改名为 raw_transaction，web3 6.x 依赖的旧版本只有 rawTransaction
+    raw = getattr(signed, "raw_transaction", None)
+    return raw if raw is not None else signed.rawTransaction
+
+
+def is_nonce_error(exc: Exception) -> bool:
+    message = str(exc).lower()
+    return "nonce" in message or "underpriced" in message
 
 
 class HealthDataChainService:
     def __init__(self) -> None:
-        self.web3 = Web3(Web3.HTTPProvider(settings.WEB3_PROVIDER_URI))
+        # 读请求在各节点间加权分摊，写交易、nonce 与链参数走主节点，节点故障时按顺序切换
+        self.pool = RpcEndpointPool(parse_provider_uris(settings.WEB3_PROVIDER_URIS, settings.WEB3_PROVIDER_URI))
+        self._rpc_session = requests.Session()
         self._enabled = bool(settings.HEALTH_DATA_CONTRACT_ADDRESS and settings.HEALTH_DATA_CONTRACT_ABI_JSON)
         self._contract = None
+        self._nonce_manager = NonceManager(
+            lambda address: self.on_write_endpoint(
+                lambda endpoint: endpoint.web3.eth.get_transaction_count(address, "pending")
+            )
+        )
+        # chain id 与 gas price 变化很少，按 TTL 缓存，不再每笔交易都查询节点
+        self._chain_params = TTLCache(maxsize=4, ttl_seconds=settings.WEB3_CHAIN_PARAMS_CACHE_SECONDS)
+        # 事件索引器启动后注册的本地镜像读取函数：{data_id: 记录或 None}，未索引的 data_id 不返回
+        self._index_reader: Optional[Callable[[list[str]], dict[str, Any]]] = None
 
         if self._enabled:
             abi = json.loads(settings.HEALTH_DATA_CONTRACT_ABI_JSON)
             checksum_address = Web3.to_checksum_address(settings.HEALTH_DATA_CONTRACT_ADDRESS)
-            self._contract = self.web3.eth.contract(address=checksum_address, abi=abi)
+            for endpoint in self.pool.endpoints:
+                endpoint.contract = endpoint.web3.eth.contract(address=checksum_address, abi=abi)
+            self._contract = self.pool.primary.contract
+
+    @property
+    def web3(self) -> Web3:
+        """当前写节点：主节点可用时为主节点。"""
+        return self.pool.write_endpoints()[0].web3
+
+    @property
+    def breaker(self) -> CircuitBreaker:
+        return self.pool.primary.breaker
 
     @property
     def enabled(self) -> bool:
         return self._enabled and self._contract is not None
 
+    @property
+    def contract(self) -> Any:
+        return self._contract
+
+    @property
+    def nonce_manager(self) -> NonceManager:
+        return self._nonce_manager
+
+    @property
+    def index_enabled(self) -> bool:
+        return self._index_reader is not None
+
+    def attach_index_reader(self, reader: Optional[Callable[[list[str]], dict[str, Any]]]) -> None:
+        self._index_reader = reader
+
+    def read_indexed(self, data_id_hexes: list[str]) -> dict[str, Any]:
+        if self._index_reader is None:
+            return {}
+        try:
+            return self._index_reader(data_id_hexes)
+        except Exception:  # noqa: BLE001
+            # 镜像表不可用时不影响校验，全部改走 RPC
+            logger.exception("Reading indexed chain records failed")
+            return {}
+
+    def _call_endpoints(
+        self,
+        endpoints: list[RpcEndpoint],
+        operation: Callable[[RpcEndpoint], T],
+        *,
+        track_latency: bool,
+    ) -> T:
+        """按顺序在节点上执行一次调用：熔断中的节点直接跳过，连接失败或超时换下一个节点；全部不可用时抛 ChainUnavailableError。"""
+        last_error: Optional[BaseException] = None
+        for endpoint in endpoints:
+            if not endpoint.breaker.allow_request():
+                continue
+            started = time.perf_counter()
+            try:
+                result = operation(endpoint)
+            except TRANSPORT_ERRORS as exc:
+                endpoint.breaker.record_failure(exc)
+                last_error = exc
+                logger.warning("Chain RPC call to %s failed: %s", endpoint.breaker.name, exc)
+                continue
+            except Exception:
+                endpoint.breaker.record_success()
+                raise
+            endpoint.breaker.record_success()
+            if track_latency:
+                self.pool.record_latency(endpoint, time.perf_counter() - started)
+            return result
+        raise ChainUnavailableError("链上节点暂不可用") from last_error
+
+    def on_read_endpoint(self, operation: Callable[[RpcEndpoint], T]) -> T:
+        return self._call_endpoints(self.pool.read_endpoints(), operation, track_latency=True)
+
+    def on_write_endpoint(self, operation: Callable[[RpcEndpoint], T]) -> T:
+        return self._call_endpoints(self.pool.write_endpoints(), operation, track_latency=False)
+
     def to_bytes32(self, value: str) -> bytes:
         hex_value = value[2:] if value.startswith("0x") else value
         raw = bytes.fromhex(hex_value)
@@ -32,58 +140,125 @@ class HealthDataChainService:
     def digest_to_bytes32(self, value: str) -> bytes:
         return hashlib.sha256(value.encode("utf-8")).digest()
 
-    def _build_tx_options(self, from_address: str, nonce: int) -> dict[str, Any]:
+    def resolve_encrypted_digest(self, source: Optional[str], digest_hex: Optional[str]) -> bytes:
+        # 大文件上传时调用方已增量算好摘要，可直接传 digest_hex，避免再拼接完整载荷
+        if digest_hex:
+            return self.to_bytes32(digest_hex)
+        return self.digest_to_bytes32(source or "")
+
+    def _chain_id(self) -> int:
+        return self._chain_params.get_or_create(
+            "chain_id", lambda: self.on_write_endpoint(lambda endpoint: endpoint.web3.eth.chain_id)
+        )
+
+    def _gas_price(self) -> int:
+        if settings.WEB3_GAS_PRICE_GWEI:
+            return Web3.to_wei(settings.WEB3_GAS_PRICE_GWEI, "gwei")
+        return self._chain_params.get_or_create(
+            "gas_price", lambda: self.on_write_endpoint(lambda endpoint: endpoint.web3.eth.gas_price)
+        )
+
+    def refresh_chain_params(self) -> None:
+        self._chain_params.clear()
+
+    def _build_tx_options(self, from_address: str, nonce: int, gas: Optional[int] = None) -> dict[str, Any]:
         return {
             "from": from_address,
             "nonce": nonce,
-            "gas": 400000,
-            "gasPrice": self.web3.to_wei("2", "gwei"),
-            "chainId": self.web3.eth.chain_id,
+            "gas": gas or 400000,
+            "gasPrice": self._gas_price(),
+            "chainId": self._chain_id(),
         }
 
-    def _send_transaction(self, function_call: Any, owner_private_key: str) -> dict[str, Any] | None:
-        if not self.enabled:
-            return None
+    def _sign_and_send(
+        self,
+        function_call: Any,
+        owner_private_key: str,
+        from_address: str,
+        gas: Optional[int] = None,
+    ) -> tuple[Any, int]:
+        nonce = self._nonce_manager.allocate(from_address)
+        try:
+            tx = function_call.build_transaction(self._build_tx_options(from_address, nonce, gas))
+            raw = raw_transaction_bytes(self.web3.eth.account.sign_transaction(tx, private_key=owner_private_key))
+            # 签名后的交易哈希固定，主节点故障时把同一笔交易发往下一个节点不会重复上链
+            return self.on_write_endpoint(lambda endpoint: endpoint.web3.eth.send_raw_transaction(raw)), nonce
+        except Exception as exc:
+            self._nonce_manager.release(from_address, nonce)
+            if is_nonce_error(exc):
+                # 同一钱包在别处也发过交易，本地计数已过期
+                self._nonce_manager.resync(from_address)
+            raise
 
-        account = self.web3.eth.account.from_key(owner_private_key)
-        nonce = self.web3.eth.get_transaction_count(account.address)
-        tx = function_call.build_transaction(self._build_tx_options(account.address, nonce))
-        signed = self.web3.eth.account.sign_transaction(tx, private_key=owner_private_key)
-        tx_hash = self.web3.eth.send_raw_transaction(signed.raw_transaction)
-        receipt = self.web3.eth.wait_for_transaction_receipt(tx_hash)
+    def _broadcast(
+        self,
+        function_call: Any,
+        owner_private_key: str,
+        from_address: str,
+        gas: Optional[int] = None,
+    ) -> tuple[Any, int]:
+        try:
+            return self._sign_and_send(function_call, owner_private_key, from_address, gas)
+        except Exception as exc:  # noqa: BLE001
+            if not is_nonce_error(exc):
+                raise
+            return self._sign_and_send(function_call, owner_private_key, from_address, gas)
+
+    def _await_receipt(self, from_address: str, tx_hash: Any, nonce: int) -> dict[str, Any]:
+        # 等待回执时不占用账户锁，同一钱包的后续交易可以继续取号广播
+        try:
+            receipt = self.on_write_endpoint(lambda endpoint: endpoint.web3.eth.wait_for_transaction_receipt(tx_hash))
+        finally:
+            self._nonce_manager.confirm(from_address, nonce)
         return {
             "tx_hash": receipt.transactionHash.hex(),
             "status": receipt.status,
             "receipt": receipt,
-            "owner": account.address,
+            "owner": from_address,
         }
 
-    def _extract_data_stored_event(self, receipt: Any) -> Optional[str]:
+    def _send_transaction(
+        self,
+        function_call: Any,
+        owner_private_key: str,
+        gas: Optional[int] = None,
+    ) -> dict[str, Any] | None:
         if not self.enabled:
             return None
+
+        account = self.web3.eth.account.from_key(owner_private_key)
+        tx_hash, nonce = self._broadcast(function_call, owner_private_key, account.address, gas)
+        return self._await_receipt(account.address, tx_hash, nonce)
+
+    def _extract_data_stored_event(self, receipt: Any) -> Optional[str]:
+        data_ids = self._extract_data_stored_events(receipt)
+        return data_ids[0] if data_ids else None
+
+    def _extract_data_stored_events(self, receipt: Any) -> list[str]:
+        # 批量写入时合约按入参顺序逐条触发 DataStored
+        if not self.enabled:
+            return []
         try:
             events = self._contract.events.DataStored().process_receipt(receipt)
-            if not events:
-                return None
-            data_id = events[0]["args"].get("dataId")
-            return Web3.to_hex(data_id) if data_id is not None else None
+            return [Web3.to_hex(event["args"]["dataId"]) for event in events]
         except Exception:
-            return None
+            return []
 
     def store_health_data(
         self,
         *,
         owner_private_key: str,
         data_hash_hex: str,
-        encrypted_digest_source: str,
         data_type: str,
+        encrypted_digest_source: Optional[str] = None,
+        encrypted_digest_hex: Optional[str] = None,
     ) -> dict[str, Any] | None:
         if not self.enabled:
             return None
 
         function_call = self._contract.functions.storeHealthData(
             self.to_bytes32(data_hash_hex),
-            self.digest_to_bytes32(encrypted_digest_source),
+            self.resolve_encrypted_digest(encrypted_digest_source, encrypted_digest_hex),
             data_type,
         )
         result = self._send_transaction(function_call, owner_private_key)
@@ -99,7 +274,8 @@ class HealthDataChainService:
         owner_private_key: str,
         data_id_hex: str,
         data_hash_hex: str,
-        encrypted_digest_source: str,
+        encrypted_digest_source: Optional[str] = None,
+        encrypted_digest_hex: Optional[str] = None,
     ) -> dict[str, Any] | None:
         if not self.enabled:
             return None
@@ -107,7 +283,7 @@ class HealthDataChainService:
         function_call = self._contract.functions.updateHealthData(
             self.to_bytes32(data_id_hex),
             self.to_bytes32(data_hash_hex),
-            self.digest_to_bytes32(encrypted_digest_source),
+            self.resolve_encrypted_digest(encrypted_digest_source, encrypted_digest_hex),
         )
         result = self._send_transaction(function_call, owner_private_key)
         if not result:
@@ -116,12 +292,240 @@ class HealthDataChainService:
         result.pop("receipt", None)
         return result
 
-    def get_health_record(self, *, data_id_hex: str) -> dict[str, Any] | None:
+    @property
+    def batch_writes_enabled(self) -> bool:
+        """已部署合约的 ABI 是否包含批量写入入口；旧合约只能逐条发送。"""
+        return self.enabled and {"storeHealthDataBatch", "updateHealthDataBatch"} <= {
+            item.get("name") for item in self._contract.abi if item.get("type") == "function"
+        }
+
+    def _chunk_batch(self, items: list[dict[str, Any]], key: str) -> list[list[dict[str, Any]]]:
+        # 合约按 (调用人, dataHash, 区块时间) 生成 dataId，同一批次内的重复项放到下一批
+        chunks: list[list[dict[str, Any]]] = []
+        current: list[dict[str, Any]] = []
+        seen: set[str] = set()
+        limit = max(1, min(settings.CHAIN_BATCH_MAX_RECORDS, 100))
+        for item in items:
+            if len(current) >= limit or item[key].lower() in seen:
+                chunks.append(current)
+                current, seen = [], set()
+            current.append(item)
+            seen.add(item[key].lower())
+        if current:
+            chunks.append(current)
+        return chunks
+
+    def _plan_batch_transactions(
+        self,
+        fn_name: str,
+        build_args: Callable[[list[dict[str, Any]]], tuple[Any, ...]],
+        chunk: list[dict[str, Any]],
+        from_address: str,
+    ) -> list[tuple[list[dict[str, Any]], Any, int]]:
+        """逐批估算 gas，超出单笔上限时对半拆分，返回 [(条目, 合约调用, gas)]。"""
+        args = build_args(chunk)
+        estimated = self.on_write_endpoint(
+            lambda endpoint: getattr(endpoint.contract.functions, fn_name)(*args).estimate_gas({"from": from_address})
+        )
+        gas = int(estimated * settings.CHAIN_BATCH_GAS_MARGIN)
+        if gas > settings.CHAIN_BATCH_GAS_LIMIT and len(chunk) > 1:
+            middle = len(chunk) // 2
+            return self._plan_batch_transactions(
+                fn_name, build_args, chunk[:middle], from_address
+            ) + self._plan_batch_transactions(fn_name, build_args, chunk[middle:], from_address)
+        return [(chunk, getattr(self._contract.functions, fn_name)(*args), gas)]
+
+    def _send_batches(
+        self,
+        fn_name: str,
+        build_args: Callable[[list[dict[str, Any]]], tuple[Any, ...]],
+        chunks: list[list[dict[str, Any]]],
+        owner_private_key: str,
+    ) -> list[tuple[list[dict[str, Any]], dict[str, Any]]]:
+        account = self.web3.eth.account.from_key(owner_private_key)
+        planned = [
+            plan
+            for chunk in chunks
+            for plan in self._plan_batch_transactions(fn_name, build_args, chunk, account.address)
+        ]
+        # 先连续取号广播，再统一等待回执，多笔批量交易可以进入同一个区块。
+        # 第一笔就失败时直接抛出；之后的失败只记在对应批次的 "error" 上，已广播的批次照常等待回执
+        outcomes: list[tuple[list[dict[str, Any]], Any]] = []
+        for index, (chunk, function_call, gas) in enumerate(planned):
+            try:
+                outcomes.append((chunk, self._broadcast(function_call, owner_private_key, account.address, gas)))
+            except Exception as exc:  # noqa: BLE001
+                if index == 0:
+                    raise
+                outcomes.extend((pending_chunk, exc) for pending_chunk, _, _ in planned[index:])
+                break
+
+        results = []
+        for chunk, outcome in outcomes:
+            if not isinstance(outcome, Exception):
+                try:
+                    results.append((chunk, self._await_receipt(account.address, *outcome)))
+                    continue
+                except Exception as exc:  # noqa: BLE001
+                    outcome = exc
+            results.append(
+                (chunk, {"tx_hash": None, "status": None, "receipt": None, "owner": account.address, "error": outcome})
+            )
+        return results
+
+    def store_health_data_batch(
+        self,
+        *,
+        owner_private_key: str,
+        items: list[dict[str, Any]],
+    ) -> list[dict[str, Any]]:
+        """批量存储：items 每项含 data_hash_hex、data_type 以及 encrypted_digest_source 或 encrypted_digest_hex。
+
+        按 CHAIN_BATCH_MAX_RECORDS 分批，每批一笔交易；返回与 items 一一对应的
+        {"tx_hash", "status", "owner", "data_id"}，交易回滚的条目 data_id 为 None，
+        未能发出或未拿到回执的条目另带 "error"（异常对象）。
+        """
+        if not self.enabled or not items:
+            return []
+        if not self.batch_writes_enabled:
+            raise ValueError("合约未部署批量写入接口")
+
+        def build_args(chunk: list[dict[str, Any]]) -> tuple[Any, ...]:
+            return (
+                [self.to_bytes32(item["data_hash_hex"]) for item in chunk],
+                [
+                    self.resolve_encrypted_digest(item.get("encrypted_digest_source"), item.get("encrypted_digest_hex"))
+                    for item in chunk
+                ],
+                [item["data_type"] for item in chunk],
+            )
+
+        results: dict[int, dict[str, Any]] = {}
+        for chunk, result in self._send_batches(
+            "storeHealthDataBatch", build_args, self._chunk_batch(items, "data_hash_hex"), owner_private_key
+        ):
+            receipt = result.pop("receipt")
+            data_ids = self._extract_data_stored_events(receipt) if result["status"] else []
+            for position, item in enumerate(chunk):
+                data_id = data_ids[position] if position < len(data_ids) else None
+                results[id(item)] = dict(result, data_id=data_id)
+        return [results[id(item)] for item in items]
+
+    def update_health_data_batch(
+        self,
+        *,
+        owner_private_key: str,
+        items: list[dict[str, Any]],
+    ) -> list[dict[str, Any]]:
+        """批量更新：items 每项含 data_id_hex、data_hash_hex 以及 encrypted_digest_source 或 encrypted_digest_hex。"""
+        if not self.enabled or not items:
+            return []
+        if not self.batch_writes_enabled:
+            raise ValueError("合约未部署批量写入接口")
+
+        def build_args(chunk: list[dict[str, Any]]) -> tuple[Any, ...]:
+            return (
+                [self.to_bytes32(item["data_id_hex"]) for item in chunk],
+                [self.to_bytes32(item["data_hash_hex"]) for item in chunk],
+                [
+                    self.resolve_encrypted_digest(item.get("encrypted_digest_source"), item.get("encrypted_digest_hex"))
+                    for item in chunk
+                ],
+            )
+
+        results: dict[int, dict[str, Any]] = {}
+        for chunk, result in self._send_batches(
+            "updateHealthDataBatch", build_args, self._chunk_batch(items, "data_id_hex"), owner_private_key
+        ):
+            result.pop("receipt")
+            for item in chunk:
+                results[id(item)] = dict(result, data_id=item["data_id_hex"])
+        return [results[id(item)] for item in items]
+
+    def get_health_record(self, *, data_id_hex: str, use_index: bool = True) -> dict[str, Any] | None:
         if not self.enabled:
             return None
 
-        raw = self._contract.functions.healthRecords(self.to_bytes32(data_id_hex)).call()
-        owner = raw[3]
+        if use_index:
+            indexed = self.read_indexed([data_id_hex])
+            if data_id_hex in indexed:
+                return indexed[data_id_hex]
+        data_id = self.to_bytes32(data_id_hex)
+        raw = self.on_read_endpoint(lambda endpoint: endpoint.contract.functions.healthRecords(data_id).call())
+        return self.format_health_record(raw)
+
+    def get_health_records_batch(
+        self,
+        *,
+        data_id_hexes: list[str],
+        use_index: bool = True,
+    ) -> dict[str, dict[str, Any] | None]:
+        """先查本地事件镜像，未索引的再用一次 JSON-RPC 批量请求读取，返回 {data_id: 记录或 None}。"""
+        if not self.enabled or not data_id_hexes:
+            return {}
+
+        unique_ids = list(dict.fromkeys(data_id_hexes))
+        indexed = self.read_indexed(unique_ids) if use_index else {}
+        unique_ids = [data_id for data_id in unique_ids if data_id not in indexed]
+        if not unique_ids:
+            return indexed
+        payload = [
+            {
+                "jsonrpc": "2.0",
+                "id": index,
+                "method": "eth_call",
+                "params": [
+                    {
+                        "to": self._contract.address,
+                        "data": self._contract.encodeABI(fn_name="healthRecords", args=[self.to_bytes32(data_id)]),
+                    },
+                    "latest",
+                ],
+            }
+            for index, data_id in enumerate(unique_ids)
+        ]
+
+        try:
+            replies = self.on_read_endpoint(lambda endpoint: self._post_batch(endpoint.uri, payload))
+        except ValueError:
+            # 个别节点不支持批量请求时退回逐条读取
+            indexed.update(
+                {data_id: self.get_health_record(data_id_hex=data_id, use_index=False) for data_id in unique_ids}
+            )
+            return indexed
+
+        output_types = self.health_record_output_types()
+        results: dict[str, dict[str, Any] | None] = dict(indexed)
+        for reply in replies:
+            data_id = unique_ids[int(reply["id"])]
+            if reply.get("error"):
+                raise RuntimeError(reply["error"].get("message") or "链上读取失败")
+            raw = abi_decode(output_types, Web3.to_bytes(hexstr=reply.get("result") or "0x"))
+            results[data_id] = self.format_health_record(raw)
+        return results
+
+    def _post_batch(self, uri: str, payload: list[dict[str, Any]]) -> list[dict[str, Any]]:
+        response = self._rpc_session.post(
+            uri,
+            json=payload,
+            timeout=settings.WEB3_REQUEST_TIMEOUT_SECONDS,
+        )
+        # 节点可达但拒绝批量请求时按 ValueError 处理，由调用方退回逐条读取；连接类错误原样抛出计入熔断
+        if response.status_code >= 400:
+            raise ValueError(f"节点不支持 JSON-RPC 批量请求：HTTP {response.status_code}")
+        replies = response.json()
+        if not isinstance(replies, list):
+            raise ValueError("节点不支持 JSON-RPC 批量请求")
+        return replies
+
+    def health_record_output_types(self) -> list[str]:
+        for item in self._contract.abi:
+            if item.get("type") == "function" and item.get("name") == "healthRecords":
+                return [output["type"] for output in item.get("outputs", [])]
+        raise ValueError("合约 ABI 缺少 healthRecords")
+
+    def format_health_record(self, raw: Any) -> dict[str, Any] | None:
+        owner = Web3.to_checksum_address(raw[3])
         is_active = bool(raw[4])
         if not owner or owner == "0x0000000000000000000000000000000000000000" or not is_active:
             return None
@@ -138,3 +542,7 @@ class HealthDataChainService:
 
 
 chain_service = HealthDataChainService()
+chain_health_monitor = ChainHealthMonitor(
+    [(endpoint.breaker, lambda endpoint=endpoint: endpoint.web3.eth.block_number) for endpoint in chain_service.pool.endpoints],
+    settings.CHAIN_BREAKER_PROBE_SECONDS,
+)
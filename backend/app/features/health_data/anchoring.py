@@ -0,0 +1,163 @@
+import json
+import logging
+import threading
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy.orm import Session
+
+from app import models
+from app.config import settings
+from app.database import SessionLocal
+from app.features.blockchain.merkle import build_merkle_tree, compute_merkle_root, record_leaf
+from app.features.blockchain.service import chain_service
+
+
+logger = logging.getLogger(__name__)
+
+MERKLE_ROOT_DATA_TYPE = "merkle-root"
+
+_worker_thread: Optional[threading.Thread] = None
+_worker_stop = threading.Event()
+
+
+def merkle_anchoring_enabled() -> bool:
+    return settings.ONCHAIN_ANCHOR_MODE == "merkle"
+
+
+def reset_record_anchor(record: models.HealthData) -> None:
+    """内容变化后旧证明失效，记录回到待锚定队列，等待下一个窗口。"""
+    record.merkle_batch_id = None
+    record.merkle_proof = None
+    record.onchain_data_id = None
+    record.onchain_tx_hash = None
+
+
+def record_merkle_root(record: models.HealthData, data_hash_hex: str) -> Optional[str]:
+    """用记录保存的包含证明推出根哈希；证明缺失或损坏时返回 None。"""
+    if not record.merkle_proof:
+        return None
+    try:
+        proof = json.loads(record.merkle_proof)
+        root = compute_merkle_root(
+            record_leaf(record.id, data_hash_hex),
+            int(proof["leaf_index"]),
+            int(proof["leaf_count"]),
+            [bytes.fromhex(item[2:] if item.startswith("0x") else item) for item in proof["siblings"]],
+        )
+    except (TypeError, KeyError, ValueError):
+        return None
+    return "0x" + root.hex()
+
+
+def anchor_pending_records(db: Session, *, max_leaves: Optional[int] = None) -> Optional[models.HealthAnchorBatch]:
+    """把一批尚未锚定的记录摘要组成 Merkle 树并发送一笔交易锚定根哈希。没有待锚定记录时返回 None。"""
+    if not chain_service.enabled or not settings.ONCHAIN_ANCHOR_PRIVATE_KEY:
+        return None
+
+    records = (
+        db.query(models.HealthData.id, models.HealthData.data_hash)
+        .filter(
+            models.HealthData.merkle_batch_id.is_(None),
+            models.HealthData.onchain_data_id.is_(None),
+            models.HealthData.data_hash.isnot(None),
+        )
+        .order_by(models.HealthData.id.asc())
+        .limit(max_leaves or settings.ONCHAIN_ANCHOR_MAX_LEAVES)
+        .all()
+    )
+    if not records:
+        return None
+
+    root, proofs = build_merkle_tree([record_leaf(record.id, record.data_hash) for record in records])
+    batch = models.HealthAnchorBatch(merkle_root="0x" + root.hex(), leaf_count=len(records), status="pending")
+    db.add(batch)
+    db.flush()
+
+    # 先把证明落库再发交易：交易成功后只需按批次回写交易信息
+    db.bulk_update_mappings(
+        models.HealthData,
+        [
+            {
+                "id": record.id,
+                "merkle_batch_id": batch.id,
+                "merkle_proof": json.dumps(
+                    {
+                        "leaf_index": leaf_index,
+                        "leaf_count": len(records),
+                        "siblings": ["0x" + sibling.hex() for sibling in proofs[leaf_index]],
+                    },
+                    separators=(",", ":"),
+                ),
+            }
+            for leaf_index, record in enumerate(records)
+        ],
+    )
+    db.commit()
+
+    try:
+        chain_result = chain_service.store_health_data(
+            owner_private_key=settings.ONCHAIN_ANCHOR_PRIVATE_KEY,
+            data_hash_hex=batch.merkle_root,
+            encrypted_digest_hex=batch.merkle_root,
+            data_type=MERKLE_ROOT_DATA_TYPE,
+        )
+        if not chain_result or not chain_result.get("data_id"):
+            raise RuntimeError("锚定交易未返回 dataId")
+    except Exception as exc:  # noqa: BLE001
+        logger.warning("Merkle batch %s anchoring failed: %s", batch.id, exc)
+        batch.status = "failed"
+        batch.error_message = str(exc)[:500]
+        # 释放本批记录，下一个窗口重新组树
+        db.query(models.HealthData).filter(models.HealthData.merkle_batch_id == batch.id).update(
+            {"merkle_batch_id": None, "merkle_proof": None},
+            synchronize_session=False,
+        )
+        db.commit()
+        return batch
+
+    batch.status = "anchored"
+    batch.onchain_data_id = chain_result["data_id"]
+    batch.onchain_tx_hash = chain_result.get("tx_hash")
+    batch.anchored_at = datetime.now()
+    # 只回写仍属于本批次的记录；窗口期间被修改过的记录已重置批次，不会拿到过期的交易信息
+    db.query(models.HealthData).filter(models.HealthData.merkle_batch_id == batch.id).update(
+        {
+            "onchain_data_id": batch.onchain_data_id,
+            "onchain_tx_hash": batch.onchain_tx_hash,
+            "onchain_status": "confirmed",
+        },
+        synchronize_session=False,
+    )
+    db.commit()
+    return batch
+
+
+def _run_anchor_worker() -> None:
+    while not _worker_stop.wait(settings.ONCHAIN_ANCHOR_WINDOW_SECONDS):
+        db = SessionLocal()
+        try:
+            while not _worker_stop.is_set():
+                batch = anchor_pending_records(db)
+                if batch is None or batch.status != "anchored" or batch.leaf_count < settings.ONCHAIN_ANCHOR_MAX_LEAVES:
+                    break
+        except Exception:  # noqa: BLE001
+            logger.exception("Merkle anchor worker iteration failed")
+            db.rollback()
+        finally:
+            db.close()
+
+
+def start_anchor_worker() -> None:
+    global _worker_thread
+    if not merkle_anchoring_enabled() or not chain_service.enabled or not settings.ONCHAIN_ANCHOR_PRIVATE_KEY:
+        return
+    if _worker_thread is not None and _worker_thread.is_alive():
+        return
+    _worker_stop.clear()
+    _worker_thread = threading.Thread(target=_run_anchor_worker, name="merkle-anchor-worker", daemon=True)
+    _worker_thread.start()
+
+
+def stop_anchor_worker() -> None:
+    _worker_stop.set()
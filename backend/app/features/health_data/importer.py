@@ -0,0 +1,143 @@
+import codecs
+import csv
+import json
+from dataclasses import dataclass
+from datetime import datetime
+from typing import BinaryIO, Iterator, Optional, Union
+
+from app.features.health_data.metrics import extract_metric_values
+
+
+# 批量导入的格式解析：逐行读取 NDJSON / CSV，把每行规范成 ImportRow，解析失败的行返回错误信息，
+# 不在这里做加密和入库。
+
+IMPORT_FORMATS = ("ndjson", "csv")
+RESERVED_COLUMNS = {"data_title", "data_content", "is_public", "recorded_at", "metrics"}
+_TRUE_VALUES = {"1", "true", "yes", "y", "public", "是"}
+_FALSE_VALUES = {"0", "false", "no", "n", "private", "否", ""}
+
+
+@dataclass
+class ImportRow:
+    line_number: int
+    data_title: Optional[str]
+    data_content: str
+    is_public: Optional[bool]
+    recorded_at: Optional[datetime]
+
+
+def detect_import_format(requested: Optional[str], filename: Optional[str], content_type: Optional[str]) -> str:
+    if requested:
+        normalized = requested.strip().lower()
+        if normalized == "jsonl":
+            normalized = "ndjson"
+        if normalized not in IMPORT_FORMATS:
+            raise ValueError("仅支持 ndjson 或 csv 格式")
+        return normalized
+    lowered_name = (filename or "").lower()
+    if lowered_name.endswith(".csv") or (content_type or "").lower() in {"text/csv", "application/csv"}:
+        return "csv"
+    return "ndjson"
+
+
+def _parse_bool(value) -> Optional[bool]:
+    if value is None:
+        return None
+    if isinstance(value, bool):
+        return value
+    normalized = str(value).strip().lower()
+    if normalized in _TRUE_VALUES:
+        return True
+    if normalized in _FALSE_VALUES:
+        return None if normalized == "" else False
+    raise ValueError(f"is_public 取值无效：{value}")
+
+
+def _parse_recorded_at(value) -> Optional[datetime]:
+    if value is None or (isinstance(value, str) and not value.strip()):
+        return None
+    if not isinstance(value, str):
+        raise ValueError("recorded_at 需为 ISO 8601 时间字符串")
+    text = value.strip()
+    if text.endswith("Z"):
+        text = text[:-1] + "+00:00"
+    try:
+        parsed = datetime.fromisoformat(text)
+    except ValueError as exc:
+        raise ValueError(f"recorded_at 格式无效：{value}") from exc
+    if parsed.tzinfo is not None:
+        # 库内时间统一为服务器本地的无时区时间
+        parsed = parsed.astimezone().replace(tzinfo=None)
+    return parsed
+
+
+def _build_row(line_number: int, item: dict, extra_metrics: Optional[dict] = None) -> ImportRow:
+    content = item.get("data_content")
+    if isinstance(content, (dict, list)):
+        content = json.dumps(content, ensure_ascii=False)
+    elif content is not None and not isinstance(content, str):
+        raise ValueError("data_content 需为字符串或 JSON 对象")
+
+    metrics = item.get("metrics")
+    if metrics is not None and not isinstance(metrics, dict):
+        raise ValueError("metrics 需为 JSON 对象")
+    metrics = dict(metrics or {})
+    metrics.update(extra_metrics or {})
+    if not content and metrics:
+        content = json.dumps({"metrics": metrics}, ensure_ascii=False)
+    if not content:
+        raise ValueError("文本健康数据不能为空")
+
+    title = item.get("data_title")
+    return ImportRow(
+        line_number=line_number,
+        data_title=str(title)[:255] if title not in (None, "") else None,
+        data_content=content,
+        is_public=_parse_bool(item.get("is_public")),
+        recorded_at=_parse_recorded_at(item.get("recorded_at")),
+    )
+
+
+def _iter_ndjson(stream) -> Iterator[tuple[int, Union[ImportRow, str]]]:
+    for line_number, line in enumerate(stream, start=1):
+        if not line.strip():
+            continue
+        try:
+            item = json.loads(line)
+            if not isinstance(item, dict):
+                raise ValueError("每行需为一个 JSON 对象")
+            yield line_number, _build_row(line_number, item)
+        except json.JSONDecodeError:
+            yield line_number, "JSON 解析失败"
+        except ValueError as exc:
+            yield line_number, str(exc)
+
+
+def _iter_csv(stream) -> Iterator[tuple[int, Union[ImportRow, str]]]:
+    reader = csv.DictReader(stream)
+    for item in reader:
+        line_number = reader.line_num
+        if not any((value or "").strip() for value in item.values() if isinstance(value, str)):
+            continue
+        try:
+            # 非保留列视为指标列，例如 weight、heart_rate
+            metric_columns = {
+                key: value
+                for key, value in item.items()
+                if key and key not in RESERVED_COLUMNS and isinstance(value, str) and value.strip()
+            }
+            extra_metrics = extract_metric_values(json.dumps({"metrics": metric_columns}))
+            invalid = sorted(set(metric_columns) - set(extra_metrics))
+            if invalid:
+                raise ValueError(f"指标列不是数值：{', '.join(invalid)}")
+            yield line_number, _build_row(line_number, item, extra_metrics)
+        except ValueError as exc:
+            yield line_number, str(exc)
+
+
+def iter_import_rows(stream: BinaryIO, import_format: str) -> Iterator[tuple[int, Union[ImportRow, str]]]:
+    """逐行产出 (行号, ImportRow 或错误信息)，按块解码上传文件，内存占用与文件大小无关。"""
+    text_stream = codecs.getreader("utf-8-sig")(stream, errors="replace")
+    if import_format == "csv":
+        return _iter_csv(text_stream)
+    return _iter_ndjson(text_stream)
@@ -0,0 +1,275 @@
+import hashlib
+import hmac
+import logging
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Callable, Optional
+
+from sqlalchemy.orm import Session
+
+from app import models
+from app.database import SessionLocal
+from app.features.blockchain.encryption import (
+    build_fernet_from_secret,
+    decrypt_binary,
+    decrypt_text,
+    rewrap_data_key,
+    unwrap_data_key,
+)
+from app.features.health_data.storage import public_storage_key, reseal_record_with_key
+
+
+# SECRET_KEY 轮换任务：受影响的是用 SECRET_KEY 加密的托管私钥（users.encrypted_private_key）
+# 与公开记录（公共存储密钥由 SECRET_KEY 派生）。部署时先把新密钥设为 SECRET_KEY、旧密钥设为
+# SECRET_KEY_PREVIOUS，接口在迁移期间对两种密钥都能解密；再运行本任务逐块改写，完成后移除旧密钥。
+#
+# 每个阶段按主键分块读取，块内的重新加密分发到进程池，结果连同断点在同一事务里提交；
+# 写回时以读到的密文为条件，不覆盖迁移期间接口写入的新内容。中断后重跑同一对密钥会从断点继续。
+
+logger = logging.getLogger(__name__)
+
+PHASE_USERS = "users"
+PHASE_PUBLIC_RECORDS = "public_records"
+PHASES = (PHASE_USERS, PHASE_PUBLIC_RECORDS)
+
+STATUS_ROTATED = "rotated"
+STATUS_SKIPPED = "skipped"
+STATUS_FAILED = "failed"
+
+# 进程池工作进程里的新旧密钥，由 initializer 设置，不随每个任务序列化
+_worker_secrets: tuple[str, str] = ("", "")
+
+
+def rotation_identifier(old_secret: str, new_secret: str) -> str:
+    # 只保存由两把密钥算出的 HMAC，断点表里不出现密钥本身
+    return hmac.new(new_secret.encode("utf-8"), old_secret.encode("utf-8"), hashlib.sha256).hexdigest()[:32]
+
+
+def _init_worker(old_secret: str, new_secret: str) -> None:
+    global _worker_secrets
+    _worker_secrets = (old_secret, new_secret)
+
+
+def _rotate_user_keys(rows: list[tuple[int, str]]) -> list[tuple[int, str, Optional[str]]]:
+    """重新加密托管私钥，返回 (用户 id, 状态, 新密文)。"""
+    old_fernet, new_fernet = (build_fernet_from_secret(secret) for secret in _worker_secrets)
+    results = []
+    for user_id, encrypted_value in rows:
+        token = encrypted_value.encode("utf-8")
+        try:
+            new_fernet.decrypt(token)
+            results.append((user_id, STATUS_SKIPPED, None))
+            continue
+        except Exception:  # noqa: BLE001
+            pass
+        try:
+            plaintext = old_fernet.decrypt(token)
+        except Exception:  # noqa: BLE001
+            results.append((user_id, STATUS_FAILED, None))
+            continue
+        results.append((user_id, STATUS_ROTATED, new_fernet.encrypt(plaintext).decode("utf-8")))
+    return results
+
+
+def _sealed_with(record: models.HealthData, storage_key: str) -> bool:
+    try:
+        if record.wrapped_data_key:
+            unwrap_data_key(record.wrapped_data_key, storage_key)
+        elif record.encrypted_data_content:
+            decrypt_text(record.encrypted_data_content, storage_key)
+        elif record.encrypted_pdf_data:
+            decrypt_binary(record.encrypted_pdf_data, storage_key)
+        return True
+    except ValueError:
+        return False
+
+
+def _rotate_public_records(
+    rows: list[tuple[int, Optional[str], Optional[str], Optional[bytes]]],
+) -> list[tuple[int, str, Optional[dict]]]:
+    """公开记录改用新的公共存储密钥，返回 (记录 id, 状态, 要写回的列)。
+
+    有数据密钥的记录只重新包装数据密钥；旧记录整体解密一次并改为数据密钥格式。
+    """
+    old_key, new_key = (public_storage_key(secret) for secret in _worker_secrets)
+    results = []
+    for record_id, wrapped_data_key, encrypted_data_content, encrypted_pdf_data in rows:
+        record = models.HealthData(
+            wrapped_data_key=wrapped_data_key,
+            encrypted_data_content=encrypted_data_content,
+            encrypted_pdf_data=encrypted_pdf_data,
+        )
+        if not (wrapped_data_key or encrypted_data_content or encrypted_pdf_data) or _sealed_with(record, new_key):
+            results.append((record_id, STATUS_SKIPPED, None))
+            continue
+        try:
+            if wrapped_data_key:
+                updates = {"wrapped_data_key": rewrap_data_key(wrapped_data_key, old_key, new_key)}
+            else:
+                reseal_record_with_key(record, old_key, new_key)
+                updates = {
+                    "wrapped_data_key": record.wrapped_data_key,
+                    "encrypted_data_content": record.encrypted_data_content,
+                    "encrypted_pdf_data": record.encrypted_pdf_data,
+                }
+        except ValueError:
+            results.append((record_id, STATUS_FAILED, None))
+            continue
+        results.append((record_id, STATUS_ROTATED, updates))
+    return results
+
+
+def _load_user_chunk(db: Session, after_id: int, limit: int) -> list[tuple[int, str]]:
+    return [
+        (row.id, row.encrypted_private_key)
+        for row in db.query(models.User.id, models.User.encrypted_private_key)
+        .filter(models.User.id > after_id, models.User.encrypted_private_key.isnot(None))
+        .order_by(models.User.id.asc())
+        .limit(limit)
+        .all()
+    ]
+
+
+def _load_public_record_chunk(
+    db: Session, after_id: int, limit: int
+) -> list[tuple[int, Optional[str], Optional[str], Optional[bytes]]]:
+    rows = (
+        db.query(models.HealthData.id, models.HealthData.wrapped_data_key, models.HealthData.encrypted_data_content)
+        .filter(models.HealthData.id > after_id, models.HealthData.is_public.is_(True))
+        .order_by(models.HealthData.id.asc())
+        .limit(limit)
+        .all()
+    )
+    # 只有没有数据密钥的旧记录需要整体重新加密，才读取它们的 PDF
+    legacy_ids = [row.id for row in rows if not row.wrapped_data_key]
+    pdf_by_id = {}
+    if legacy_ids:
+        pdf_by_id = dict(
+            db.query(models.HealthData.id, models.HealthData.encrypted_pdf_data)
+            .filter(models.HealthData.id.in_(legacy_ids))
+            .all()
+        )
+    return [(row.id, row.wrapped_data_key, row.encrypted_data_content, pdf_by_id.get(row.id)) for row in rows]
+
+
+def _write_user_results(db: Session, rows: list[tuple[int, str]], results) -> None:
+    previous = dict(rows)
+    for user_id, status, new_value in results:
+        if status != STATUS_ROTATED:
+            continue
+        db.query(models.User).filter(
+            models.User.id == user_id,
+            models.User.encrypted_private_key == previous[user_id],
+        ).update({"encrypted_private_key": new_value}, synchronize_session=False)
+
+
+def _write_public_record_results(db: Session, rows, results) -> None:
+    previous = {row[0]: row for row in rows}
+    for record_id, status, updates in results:
+        if status != STATUS_ROTATED:
+            continue
+        _, wrapped_data_key, encrypted_data_content, encrypted_pdf_data = previous[record_id]
+        column = models.HealthData
+        guards = [
+            column.id == record_id,
+            column.is_public.is_(True),
+            column.wrapped_data_key == wrapped_data_key if wrapped_data_key else column.wrapped_data_key.is_(None),
+        ]
+        if not wrapped_data_key:
+            guards.append(
+                column.encrypted_data_content == encrypted_data_content
+                if encrypted_data_content
+                else column.encrypted_data_content.is_(None)
+            )
+            if encrypted_pdf_data:
+                guards.append(column.encrypted_pdf_data == encrypted_pdf_data)
+        db.query(models.HealthData).filter(*guards).update(updates, synchronize_session=False)
+
+
+_PHASE_HANDLERS = {
+    PHASE_USERS: (_load_user_chunk, _rotate_user_keys, _write_user_results),
+    PHASE_PUBLIC_RECORDS: (_load_public_record_chunk, _rotate_public_records, _write_public_record_results),
+}
+
+
+def _load_checkpoint(db: Session, rotation_id: str, phase: str) -> models.SecretKeyRotationCheckpoint:
+    checkpoint = (
+        db.query(models.SecretKeyRotationCheckpoint)
+        .filter(
+            models.SecretKeyRotationCheckpoint.rotation_id == rotation_id,
+            models.SecretKeyRotationCheckpoint.phase == phase,
+        )
+        .first()
+    )
+    if checkpoint is None:
+        checkpoint = models.SecretKeyRotationCheckpoint(
+            rotation_id=rotation_id,
+            phase=phase,
+            last_id=0,
+            rows_rotated=0,
+            rows_skipped=0,
+            rows_failed=0,
+        )
+        db.add(checkpoint)
+        db.commit()
+    return checkpoint
+
+
+def _split(rows: list, parts: int) -> list[list]:
+    size = max(1, -(-len(rows) // parts))
+    return [rows[index : index + size] for index in range(0, len(rows), size)]
+
+
+def run_secret_key_rotation(
+    old_secret: str,
+    new_secret: str,
+    *,
+    phases: tuple[str, ...] = PHASES,
+    chunk_size: int = 500,
+    workers: int = 4,
+    progress: Optional[Callable[[str, models.SecretKeyRotationCheckpoint, float], None]] = None,
+) -> dict[str, dict]:
+    """执行（或从断点继续）一次 SECRET_KEY 轮换，返回各阶段的计数。progress(阶段, 断点, 本次运行每秒行数) 在每块提交后调用。"""
+    rotation_id = rotation_identifier(old_secret, new_secret)
+    summary: dict[str, dict] = {}
+    db = SessionLocal()
+    try:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(old_secret, new_secret)) as pool:
+            for phase in phases:
+                load_chunk, rotate, write_results = _PHASE_HANDLERS[phase]
+                checkpoint = _load_checkpoint(db, rotation_id, phase)
+                started = time.perf_counter()
+                processed = 0
+                while checkpoint.completed_at is None:
+                    rows = load_chunk(db, checkpoint.last_id, chunk_size)
+                    if not rows:
+                        checkpoint.completed_at = datetime.now()
+                        db.commit()
+                        break
+                    results = [item for part in pool.map(rotate, _split(rows, workers)) for item in part]
+                    failed_ids = [row_id for row_id, status, _ in results if status == STATUS_FAILED]
+                    if failed_ids:
+                        logger.warning("Secret key rotation %s: rows %s cannot be decrypted with either key", phase, failed_ids)
+                    write_results(db, rows, results)
+                    checkpoint.last_id = rows[-1][0]
+                    checkpoint.rows_rotated += sum(1 for _, status, _ in results if status == STATUS_ROTATED)
+                    checkpoint.rows_skipped += sum(1 for _, status, _ in results if status == STATUS_SKIPPED)
+                    checkpoint.rows_failed += sum(1 for _, status, _ in results if status == STATUS_FAILED)
+                    db.commit()
+                    # 释放本块加载的密文，内存不随总行数增长
+                    db.expunge_all()
+                    checkpoint = _load_checkpoint(db, rotation_id, phase)
+                    processed += len(rows)
+                    if progress is not None:
+                        progress(phase, checkpoint, processed / max(time.perf_counter() - started, 1e-9))
+                summary[phase] = {
+                    "last_id": checkpoint.last_id,
+                    "rotated": checkpoint.rows_rotated,
+                    "skipped": checkpoint.rows_skipped,
+                    "failed": checkpoint.rows_failed,
+                    "completed": checkpoint.completed_at is not None,
+                }
+    finally:
+        db.close()
+    return summary
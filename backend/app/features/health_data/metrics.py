@@ -0,0 +1,184 @@
+import json
+import math
+from datetime import datetime, timedelta
+from typing import Optional, Union
+
+from sqlalchemy.orm import Session
+
+from app import models
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover
+    np = None
+
+
+# 指标时序表的维护与查询：记录写入时把 metrics 拆成数值行，统计接口直接在 SQL 里聚合，
+# 不必再逐条解密、json.loads 整条记录。
+
+
+def _to_number(value) -> Optional[float]:
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        number = float(value)
+    elif isinstance(value, str):
+        try:
+            number = float(value.strip())
+        except ValueError:
+            return None
+    else:
+        return None
+    return number if math.isfinite(number) else None
+
+
+def _from_stored(value: float) -> Union[int, float]:
+    # 与原始 JSON 中的整数写法保持一致，避免 72 变成 72.0
+    return int(value) if float(value).is_integer() else value
+
+
+def extract_metric_values(content: Optional[str]) -> dict[str, float]:
+    if not content:
+        return {}
+    try:
+        payload = json.loads(content)
+    except (TypeError, json.JSONDecodeError):
+        return {}
+    metrics = payload.get("metrics") if isinstance(payload, dict) else None
+    if not isinstance(metrics, dict):
+        return {}
+
+    values: dict[str, float] = {}
+    for key, raw_value in metrics.items():
+        number = _to_number(raw_value)
+        if number is not None and isinstance(key, str) and key and len(key) <= 64:
+            values[key] = number
+    return values
+
+
+def replace_record_metric_points(record: models.HealthData, content: Optional[str]) -> None:
+    """用 content 中的指标重建记录的时序行；记录需已 flush，以便取到 created_at。"""
+    record.metric_points = [
+        models.HealthMetricPoint(
+            user_id=record.user_id,
+            metric=metric,
+            recorded_at=record.created_at,
+            value=value,
+            is_public=bool(record.is_public),
+        )
+        for metric, value in extract_metric_values(content).items()
+    ]
+
+
+def sync_record_metric_visibility(record: models.HealthData) -> None:
+    for point in record.metric_points:
+        point.is_public = bool(record.is_public)
+
+
+def record_metrics(record: models.HealthData, *, public_only: bool = False) -> dict[str, Union[int, float]]:
+    return {
+        point.metric: _from_stored(point.value)
+        for point in record.metric_points
+        if point.is_public or not public_only
+    }
+
+
+
+def query_metric_samples(
+    db: Session,
+    user_id: int,
+    metric: str,
+    *,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    include_private: bool = False,
+) -> list[tuple[datetime, float]]:
+    # 只取 (时间, 数值) 两列，按 (user_id, metric, recorded_at) 索引顺序范围扫描
+    query = db.query(models.HealthMetricPoint.recorded_at, models.HealthMetricPoint.value).filter(
+        models.HealthMetricPoint.user_id == user_id,
+        models.HealthMetricPoint.metric == metric,
+    )
+    if start is not None:
+        query = query.filter(models.HealthMetricPoint.recorded_at >= start)
+    if end is not None:
+        query = query.filter(models.HealthMetricPoint.recorded_at < end)
+    if not include_private:
+        query = query.filter(models.HealthMetricPoint.is_public.is_(True))
+    return [(recorded_at, float(value)) for recorded_at, value in query.order_by(models.HealthMetricPoint.recorded_at.asc())]
+
+
+def _bucket_start(value: datetime, bucket: str) -> datetime:
+    day = datetime(value.year, value.month, value.day)
+    if bucket == "week":
+        return day - timedelta(days=day.weekday())
+    if bucket == "month":
+        return datetime(value.year, value.month, 1)
+    return day
+
+
+def bucket_metric_samples(samples: list[tuple[datetime, float]], bucket: str) -> list[dict]:
+    """把按时间升序的样本聚合为 min/max/avg/count；bucket 为 raw 时每个样本单独成点。"""
+    if bucket == "raw":
+        return [
+            {"timestamp": recorded_at, "value": value, "min": value, "max": value, "count": 1}
+            for recorded_at, value in samples
+        ]
+
+    points: list[dict] = []
+    current: Optional[dict] = None
+    total = 0.0
+    for recorded_at, value in samples:
+        bucket_start = _bucket_start(recorded_at, bucket)
+        if current is None or current["timestamp"] != bucket_start:
+            if current is not None:
+                current["value"] = total / current["count"]
+                points.append(current)
+            current = {"timestamp": bucket_start, "value": value, "min": value, "max": value, "count": 0}
+            total = 0.0
+        current["min"] = min(current["min"], value)
+        current["max"] = max(current["max"], value)
+        current["count"] += 1
+        total += value
+    if current is not None:
+        current["value"] = total / current["count"]
+        points.append(current)
+    return points
+
+
+def lttb_downsample(points: list[dict], threshold: int) -> list[dict]:
+    """Largest-Triangle-Three-Buckets：保留曲线形状的前提下把序列压缩到 threshold 个点。"""
+    point_count = len(points)
+    if threshold >= point_count or threshold < 3:
+        return points
+    if np is None:
+        raise RuntimeError("缺少 NumPy 依赖，请安装 numpy")
+
+    x = np.fromiter((point["timestamp"].timestamp() for point in points), dtype=np.float64, count=point_count)
+    y = np.fromiter((point["value"] for point in points), dtype=np.float64, count=point_count)
+
+    # 首尾两点固定保留，中间 threshold-2 个桶各选一个与前一选中点、后一桶均值构成面积最大的点
+    every = (point_count - 2) / (threshold - 2)
+    edges = (np.floor(np.arange(threshold - 1) * every) + 1).astype(np.int64)
+    edges[-1] = point_count - 1
+
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = point_count - 1
+    anchor = 0
+    for index in range(threshold - 2):
+        bucket_from, bucket_to = edges[index], edges[index + 1]
+        if index + 2 < len(edges):
+            next_from, next_to = edges[index + 1], edges[index + 2]
+        else:
+            next_from, next_to = point_count - 1, point_count
+        avg_x = x[next_from:next_to].mean()
+        avg_y = y[next_from:next_to].mean()
+
+        areas = np.abs(
+            (x[anchor] - avg_x) * (y[bucket_from:bucket_to] - y[anchor])
+            - (x[anchor] - x[bucket_from:bucket_to]) * (avg_y - y[anchor])
+        )
+        anchor = bucket_from + int(np.argmax(areas))
+        selected[index + 1] = anchor
+
+    return [points[index] for index in selected]
@@ -0,0 +1,327 @@
+import logging
+import random
+import threading
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy.orm import Session
+
+from app import models
+from app.config import settings
+from app.database import SessionLocal
+from app.features.auth.service import AuthService
+from app.features.blockchain.breaker import ChainUnavailableError
+from app.features.blockchain.encryption import normalize_private_key
+from app.features.blockchain.service import chain_service
+
+
+# 链上写入发件箱：请求里只登记任务并立即提交记录，后台线程负责签名、发送、等待回执，
+# 失败按指数退避重试，重试耗尽后把记录标记为 failed。合约支持批量写入时，同一用户的多条任务合并为批量交易。
+
+logger = logging.getLogger(__name__)
+
+_worker_thread: Optional[threading.Thread] = None
+_worker_stop = threading.Event()
+
+
+def outbox_enabled() -> bool:
+    return settings.ONCHAIN_WRITE_MODE == "async"
+
+
+def enqueue_chain_write(
+    db: Session,
+    record: models.HealthData,
+    user: models.User,
+    explicit_private_key: Optional[str],
+) -> bool:
+    """为记录登记一次上链任务；同一记录已有排队中的任务时复用，不重复发交易。记录需已 flush。"""
+    if not chain_service.enabled or not record.data_hash:
+        return False
+    if not user.encrypted_private_key and not explicit_private_key:
+        return False
+
+    signing_key = None
+    if not user.encrypted_private_key:
+        signing_key = AuthService.encrypt_private_key_for_storage(explicit_private_key)
+
+    entry = (
+        db.query(models.ChainWriteOutbox)
+        .filter(
+            models.ChainWriteOutbox.record_id == record.id,
+            models.ChainWriteOutbox.status == "pending",
+        )
+        .first()
+    )
+    now = datetime.now()
+    if entry is None:
+        db.add(
+            models.ChainWriteOutbox(
+                record_id=record.id,
+                user_id=user.id,
+                status="pending",
+                attempts=0,
+                next_attempt_at=now,
+                encrypted_signing_key=signing_key,
+            )
+        )
+    else:
+        entry.attempts = 0
+        entry.next_attempt_at = now
+        if signing_key:
+            entry.encrypted_signing_key = signing_key
+    record.onchain_status = "pending"
+    return True
+
+
+def _backoff_seconds(attempts: int) -> float:
+    delay = settings.ONCHAIN_OUTBOX_BACKOFF_SECONDS * (2 ** max(0, attempts - 1))
+    # 加抖动，避免节点恢复时所有任务同时重试
+    return min(settings.ONCHAIN_OUTBOX_MAX_BACKOFF_SECONDS, delay) * random.uniform(0.8, 1.2)
+
+
+def _resolve_signing_key(entry: models.ChainWriteOutbox, user: Optional[models.User]) -> str:
+    encrypted_key = entry.encrypted_signing_key or (user.encrypted_private_key if user else None)
+    if not encrypted_key:
+        raise ValueError("缺少可用于签名的私钥")
+    return normalize_private_key(AuthService.decrypt_private_key_from_storage(encrypted_key))
+
+
+def _claim_due_entries(db: Session, limit: int) -> list[int]:
+    entries = (
+        db.query(models.ChainWriteOutbox)
+        .filter(
+            models.ChainWriteOutbox.status == "pending",
+            models.ChainWriteOutbox.next_attempt_at <= datetime.now(),
+        )
+        .order_by(models.ChainWriteOutbox.next_attempt_at.asc(), models.ChainWriteOutbox.id.asc())
+        .limit(limit)
+        .with_for_update()
+        .all()
+    )
+    for entry in entries:
+        entry.status = "processing"
+    db.commit()
+    return [entry.id for entry in entries]
+
+
+def _has_queued_entry(db: Session, record_id: int, exclude_id: int) -> bool:
+    return (
+        db.query(models.ChainWriteOutbox.id)
+        .filter(
+            models.ChainWriteOutbox.record_id == record_id,
+            models.ChainWriteOutbox.status.in_(("pending", "processing")),
+            models.ChainWriteOutbox.id != exclude_id,
+        )
+        .first()
+        is not None
+    )
+
+
+def process_outbox_entry(db: Session, entry_id: int) -> None:
+    entry = db.get(models.ChainWriteOutbox, entry_id)
+    if entry is None or entry.status != "processing":
+        return
+    record = db.get(models.HealthData, entry.record_id)
+    if record is None or not record.data_hash:
+        entry.status = "done"
+        entry.encrypted_signing_key = None
+        db.commit()
+        return
+
+    try:
+        signing_key = _resolve_signing_key(entry, db.get(models.User, entry.user_id))
+        # 处理时读取记录当前的摘要：排队期间多次修改只需发送最后一次
+        if record.onchain_data_id:
+            chain_result = chain_service.update_health_data(
+                owner_private_key=signing_key,
+                data_id_hex=record.onchain_data_id,
+                data_hash_hex=record.data_hash,
+                encrypted_digest_hex=record.data_hash,
+            )
+        else:
+            chain_result = chain_service.store_health_data(
+                owner_private_key=signing_key,
+                data_hash_hex=record.data_hash,
+                encrypted_digest_hex=record.data_hash,
+                data_type=record.file_type,
+            )
+        if not chain_result:
+            raise RuntimeError("链上服务未启用")
+        if chain_result.get("status") == 0:
+            raise RuntimeError(f"交易执行失败：{chain_result.get('tx_hash')}")
+    except Exception as exc:  # noqa: BLE001
+        _handle_entry_failure(db, entry, record, exc)
+        return
+    _complete_entry(db, entry, record, chain_result)
+
+
+def _handle_entry_failure(
+    db: Session,
+    entry: models.ChainWriteOutbox,
+    record: models.HealthData,
+    exc: Exception,
+) -> None:
+    if isinstance(exc, ChainUnavailableError):
+        # 节点熔断期间不消耗重试次数，等探活恢复后再发
+        entry.status = "pending"
+        entry.next_attempt_at = datetime.now() + timedelta(seconds=settings.CHAIN_BREAKER_PROBE_SECONDS)
+        db.commit()
+        return
+
+    entry.attempts = (entry.attempts or 0) + 1
+    entry.last_error = str(exc)[:500]
+    if entry.attempts >= settings.ONCHAIN_OUTBOX_MAX_ATTEMPTS:
+        logger.warning("Chain write for record %s failed after %s attempts: %s", record.id, entry.attempts, exc)
+        entry.status = "failed"
+        entry.encrypted_signing_key = None
+        if not _has_queued_entry(db, record.id, entry.id):
+            record.onchain_status = "failed"
+    else:
+        entry.status = "pending"
+        entry.next_attempt_at = datetime.now() + timedelta(seconds=_backoff_seconds(entry.attempts))
+    db.commit()
+
+
+def _complete_entry(
+    db: Session,
+    entry: models.ChainWriteOutbox,
+    record: models.HealthData,
+    chain_result: dict,
+) -> None:
+    record.onchain_tx_hash = chain_result.get("tx_hash")
+    record.onchain_data_id = chain_result.get("data_id") or record.onchain_data_id
+    entry.tx_hash = chain_result.get("tx_hash")
+    entry.status = "done"
+    entry.encrypted_signing_key = None
+    # 处理期间记录又被修改并重新排队时，保持 pending，等下一次任务确认
+    if not _has_queued_entry(db, record.id, entry.id):
+        record.onchain_status = "confirmed"
+    db.commit()
+
+
+def _process_entry_batch(
+    db: Session,
+    user_id: int,
+    is_update: bool,
+    members: list[tuple[models.ChainWriteOutbox, models.HealthData]],
+) -> list[int]:
+    """用一个用户的私钥把多条任务合并发送，返回需要退回逐条处理的任务 id（所在批次交易回滚）。"""
+    signing_key = _resolve_signing_key(members[0][0], db.get(models.User, user_id))
+    if is_update:
+        results = chain_service.update_health_data_batch(
+            owner_private_key=signing_key,
+            items=[
+                {
+                    "data_id_hex": record.onchain_data_id,
+                    "data_hash_hex": record.data_hash,
+                    "encrypted_digest_hex": record.data_hash,
+                }
+                for _, record in members
+            ],
+        )
+    else:
+        results = chain_service.store_health_data_batch(
+            owner_private_key=signing_key,
+            items=[
+                {
+                    "data_hash_hex": record.data_hash,
+                    "encrypted_digest_hex": record.data_hash,
+                    "data_type": record.file_type,
+                }
+                for _, record in members
+            ],
+        )
+
+    reverted: list[int] = []
+    for (entry, record), result in zip(members, results):
+        if result.get("error") is not None:
+            _handle_entry_failure(db, entry, record, result["error"])
+        elif result.get("status") == 0:
+            # 一条无效记录会让整批回滚，退回逐条发送以隔离出错的记录
+            reverted.append(entry.id)
+        else:
+            _complete_entry(db, entry, record, result)
+    return reverted
+
+
+def _process_batched_entries(db: Session, entry_ids: list[int]) -> list[int]:
+    """同一用户、用账户私钥签名的新增（或更新）任务合并为批量交易，返回仍需逐条处理的任务 id。"""
+    if not chain_service.batch_writes_enabled or len(entry_ids) < 2:
+        return entry_ids
+
+    remaining: list[int] = []
+    groups: dict[tuple[int, bool], list[tuple[models.ChainWriteOutbox, models.HealthData]]] = {}
+    for entry_id in entry_ids:
+        entry = db.get(models.ChainWriteOutbox, entry_id)
+        record = db.get(models.HealthData, entry.record_id) if entry is not None else None
+        # 一次性签名私钥各不相同，只合并使用账户私钥的任务
+        if entry is None or record is None or not record.data_hash or entry.encrypted_signing_key:
+            remaining.append(entry_id)
+            continue
+        groups.setdefault((entry.user_id, bool(record.onchain_data_id)), []).append((entry, record))
+
+    for (user_id, is_update), members in groups.items():
+        if len(members) < 2:
+            remaining.extend(entry.id for entry, _ in members)
+            continue
+        try:
+            remaining.extend(_process_entry_batch(db, user_id, is_update, members))
+        except Exception as exc:  # noqa: BLE001
+            # 估算 gas 回滚、首笔交易未发出等整批失败时退回逐条处理，由逐条流程计入重试
+            logger.warning("Batched chain write for user %s failed, falling back to single writes: %s", user_id, exc)
+            db.rollback()
+            remaining.extend(entry.id for entry, _ in members)
+    return remaining
+
+
+def run_outbox_once(db: Session, limit: Optional[int] = None) -> int:
+    entry_ids = _claim_due_entries(db, limit or settings.ONCHAIN_OUTBOX_BATCH_SIZE)
+    for entry_id in _process_batched_entries(db, entry_ids):
+        try:
+            process_outbox_entry(db, entry_id)
+        except Exception:  # noqa: BLE001
+            logger.exception("Chain outbox entry %s crashed", entry_id)
+            db.rollback()
+    return len(entry_ids)
+
+
+def _release_stale_entries() -> None:
+    # 进程异常退出时停留在 processing 的任务重新排队
+    db = SessionLocal()
+    try:
+        db.query(models.ChainWriteOutbox).filter(models.ChainWriteOutbox.status == "processing").update(
+            {"status": "pending", "next_attempt_at": datetime.now()},
+            synchronize_session=False,
+        )
+        db.commit()
+    finally:
+        db.close()
+
+
+def _run_outbox_worker() -> None:
+    _release_stale_entries()
+    while not _worker_stop.wait(settings.ONCHAIN_OUTBOX_POLL_SECONDS):
+        db = SessionLocal()
+        try:
+            while not _worker_stop.is_set() and run_outbox_once(db) >= settings.ONCHAIN_OUTBOX_BATCH_SIZE:
+                pass
+        except Exception:  # noqa: BLE001
+            logger.exception("Chain outbox worker iteration failed")
+            db.rollback()
+        finally:
+            db.close()
+
+
+def start_outbox_worker() -> None:
+    global _worker_thread
+    if not outbox_enabled() or not chain_service.enabled:
+        return
+    if _worker_thread is not None and _worker_thread.is_alive():
+        return
+    _worker_stop.clear()
+    _worker_thread = threading.Thread(target=_run_outbox_worker, name="chain-outbox-worker", daemon=True)
+    _worker_thread.start()
+
+
+def stop_outbox_worker() -> None:
+    _worker_stop.set()
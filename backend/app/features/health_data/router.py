@@ -1,30 +1,145 @@
+import asyncio
 import base64
 import hashlib
+import io
+import itertools
 import json
-from datetime import date, datetime
-from typing import List, Optional
-
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+import re
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from typing import Callable, Iterator, List, Optional
+
+from fastapi import APIRouter, Depends, File, Form, Header, HTTPException, Query, Response, UploadFile
+from fastapi.responses import StreamingResponse
+from sqlalchemy import func, insert
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Query as OrmQuery, Session, load_only, undefer_group
 
 from app.config import settings
-from app.database import get_db
+from app.database import SessionLocal, get_db
 from app import models, schemas
+from app.pagination import paginate_keyset
 from app.features.auth.dependencies import get_current_user
 from app.features.auth.service import AuthService
+from app.features.blockchain.cache import TTLCache
+from app.features.blockchain.async_service import async_chain_service
+from app.features.blockchain.breaker import ChainUnavailableError
 from app.features.blockchain.service import chain_service
 from app.features.blockchain.encryption import (
+    SegmentLayout,
+    StorageKey,
     decrypt_binary,
     decrypt_text,
     encrypt_binary,
     encrypt_text,
+    new_binary_encryptor,
     normalize_private_key,
+    unwrap_data_key,
     verify_user_private_key,
 )
+from app.features.health_data.anchoring import (
+    merkle_anchoring_enabled,
+    record_merkle_root,
+    reset_record_anchor,
+)
+from app.features.health_data.outbox import enqueue_chain_write, outbox_enabled
+from app.features.health_data.storage import (
+    iter_segmented_pdf,
+    new_record_data_key,
+    public_storage_key as _public_storage_key,
+    public_storage_keys as _public_storage_keys,
+    record_payload_key,
+    reseal_record,
+    segmented_pdf_layout,
+)
+from app.features.health_data.importer import ImportRow, detect_import_format, iter_import_rows
+from app.features.health_data.metrics import (
+    bucket_metric_samples,
+    extract_metric_values,
+    lttb_downsample,
+    query_metric_samples,
+    record_metrics,
+    replace_record_metric_points,
+    sync_record_metric_visibility,
+)
+from app.features.health_data.summary import (
+    SUMMARY_METRICS,
+    RecordContribution,
+    add_summary_contributions,
+    apply_summary_change,
+    load_user_summary,
+    record_contribution,
+    summary_average,
+)
 
 
 router = APIRouter()
 
+MAX_PDF_SIZE = 6 * 1024 * 1024
+IMPORT_CHUNK_SIZE = 500
+EXPORT_BATCH_SIZE = 200
+# 带 PDF 导出时每批只取少量行，单批内存上限约为 批大小 × MAX_PDF_SIZE
+EXPORT_PDF_BATCH_SIZE = 4
+MAX_IMPORT_ERRORS_REPORTED = 200
+PDF_STREAM_CHUNK_SIZE = 64 * 1024
+RANGE_SPEC_PATTERN = re.compile(r"\s*(\d*)-(\d*)\s*", re.ASCII)
+PDF_DATA_URI_PREFIX = "data:application/pdf;base64,"
+# 持久化摘要的算法版本：SHA-256(文本原文 或 PDF data URI)
+RECORD_DIGEST_VERSION = "sha256-payload-v1"
+# fields=meta 时列表只读取这些列，不触碰正文与 PDF 大字段
+RECORD_META_COLUMNS = (
+    models.HealthData.id,
+    models.HealthData.user_id,
+    models.HealthData.data_title,
+    models.HealthData.file_type,
+    models.HealthData.pdf_size,
+    models.HealthData.is_public,
+    models.HealthData.data_hash,
+    models.HealthData.onchain_data_id,
+    models.HealthData.onchain_tx_hash,
+    models.HealthData.onchain_status,
+    models.HealthData.created_at,
+    models.HealthData.updated_at,
+)
+RECORD_CURSOR_COLUMNS = (models.HealthData.created_at, models.HealthData.id)
+ONCHAIN_VERIFICATION_SKIPPED_MESSAGE = "列表请求未进行链上校验"
+ONCHAIN_VERIFICATION_UNAVAILABLE_MESSAGE = "链上节点暂不可用，暂未校验"
+
+# 列表接口批量解密用的有界线程池，与 Starlette 处理同步接口的默认线程池分开
+_decrypt_executor = ThreadPoolExecutor(
+    max_workers=settings.RECORD_DECRYPT_WORKERS,
+    thread_name_prefix="record-decrypt",
+)
+
+# 链上校验结果缓存，键为 (onchain_data_id, data_hash)
+_verification_cache = TTLCache(
+    maxsize=settings.ONCHAIN_VERIFY_CACHE_SIZE,
+    ttl_seconds=settings.ONCHAIN_VERIFY_CACHE_TTL_SECONDS,
+)
+
+
+class _PdfPayloadHasher:
+    """增量计算 PDF data URI 载荷的 SHA-256，结果与 _hash_payload(_build_source_payload(...)) 一致。"""
+
+    def __init__(self) -> None:
+        self._sha256 = hashlib.sha256(PDF_DATA_URI_PREFIX.encode("utf-8"))
+        self._pending = b""
+
+    def update(self, chunk: bytes) -> None:
+        data = self._pending + chunk
+        # base64 以 3 字节为一组编码，余下的字节留到下一块再处理
+        aligned = len(data) - len(data) % 3
+        self._sha256.update(base64.b64encode(data[:aligned]))
+        self._pending = data[aligned:]
+
+    def hexdigest(self) -> str:
+        if self._pending:
+            self._sha256.update(base64.b64encode(self._pending))
+            self._pending = b""
+        return "0x" + self._sha256.hexdigest()
+
 
 def _decode_pdf_data(pdf_data_base64: Optional[str]) -> tuple[Optional[bytes], Optional[int], Optional[str]]:
     if not pdf_data_base64:
@@ -49,10 +164,139 @@ def _decode_pdf_data(pdf_data_base64: Optional[str]) -> tuple[Optional[bytes], O
     if not decoded.startswith(b"%PDF"):
         raise HTTPException(status_code=400, detail="仅支持 PDF 格式文件")
 
-    if len(decoded) > 6 * 1024 * 1024:
+    if len(decoded) > MAX_PDF_SIZE:
         raise HTTPException(status_code=400, detail="PDF 文件过大，请压缩后再上传")
 
-    return decoded, len(decoded), f"data:application/pdf;base64,{encoded_value}"
+    return decoded, len(decoded), f"{PDF_DATA_URI_PREFIX}{encoded_value}"
+
+
+async def _read_pdf_upload(upload: UploadFile, payload_key: StorageKey) -> tuple[bytes, int, str]:
+    """分块读取 multipart 上传的 PDF（Starlette 已落盘暂存），边读边校验大小、计算载荷哈希并分段加密。
+
+    返回 (密文, 明文大小, 载荷哈希)；内存中只有密文和不足一段的明文，不再同时持有整份明文。
+    """
+    hasher = _PdfPayloadHasher()
+    encryptor = new_binary_encryptor(payload_key)
+    encrypted = bytearray()
+    size = 0
+
+    while True:
+        chunk = await upload.read(PDF_STREAM_CHUNK_SIZE)
+        if not chunk:
+            break
+        if not size and not chunk.startswith(b"%PDF"):
+            raise HTTPException(status_code=400, detail="仅支持 PDF 格式文件")
+        if size + len(chunk) > MAX_PDF_SIZE:
+            raise HTTPException(status_code=400, detail="PDF 文件过大，请压缩后再上传")
+        hasher.update(chunk)
+        encrypted.extend(encryptor.update(chunk))
+        size += len(chunk)
+
+    if not size:
+        raise HTTPException(status_code=400, detail="请上传 PDF 文件")
+
+    encrypted.extend(encryptor.finalize())
+    return bytes(encrypted), size, hasher.hexdigest()
+
+
+def _parse_range_header(range_header: Optional[str], total_size: int) -> Optional[tuple[int, int]]:
+    """解析单段 HTTP Range 头，返回闭区间 (start, end)；未提供、不支持或语法无效时返回 None。"""
+    if not range_header:
+        return None
+
+    unit, _, ranges = range_header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in ranges:
+        return None
+
+    match = RANGE_SPEC_PATTERN.fullmatch(ranges)
+    if not match or not any(match.groups()):
+        # 语法无效的 Range 按 RFC 9110 忽略，返回完整内容
+        return None
+
+    start_text, end_text = match.groups()
+    if start_text:
+        start = int(start_text)
+        end = int(end_text) if end_text else total_size - 1
+        if end_text and end < start:
+            return None
+    else:
+        # 后缀区间 bytes=-N；N 为 0 时不可满足
+        suffix_length = int(end_text)
+        start = max(total_size - suffix_length, 0) if suffix_length else total_size
+        end = total_size - 1
+
+    if start >= total_size:
+        raise HTTPException(
+            status_code=416,
+            detail="请求的文件范围无效",
+            headers={"Content-Range": f"bytes */{total_size}"},
+        )
+
+    return start, min(end, total_size - 1)
+
+
+def _build_pdf_response(record: models.HealthData, pdf_bytes: bytes, range_header: Optional[str]) -> StreamingResponse:
+    view = memoryview(pdf_bytes)
+
+    def iter_chunks(start: int, end: int) -> Iterator[bytes]:
+        position = start
+        while position <= end:
+            next_position = min(position + PDF_STREAM_CHUNK_SIZE, end + 1)
+            yield bytes(view[position:next_position])
+            position = next_position
+
+    return _build_pdf_range_response(record, len(pdf_bytes), range_header, iter_chunks)
+
+
+def _build_segmented_pdf_response(
+    record: models.HealthData,
+    layout: SegmentLayout,
+    storage_keys: list[str],
+    range_header: Optional[str],
+) -> StreamingResponse:
+    """分段加密的 PDF：只读取并解密请求区间覆盖的段。
+
+    依次尝试存储密钥（轮换 SECRET_KEY 期间公开记录可能仍在旧密钥下），先解密第一段确认密钥正确，
+    都不正确时在发出响应头之前返回 403。
+    """
+
+    def open_chunks(start: int, end: int) -> Iterator[bytes]:
+        for storage_key in storage_keys:
+            try:
+                payload_key = record_payload_key(record, storage_key)
+                chunks = iter_segmented_pdf(record.id, layout, payload_key, start, end)
+                first = next(chunks, b"")
+            except ValueError:
+                continue
+            return itertools.chain([first], chunks)
+        raise HTTPException(status_code=403, detail="该 PDF 需提供正确的 private_key 才能下载")
+
+    return _build_pdf_range_response(record, layout.plaintext_size, range_header, open_chunks)
+
+
+def _build_pdf_range_response(
+    record: models.HealthData,
+    total_size: int,
+    range_header: Optional[str],
+    iter_chunks: Callable[[int, int], Iterator[bytes]],
+) -> StreamingResponse:
+    byte_range = _parse_range_header(range_header, total_size)
+    start, end = byte_range if byte_range else (0, total_size - 1)
+
+    headers = {
+        "Accept-Ranges": "bytes",
+        "Content-Length": str(end - start + 1),
+        "Content-Disposition": f'inline; filename="health-record-{record.id}.pdf"',
+    }
+    if byte_range:
+        headers["Content-Range"] = f"bytes {start}-{end}/{total_size}"
+
+    return StreamingResponse(
+        iter_chunks(start, end),
+        status_code=206 if byte_range else 200,
+        media_type="application/pdf",
+        headers=headers,
+    )
 
 
 def _extract_metrics(content: Optional[str]) -> dict:
@@ -67,7 +311,7 @@ def _extract_metrics(content: Optional[str]) -> dict:
 
 def _resolve_effective_private_key(user: models.User, private_key: Optional[str]) -> tuple[Optional[str], Optional[str]]:
     if private_key:
-        if not verify_user_private_key(private_key, user.wallet_address, user.private_key_hash):
+        if not verify_user_private_key(private_key, user.wallet_address, user.private_key_hash, user.id):
             raise HTTPException(status_code=403, detail="私钥校验失败")
         normalized_key = normalize_private_key(private_key)
         return normalized_key, normalized_key
@@ -82,15 +326,11 @@ def _resolve_effective_private_key(user: models.User, private_key: Optional[str]
 def _validate_explicit_private_key(user: models.User, private_key: Optional[str]) -> Optional[str]:
     if not private_key:
         return None
-    if not verify_user_private_key(private_key, user.wallet_address, user.private_key_hash):
+    if not verify_user_private_key(private_key, user.wallet_address, user.private_key_hash, user.id):
         raise HTTPException(status_code=403, detail="绉侀挜鏍￠獙澶辫触")
     return normalize_private_key(private_key)
 
 
-def _public_storage_key() -> str:
-    return f"health-data-public::{settings.SECRET_KEY or 'health-data-default'}"
-
-
 def _build_source_payload(
     file_type: str,
     *,
@@ -101,7 +341,7 @@ def _build_source_payload(
         if not pdf_bytes:
             return ""
         encoded = base64.b64encode(pdf_bytes).decode("utf-8")
-        return f"data:application/pdf;base64,{encoded}"
+        return f"{PDF_DATA_URI_PREFIX}{encoded}"
     return data_content or ""
 
 
@@ -111,6 +351,26 @@ def _hash_payload(payload: str) -> Optional[str]:
     return "0x" + hashlib.sha256(payload.encode("utf-8")).hexdigest()
 
 
+def _compute_record_digest(
+    file_type: str,
+    *,
+    data_content: Optional[str] = None,
+    pdf_bytes: Optional[bytes] = None,
+) -> Optional[str]:
+    return _hash_payload(_build_source_payload(file_type, data_content=data_content, pdf_bytes=pdf_bytes))
+
+
+def _set_record_digest(record: models.HealthData, data_hash_hex: Optional[str]) -> None:
+    record.data_hash = data_hash_hex
+    record.data_hash_version = RECORD_DIGEST_VERSION if data_hash_hex else None
+
+
+def _persisted_digest(record: models.HealthData) -> Optional[str]:
+    if record.data_hash and record.data_hash_version == RECORD_DIGEST_VERSION:
+        return record.data_hash
+    return None
+
+
 def _resolve_chain_private_key(user: models.User, explicit_private_key: Optional[str]) -> Optional[str]:
     if explicit_private_key:
         return explicit_private_key
@@ -122,58 +382,159 @@ def _resolve_chain_private_key(user: models.User, explicit_private_key: Optional
         return None
 
 
+@dataclass(frozen=True)
+class _RecordCiphertext:
+    """解密一条记录所需的列值快照；从 ORM 对象取出后即可脱离会话，在线程池中解密。"""
+
+    is_public: bool
+    data_content: Optional[str]
+    encrypted_data_content: Optional[str]
+    pdf_data: Optional[bytes]
+    encrypted_pdf_data: Optional[bytes]
+    wrapped_data_key: Optional[str]
+
+
+def _record_ciphertext(
+    record: models.HealthData,
+    *,
+    source_is_public: Optional[bool] = None,
+    load_pdf: bool = True,
+) -> _RecordCiphertext:
+    # 在持有会话的线程里访问列（可能触发延迟加载）；load_pdf=False 时不访问 PDF 列，避免逐行回表读取大字段
+    return _RecordCiphertext(
+        is_public=record.is_public if source_is_public is None else source_is_public,
+        data_content=record.data_content,
+        encrypted_data_content=record.encrypted_data_content,
+        pdf_data=record.pdf_data if load_pdf else None,
+        encrypted_pdf_data=record.encrypted_pdf_data if load_pdf else None,
+        wrapped_data_key=record.wrapped_data_key,
+    )
+
+
+def _decrypt_record_ciphertext(
+    ciphertext: _RecordCiphertext,
+    private_key: Optional[str],
+) -> tuple[Optional[str], Optional[bytes], bool]:
+    """只做解密、不访问数据库，可在任意线程执行；私钥错误表现为 requires_private_key。"""
+    is_public = ciphertext.is_public
+    encrypted_content = ciphertext.encrypted_data_content
+    encrypted_pdf_data = ciphertext.encrypted_pdf_data
+    requires_private_key = bool(not is_public and (encrypted_content or encrypted_pdf_data))
+    data_content = ciphertext.data_content
+    pdf_bytes = ciphertext.pdf_data
+    storage_keys = _public_storage_keys() if is_public else [private_key] if private_key else []
+
+    if encrypted_content or encrypted_pdf_data:
+        # 公开记录在 SECRET_KEY 轮换期间可能仍在旧密钥下，依次尝试
+        for storage_key in storage_keys:
+            try:
+                payload_key = (
+                    unwrap_data_key(ciphertext.wrapped_data_key, storage_key)
+                    if ciphertext.wrapped_data_key
+                    else storage_key
+                )
+                if encrypted_content:
+                    data_content = decrypt_text(encrypted_content, payload_key)
+                if encrypted_pdf_data:
+                    pdf_bytes = decrypt_binary(encrypted_pdf_data, payload_key)
+                requires_private_key = False
+                break
+            except ValueError:
+                if not is_public:
+                    requires_private_key = True
+
+    return data_content, pdf_bytes, requires_private_key
+
+
 def _resolve_record_values(
     record: models.HealthData,
     private_key: Optional[str] = None,
     *,
     source_is_public: Optional[bool] = None,
+    load_pdf: bool = True,
 ) -> tuple[Optional[str], Optional[bytes], bool]:
-    is_public = record.is_public if source_is_public is None else source_is_public
-    requires_private_key = bool(not is_public and (record.encrypted_data_content or record.encrypted_pdf_data))
-    data_content = record.data_content
-    pdf_bytes = record.pdf_data
-    storage_key = _public_storage_key() if is_public else private_key
+    return _decrypt_record_ciphertext(
+        _record_ciphertext(record, source_is_public=source_is_public, load_pdf=load_pdf),
+        private_key,
+    )
 
-    if (record.encrypted_data_content or record.encrypted_pdf_data) and storage_key:
-        try:
-            if record.encrypted_data_content:
-                data_content = decrypt_text(record.encrypted_data_content, storage_key)
-            if record.encrypted_pdf_data:
-                pdf_bytes = decrypt_binary(record.encrypted_pdf_data, storage_key)
-            requires_private_key = False
-        except ValueError:
-            if not is_public:
-                requires_private_key = True
 
-    return data_content, pdf_bytes, requires_private_key
+async def _resolve_records_values(
+    records: list[models.HealthData],
+    private_key: Optional[str],
+    load_pdf: list[bool],
+) -> list[tuple[Optional[str], Optional[bytes], bool]]:
+    """批量解密一页记录，结果与 records 顺序一致。
+
+    AES 运算会释放 GIL，按工作线程数切成连续的几段分发到有界线程池并行解密，事件循环不再被逐条解密阻塞；
+    会话不是线程安全的，列值先在当前线程取出，工作线程只接触快照。
+    """
+    ciphertexts = [_record_ciphertext(record, load_pdf=flag) for record, flag in zip(records, load_pdf)]
+    encrypted_count = sum(1 for item in ciphertexts if item.encrypted_data_content or item.encrypted_pdf_data)
+    if encrypted_count < settings.RECORD_DECRYPT_PARALLEL_MIN_RECORDS:
+        return [_decrypt_record_ciphertext(item, private_key) for item in ciphertexts]
+
+    def decrypt_slice(items: list[_RecordCiphertext]) -> list[tuple[Optional[str], Optional[bytes], bool]]:
+        return [_decrypt_record_ciphertext(item, private_key) for item in items]
+
+    slice_size = -(-len(ciphertexts) // settings.RECORD_DECRYPT_WORKERS)
+    loop = asyncio.get_running_loop()
+    slices = await asyncio.gather(
+        *(
+            loop.run_in_executor(_decrypt_executor, decrypt_slice, ciphertexts[start : start + slice_size])
+            for start in range(0, len(ciphertexts), slice_size)
+        )
+    )
+    return [item for part in slices for item in part]
 
 
-def _verify_record_onchain(
+def _prepare_onchain_verification(
     record: models.HealthData,
     *,
     data_content: Optional[str],
     pdf_bytes: Optional[bytes],
-) -> tuple[Optional[bool], Optional[str]]:
+) -> tuple[Optional[str], Optional[tuple[Optional[bool], Optional[str]]]]:
+    """计算本地载荷哈希；返回 (expected_hash, 无需查链即可给出的校验结果)。"""
+    if record.onchain_status == "pending":
+        return None, (None, "上链处理中，暂无法校验")
+    if record.onchain_status == "failed":
+        return None, (None, "上链失败，请重新提交记录")
     if not record.onchain_data_id:
-        return None, "?????"
+        return None, (None, "?????")
     if not chain_service.enabled:
-        return None, "?????????"
+        return None, (None, "?????????")
+
+    persisted_hash = _persisted_digest(record)
+    if persisted_hash:
+        return _anchored_hash(record, persisted_hash)
 
+    # 旧数据没有持久化摘要，只能用解密后的原文重新计算
     source_payload = _build_source_payload(record.file_type, data_content=data_content, pdf_bytes=pdf_bytes)
     if not source_payload:
         if not record.is_public:
-            return None, "????????????????"
-        return None, "???????????"
+            return None, (None, "????????????????")
+        return None, (None, "???????????")
 
     expected_hash = _hash_payload(source_payload)
     if not expected_hash:
-        return None, "???????????"
+        return None, (None, "???????????")
+    return _anchored_hash(record, expected_hash)
 
-    try:
-        chain_record = chain_service.get_health_record(data_id_hex=record.onchain_data_id)
-    except Exception as exc:  # noqa: BLE001
-        return None, f"???????{exc}"
 
+def _anchored_hash(
+    record: models.HealthData,
+    data_hash_hex: str,
+) -> tuple[Optional[str], Optional[tuple[Optional[bool], Optional[str]]]]:
+    # 单独上链的记录链上存的就是内容摘要；Merkle 批量锚定的记录要用包含证明推出批次根哈希再比对
+    if not record.merkle_batch_id:
+        return data_hash_hex, None
+    merkle_root = record_merkle_root(record, data_hash_hex)
+    if not merkle_root:
+        return None, (False, "Merkle 包含证明无效")
+    return merkle_root, None
+
+
+def _compare_onchain_hash(expected_hash: str, chain_record: Optional[dict]) -> tuple[Optional[bool], Optional[str]]:
     if not chain_record:
         return False, "???????????"
 
@@ -183,22 +544,131 @@ def _verify_record_onchain(
     return False, "?????????????????????????"
 
 
-def _serialize_record(
+def _invalidate_onchain_verification(data_id_hex: Optional[str]) -> None:
+    if data_id_hex:
+        _verification_cache.discard_where(lambda key: key[0] == data_id_hex)
+
+
+async def _verify_records_onchain(
+    items: list[tuple[models.HealthData, Optional[str], Optional[bytes]]],
+) -> list[tuple[Optional[bool], Optional[str]]]:
+    """批量校验链上哈希：先查缓存，未命中的 dataId 合并为一次 JSON-RPC 批量请求。"""
+    results: list[Optional[tuple[Optional[bool], Optional[str]]]] = []
+    pending: list[tuple[int, str, str]] = []
+
+    for index, (record, data_content, pdf_bytes) in enumerate(items):
+        expected_hash, early_result = _prepare_onchain_verification(
+            record,
+            data_content=data_content,
+            pdf_bytes=pdf_bytes,
+        )
+        if early_result is not None:
+            results.append(early_result)
+            continue
+
+        cached = _verification_cache.get((record.onchain_data_id, expected_hash))
+        results.append(cached)
+        if cached is None:
+            pending.append((index, record.onchain_data_id, expected_hash))
+
+    if not pending:
+        return results
+
+    try:
+        chain_records = await async_chain_service.get_health_records_batch(
+            data_id_hexes=[data_id for _, data_id, _ in pending]
+        )
+    except ChainUnavailableError:
+        # 熔断期间直接返回，不等待节点超时
+        for index, _, _ in pending:
+            results[index] = (None, ONCHAIN_VERIFICATION_UNAVAILABLE_MESSAGE)
+        return results
+    except Exception as exc:  # noqa: BLE001
+        # 查询失败不写缓存，下次请求重新查链
+        for index, _, _ in pending:
+            results[index] = (None, f"???????{exc}")
+        return results
+
+    # 本地事件镜像落后于链上最新更新时会比对不一致，这部分改用 RPC 直接读取确认
+    mismatched = [
+        data_id
+        for _, data_id, expected_hash in pending
+        if chain_service.index_enabled and _compare_onchain_hash(expected_hash, chain_records.get(data_id))[0] is False
+    ]
+    if mismatched:
+        try:
+            chain_records.update(
+                await async_chain_service.get_health_records_batch(data_id_hexes=mismatched, use_index=False)
+            )
+        except Exception:  # noqa: BLE001
+            pass
+
+    for index, data_id, expected_hash in pending:
+        result = _compare_onchain_hash(expected_hash, chain_records.get(data_id))
+        _verification_cache.set((data_id, expected_hash), result)
+        results[index] = result
+    return results
+
+
+def _build_pdf_download_url(record: models.HealthData, current_user: Optional[models.User]) -> Optional[str]:
+    if record.file_type != "pdf":
+        return None
+    if current_user is None:
+        return f"{settings.API_V1_STR}/health/public/records/{record.id}/pdf"
+    return f"{settings.API_V1_STR}/health/records/{record.id}/pdf"
+
+
+def _set_next_cursor_header(response: Response, next_cursor: Optional[str]) -> None:
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+
+
+def _apply_record_projection(query: OrmQuery, fields: str, include_pdf: bool) -> OrmQuery:
+    if fields == "meta":
+        return query.options(load_only(*RECORD_META_COLUMNS))
+    if include_pdf:
+        # 需要返回 PDF 时与主查询一起取出，避免逐行懒加载
+        return query.options(undefer_group("pdf"))
+    return query
+
+
+def _serialize_record_meta(record: models.HealthData, current_user: Optional[models.User] = None) -> dict:
+    """列表元数据模式：只返回标题、类型、大小、标记与时间，不解密也不校验链上数据。"""
+    return {
+        "id": record.id,
+        "user_id": record.user_id,
+        "data_title": record.data_title,
+        "data_content": None,
+        "file_type": record.file_type,
+        "pdf_size": record.pdf_size,
+        "pdf_data_base64": None,
+        "pdf_download_url": _build_pdf_download_url(record, current_user),
+        "is_public": record.is_public,
+        "payload_included": False,
+        "data_hash": record.data_hash,
+        "onchain_data_id": record.onchain_data_id,
+        "onchain_tx_hash": record.onchain_tx_hash,
+        "onchain_status": record.onchain_status,
+        "created_at": record.created_at,
+        "updated_at": record.updated_at,
+    }
+
+
+def _build_record_payload(
     record: models.HealthData,
-    private_key: Optional[str] = None,
-    current_user: Optional[models.User] = None,
+    *,
+    data_content: Optional[str],
+    pdf_bytes: Optional[bytes],
+    requires_private_key: bool,
+    verification: tuple[Optional[bool], Optional[str]],
+    current_user: Optional[models.User],
+    include_pdf: bool,
 ) -> dict:
-    data_content, pdf_bytes, requires_private_key = _resolve_record_values(record, private_key)
-    onchain_verified, onchain_verification_message = _verify_record_onchain(
-        record,
-        data_content=data_content,
-        pdf_bytes=pdf_bytes,
-    )
-
     pdf_data_base64 = None
-    if pdf_bytes:
-        pdf_data_base64 = "data:application/pdf;base64," + base64.b64encode(pdf_bytes).decode("utf-8")
+    if pdf_bytes and include_pdf:
+        pdf_data_base64 = PDF_DATA_URI_PREFIX + base64.b64encode(pdf_bytes).decode("utf-8")
 
+    onchain_verified, onchain_verification_message = verification
     return {
         "id": record.id,
         "user_id": record.user_id,
@@ -207,10 +677,13 @@ def _serialize_record(
         "file_type": record.file_type,
         "pdf_size": record.pdf_size,
         "pdf_data_base64": pdf_data_base64,
+        "pdf_download_url": _build_pdf_download_url(record, current_user),
         "is_public": record.is_public,
         "requires_private_key": requires_private_key,
+        "data_hash": record.data_hash,
         "onchain_data_id": record.onchain_data_id,
         "onchain_tx_hash": record.onchain_tx_hash,
+        "onchain_status": record.onchain_status,
         "onchain_verified": onchain_verified,
         "onchain_verification_message": onchain_verification_message,
         "created_at": record.created_at,
@@ -218,6 +691,87 @@ def _serialize_record(
     }
 
 
+async def _serialize_records(
+    records: list[models.HealthData],
+    private_key: Optional[str] = None,
+    current_user: Optional[models.User] = None,
+    *,
+    include_pdf: bool = True,
+    verify_onchain: bool = True,
+) -> list[dict]:
+    # 有持久化摘要时链上校验不需要 PDF 原文，未要求返回 PDF 就不读取、不解密 PDF
+    resolved = await _resolve_records_values(
+        records,
+        private_key,
+        [include_pdf or (verify_onchain and not _persisted_digest(record)) for record in records],
+    )
+    if verify_onchain:
+        verifications = await _verify_records_onchain(
+            [(record, data_content, pdf_bytes) for record, (data_content, pdf_bytes, _) in zip(records, resolved)]
+        )
+    else:
+        verifications = [(None, ONCHAIN_VERIFICATION_SKIPPED_MESSAGE)] * len(records)
+
+    return [
+        _build_record_payload(
+            record,
+            data_content=data_content,
+            pdf_bytes=pdf_bytes,
+            requires_private_key=requires_private_key,
+            verification=verification,
+            current_user=current_user,
+            include_pdf=include_pdf,
+        )
+        for record, (data_content, pdf_bytes, requires_private_key), verification in zip(records, resolved, verifications)
+    ]
+
+
+async def _serialize_record(
+    record: models.HealthData,
+    private_key: Optional[str] = None,
+    current_user: Optional[models.User] = None,
+    *,
+    include_pdf: bool = True,
+) -> dict:
+    return (await _serialize_records([record], private_key, current_user, include_pdf=include_pdf))[0]
+
+
+async def _store_new_record_onchain(
+    db: Session,
+    db_record: models.HealthData,
+    current_user: models.User,
+    explicit_private_key: Optional[str],
+) -> None:
+    """新记录 flush 后安排上链：Merkle 模式等锚定窗口，async 模式写入发件箱，sync 模式在请求内发送交易。"""
+    if not chain_service.enabled or not db_record.data_hash:
+        return
+    if merkle_anchoring_enabled():
+        db_record.onchain_status = "pending"
+        return
+    if outbox_enabled():
+        enqueue_chain_write(db, db_record, current_user, explicit_private_key)
+        return
+
+    chain_private_key = _resolve_chain_private_key(current_user, explicit_private_key)
+    if not chain_private_key:
+        return
+    try:
+        # 链上 encryptedData 字段存的是载荷的 SHA-256，与 data_hash 相同，直接复用持久化摘要
+        chain_result = await async_chain_service.store_health_data(
+            owner_private_key=chain_private_key,
+            data_hash_hex=db_record.data_hash,
+            encrypted_digest_hex=db_record.data_hash,
+            data_type=db_record.file_type,
+        )
+        if chain_result:
+            db_record.onchain_tx_hash = chain_result.get("tx_hash")
+            db_record.onchain_data_id = chain_result.get("data_id")
+            db_record.onchain_status = "confirmed"
+    except Exception as exc:  # noqa: BLE001
+        db.rollback()
+        raise HTTPException(status_code=400, detail=f"上链失败：{exc}") from exc
+
+
 @router.post("/records", response_model=schemas.HealthDataResponse)
 async def create_health_record(
     health_data: schemas.HealthDataCreate,
@@ -237,24 +791,17 @@ async def create_health_record(
     if file_type == "text" and not health_data.data_content:
         raise HTTPException(status_code=400, detail="文本健康数据不能为空")
 
-    public_storage_key = _public_storage_key()
-    chain_private_key = _resolve_chain_private_key(current_user, explicit_private_key)
     data_content = None
     encrypted_data_content = None
     plain_pdf_data = None
     encrypted_pdf_data = None
+    payload_key, wrapped_data_key = new_record_data_key(_public_storage_key() if is_public else explicit_private_key)
 
     if file_type == "text":
-        if is_public:
-            encrypted_data_content = encrypt_text(health_data.data_content or "", public_storage_key)
-        elif explicit_private_key:
-            encrypted_data_content = encrypt_text(health_data.data_content or "", explicit_private_key)
+        encrypted_data_content = encrypt_text(health_data.data_content or "", payload_key)
 
     if file_type == "pdf" and pdf_data:
-        if is_public:
-            encrypted_pdf_data = encrypt_binary(pdf_data, public_storage_key)
-        elif explicit_private_key:
-            encrypted_pdf_data = encrypt_binary(pdf_data, explicit_private_key)
+        encrypted_pdf_data = encrypt_binary(pdf_data, payload_key)
 
     db_record = models.HealthData(
         user_id=current_user.id,
@@ -264,60 +811,395 @@ async def create_health_record(
         file_type=file_type,
         pdf_data=plain_pdf_data,
         encrypted_pdf_data=encrypted_pdf_data,
+        wrapped_data_key=wrapped_data_key,
         pdf_size=pdf_size,
         is_public=is_public,
     )
 
-    source_payload = _build_source_payload(file_type, data_content=health_data.data_content, pdf_bytes=pdf_data)
-    data_hash_hex = _hash_payload(source_payload)
-    if chain_private_key and source_payload and data_hash_hex:
-        try:
-            chain_result = chain_service.store_health_data(
-                owner_private_key=chain_private_key,
-                data_hash_hex=data_hash_hex,
-                encrypted_digest_source=source_payload,
-                data_type=file_type,
-            )
-            if chain_result:
-                db_record.onchain_tx_hash = chain_result.get("tx_hash")
-                db_record.onchain_data_id = chain_result.get("data_id")
-        except Exception as exc:  # noqa: BLE001
-            raise HTTPException(status_code=400, detail=f"上链失败：{exc}") from exc
+    _set_record_digest(
+        db_record,
+        _compute_record_digest(file_type, data_content=health_data.data_content, pdf_bytes=pdf_data),
+    )
+
+    db.add(db_record)
+    db.flush()
+    await _store_new_record_onchain(db, db_record, current_user, explicit_private_key)
+    if file_type == "text":
+        replace_record_metric_points(db_record, health_data.data_content)
+    apply_summary_change(db, current_user.id, None, record_contribution(db_record))
+    db.commit()
+    db.refresh(db_record)
+
+    return await _serialize_record(db_record, explicit_private_key, current_user)
+
+
+@router.post("/records/upload", response_model=schemas.HealthDataResponse)
+async def upload_health_record_pdf(
+    file: UploadFile = File(...),
+    data_title: Optional[str] = Form(None),
+    is_public: bool = Form(False),
+    private_key: Optional[str] = Form(None),
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user),
+):
+    """以 multipart 方式上传 PDF 健康档案，避免 base64 编码带来的内存与传输开销。"""
+    explicit_private_key = _validate_explicit_private_key(current_user, private_key)
+    if not is_public and not explicit_private_key:
+        raise HTTPException(status_code=400, detail="私密健康数据必须提供 private_key")
+
+    payload_key, wrapped_data_key = new_record_data_key(_public_storage_key() if is_public else explicit_private_key)
+    encrypted_pdf_data, pdf_size, data_hash_hex = await _read_pdf_upload(file, payload_key)
+
+    db_record = models.HealthData(
+        user_id=current_user.id,
+        data_title=data_title or file.filename,
+        file_type="pdf",
+        encrypted_pdf_data=encrypted_pdf_data,
+        wrapped_data_key=wrapped_data_key,
+        pdf_size=pdf_size,
+        is_public=is_public,
+    )
+
+    _set_record_digest(db_record, data_hash_hex)
 
     db.add(db_record)
+    db.flush()
+    await _store_new_record_onchain(db, db_record, current_user, explicit_private_key)
+    apply_summary_change(db, current_user.id, None, record_contribution(db_record))
     db.commit()
     db.refresh(db_record)
 
-    return _serialize_record(db_record, explicit_private_key, current_user)
+    return await _serialize_record(db_record, explicit_private_key, current_user, include_pdf=False)
+
+
+def _write_import_chunk(
+    db: Session,
+    user_id: int,
+    chunk: list[tuple[ImportRow, models.HealthData]],
+) -> None:
+    db.add_all([record for _, record in chunk])
+    db.flush()
+
+    metric_rows = []
+    contributions = []
+    for row, record in chunk:
+        values = extract_metric_values(row.data_content)
+        metric_rows.extend(
+            {
+                "user_id": user_id,
+                "record_id": record.id,
+                "metric": metric,
+                "recorded_at": record.created_at,
+                "value": value,
+                "is_public": record.is_public,
+            }
+            for metric, value in values.items()
+        )
+        contributions.append(
+            RecordContribution(
+                created_at=record.created_at,
+                is_public=record.is_public,
+                metrics={metric: value for metric, value in values.items() if metric in SUMMARY_METRICS},
+            )
+        )
+    if metric_rows:
+        db.execute(insert(models.HealthMetricPoint), metric_rows)
+    add_summary_contributions(db, user_id, contributions)
+    db.commit()
+    # 已提交的对象不再需要，及时移出会话，导入大文件时内存不随行数增长
+    db.expunge_all()
+
+
+@router.post("/records/import", response_model=schemas.HealthDataImportResponse)
+def import_health_records(
+    file: UploadFile = File(...),
+    import_format: Optional[str] = Form(None, alias="format"),
+    is_public: bool = Form(False),
+    private_key: Optional[str] = Form(None),
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user)
+):
+    """批量导入 NDJSON / CSV 文本健康记录：逐行校验，按块加密与批量写入，每块提交一次。
+
+    同步函数由 FastAPI 放到线程池执行，长时间导入不会阻塞事件循环。导入的记录保存内容摘要但不逐条上链。
+    """
+    try:
+        resolved_format = detect_import_format(import_format, file.filename, file.content_type)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+
+    explicit_private_key = _validate_explicit_private_key(current_user, private_key)
+    public_storage_key = _public_storage_key()
+    user_id = current_user.id
+
+    imported = 0
+    failed = 0
+    errors: list[dict] = []
+
+    def record_error(line_number: int, message: str) -> None:
+        nonlocal failed
+        failed += 1
+        if len(errors) < MAX_IMPORT_ERRORS_REPORTED:
+            errors.append({"line": line_number, "error": message})
+
+    def flush_chunk(chunk: list[tuple[ImportRow, models.HealthData]]) -> None:
+        nonlocal imported
+        try:
+            _write_import_chunk(db, user_id, chunk)
+            imported += len(chunk)
+        except SQLAlchemyError:
+            db.rollback()
+            for row, _ in chunk:
+                record_error(row.line_number, "写入数据库失败")
+
+    chunk: list[tuple[ImportRow, models.HealthData]] = []
+    for line_number, row in iter_import_rows(file.file, resolved_format):
+        if isinstance(row, str):
+            record_error(line_number, row)
+            continue
+
+        row_is_public = is_public if row.is_public is None else row.is_public
+        if not row_is_public and not explicit_private_key:
+            record_error(line_number, "私密健康数据必须提供 private_key")
+            continue
+
+        payload_key, wrapped_data_key = new_record_data_key(
+            public_storage_key if row_is_public else explicit_private_key
+        )
+        record = models.HealthData(
+            user_id=user_id,
+            data_title=row.data_title,
+            encrypted_data_content=encrypt_text(row.data_content, payload_key),
+            wrapped_data_key=wrapped_data_key,
+            file_type="text",
+            is_public=row_is_public,
+            created_at=row.recorded_at or datetime.now(),
+        )
+        _set_record_digest(record, _compute_record_digest("text", data_content=row.data_content))
+        chunk.append((row, record))
+
+        if len(chunk) >= IMPORT_CHUNK_SIZE:
+            flush_chunk(chunk)
+            chunk = []
+
+    if chunk:
+        flush_chunk(chunk)
+
+    return {"format": resolved_format, "imported": imported, "failed": failed, "errors": errors}
 
 
 @router.get("/records", response_model=List[schemas.HealthDataResponse])
 async def get_health_records(
+    response: Response,
     skip: int = 0,
     limit: int = 100,
     start_date: Optional[date] = None,
     end_date: Optional[date] = None,
     private_key: Optional[str] = None,
+    include_pdf: bool = True,
+    fields: str = Query("full", pattern="^(full|meta)$"),
+    cursor: Optional[str] = None,
+    verify_onchain: bool = True,
+    onchain_status: Optional[str] = Query(None, pattern="^(pending|confirmed|failed)$"),
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_user)
 ):
-    """获取用户的健康数据记录"""
+    """获取用户的健康数据记录；传入 cursor 时按游标翻页，下一页游标通过 X-Next-Cursor 响应头返回。"""
     query = db.query(models.HealthData).filter(models.HealthData.user_id == current_user.id)
     
+    if onchain_status:
+        query = query.filter(models.HealthData.onchain_status == onchain_status)
     if start_date:
         query = query.filter(models.HealthData.created_at >= start_date)
     if end_date:
         query = query.filter(models.HealthData.created_at <= end_date)
     
-    records = query.order_by(models.HealthData.created_at.desc()).offset(skip).limit(limit).all()
+    records, next_cursor = paginate_keyset(
+        _apply_record_projection(query, fields, include_pdf),
+        RECORD_CURSOR_COLUMNS,
+        limit=limit,
+        cursor=cursor,
+        offset=skip,
+    )
+    _set_next_cursor_header(response, next_cursor)
+    if fields == "meta":
+        return [_serialize_record_meta(item, current_user) for item in records]
+
     validated_key, _ = _resolve_effective_private_key(current_user, private_key)
-    return [_serialize_record(item, validated_key, current_user) for item in records]
+    return await _serialize_records(
+        records,
+        validated_key,
+        current_user,
+        include_pdf=include_pdf,
+        verify_onchain=verify_onchain,
+    )
+
+
+class _ZipStreamBuffer(io.RawIOBase):
+    """只追加的 zip 输出缓冲：zipfile 写入后由生成器取走已产生的字节，不可 seek 时 zipfile 会改用数据描述符。"""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._chunks: list[bytes] = []
+        self._offset = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        chunk = bytes(data)
+        self._chunks.append(chunk)
+        self._offset += len(chunk)
+        return len(chunk)
+
+    def tell(self) -> int:
+        return self._offset
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def _export_query(db: Session, user_id: int, *, with_pdf: bool, only_pdf: bool = False) -> OrmQuery:
+    query = db.query(models.HealthData).filter(models.HealthData.user_id == user_id)
+    if only_pdf:
+        query = query.filter(models.HealthData.file_type == "pdf")
+    if with_pdf:
+        # 服务端游标读取期间不能再发起懒加载查询，PDF 列必须随行一起取出
+        query = query.options(undefer_group("pdf"))
+    return query.order_by(models.HealthData.created_at.asc(), models.HealthData.id.asc()).yield_per(
+        EXPORT_PDF_BATCH_SIZE if with_pdf else EXPORT_BATCH_SIZE
+    )
+
+
+def _build_export_item(
+    record: models.HealthData,
+    data_content: Optional[str],
+    requires_private_key: bool,
+    pdf_readable: bool,
+) -> dict:
+    if record.file_type == "pdf":
+        # 未读取 PDF 列时无法靠解密结果判断，私密 PDF 以是否提供了用户私钥为准
+        requires_private_key = not (record.is_public or pdf_readable)
+    return {
+        "id": record.id,
+        "data_title": record.data_title,
+        "file_type": record.file_type,
+        "data_content": data_content,
+        "pdf_size": record.pdf_size,
+        "is_public": record.is_public,
+        "requires_private_key": requires_private_key,
+        "data_hash": record.data_hash,
+        "onchain_data_id": record.onchain_data_id,
+        "onchain_tx_hash": record.onchain_tx_hash,
+        "onchain_status": record.onchain_status,
+        "created_at": record.created_at,
+        "updated_at": record.updated_at,
+    }
+
+
+def _encode_export_line(item: dict) -> bytes:
+    return (json.dumps(item, ensure_ascii=False, default=_json_default) + "\n").encode("utf-8")
+
+
+def _iter_ndjson_export(
+    user_id: int,
+    private_key: Optional[str],
+    include_pdf: bool,
+    pdf_readable: bool,
+) -> Iterator[bytes]:
+    # 流式响应在请求依赖清理之后仍可能在发送，生成器使用自己的会话
+    db = SessionLocal()
+    try:
+        for record in _export_query(db, user_id, with_pdf=include_pdf):
+            data_content, pdf_bytes, requires_private_key = _resolve_record_values(
+                record,
+                private_key,
+                load_pdf=include_pdf,
+            )
+            item = _build_export_item(record, data_content, requires_private_key, pdf_readable)
+            if include_pdf:
+                item["pdf_data_base64"] = (
+                    PDF_DATA_URI_PREFIX + base64.b64encode(pdf_bytes).decode("utf-8") if pdf_bytes else None
+                )
+            db.expunge(record)
+            yield _encode_export_line(item)
+    finally:
+        db.close()
+
+
+def _iter_zip_export(user_id: int, private_key: Optional[str], pdf_readable: bool) -> Iterator[bytes]:
+    """zip 导出：先写 records.ndjson 清单（不读 PDF 列），再逐个写入 pdfs/<id>.pdf。"""
+    buffer = _ZipStreamBuffer()
+    db = SessionLocal()
+    try:
+        with zipfile.ZipFile(buffer, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+            with archive.open("records.ndjson", "w", force_zip64=True) as manifest:
+                for record in _export_query(db, user_id, with_pdf=False):
+                    data_content, _, requires_private_key = _resolve_record_values(record, private_key, load_pdf=False)
+                    item = _build_export_item(record, data_content, requires_private_key, pdf_readable)
+                    if record.file_type == "pdf":
+                        item["pdf_file"] = None if item["requires_private_key"] else f"pdfs/{record.id}.pdf"
+                    db.expunge(record)
+                    manifest.write(_encode_export_line(item))
+                    yield buffer.drain()
+
+            if pdf_readable:
+                pdf_query = _export_query(db, user_id, with_pdf=True, only_pdf=True)
+            else:
+                pdf_query = _export_query(db, user_id, with_pdf=True, only_pdf=True).filter(
+                    models.HealthData.is_public.is_(True)
+                )
+            for record in pdf_query:
+                _, pdf_bytes, _ = _resolve_record_values(record, private_key)
+                if pdf_bytes:
+                    entry = zipfile.ZipInfo(f"pdfs/{record.id}.pdf", date_time=record.created_at.timetuple()[:6])
+                    # PDF 本身已压缩，直接存储
+                    archive.writestr(entry, pdf_bytes, compress_type=zipfile.ZIP_STORED)
+                db.expunge(record)
+                del pdf_bytes
+                yield buffer.drain()
+        yield buffer.drain()
+    finally:
+        db.close()
+
+
+@router.get("/records/export")
+async def export_health_records(
+    export_format: str = Query("ndjson", alias="format", pattern="^(ndjson|zip)$"),
+    include_pdf: bool = True,
+    private_key: Optional[str] = None,
+    current_user: models.User = Depends(get_current_user)
+):
+    """流式导出当前用户全部健康记录：NDJSON（PDF 以 data URI 内联）或 zip（PDF 作为独立文件）。"""
+    validated_key, explicit_private_key = _resolve_effective_private_key(current_user, private_key)
+    filename = f"health-records-{datetime.now().strftime('%Y%m%d%H%M%S')}"
+
+    if export_format == "zip":
+        return StreamingResponse(
+            _iter_zip_export(current_user.id, validated_key, pdf_readable=bool(explicit_private_key)),
+            media_type="application/zip",
+            headers={"Content-Disposition": f'attachment; filename="{filename}.zip"'},
+        )
+    return StreamingResponse(
+        _iter_ndjson_export(current_user.id, validated_key, include_pdf, pdf_readable=bool(explicit_private_key)),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": f'attachment; filename="{filename}.ndjson"'},
+    )
 
 
 @router.get("/records/{record_id}", response_model=schemas.HealthDataResponse)
 async def get_health_record(
     record_id: int,
     private_key: Optional[str] = None,
+    include_pdf: bool = True,
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_user)
 ):
@@ -331,7 +1213,64 @@ async def get_health_record(
         raise HTTPException(status_code=404, detail="健康数据记录不存在")
     
     validated_key, _ = _resolve_effective_private_key(current_user, private_key)
-    return _serialize_record(record, validated_key, current_user)
+    return await _serialize_record(record, validated_key, current_user, include_pdf=include_pdf)
+
+
+@router.get("/records/{record_id}/pdf")
+async def download_health_record_pdf(
+    record_id: int,
+    private_key: Optional[str] = None,
+    range_header: Optional[str] = Header(None, alias="Range"),
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user),
+):
+    """流式下载解密后的 PDF，支持 HTTP Range 分段读取。"""
+    record = db.query(models.HealthData).filter(
+        models.HealthData.id == record_id,
+        models.HealthData.user_id == current_user.id,
+    ).first()
+    if not record or record.file_type != "pdf":
+        raise HTTPException(status_code=404, detail="PDF 健康档案不存在")
+
+    validated_key, _ = _resolve_effective_private_key(current_user, private_key)
+    layout = segmented_pdf_layout(db, record.id)
+    if layout is not None:
+        storage_keys = _public_storage_keys() if record.is_public else [validated_key] if validated_key else []
+        return _build_segmented_pdf_response(record, layout, storage_keys, range_header)
+
+    _, pdf_bytes, requires_private_key = _resolve_record_values(record, validated_key)
+    if requires_private_key or not pdf_bytes:
+        raise HTTPException(status_code=403, detail="该 PDF 需提供正确的 private_key 才能下载")
+
+    return _build_pdf_response(record, pdf_bytes, range_header)
+
+
+@router.get("/records/{record_id}/anchor-proof")
+async def get_health_record_anchor_proof(
+    record_id: int,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user),
+):
+    """返回记录的 Merkle 包含证明，便于在链下独立复核：由 data_hash 与证明推出的根应等于链上锚定的根。"""
+    record = db.query(models.HealthData).filter(
+        models.HealthData.id == record_id,
+        models.HealthData.user_id == current_user.id,
+    ).first()
+    if not record:
+        raise HTTPException(status_code=404, detail="健康数据记录不存在")
+    if not record.merkle_batch_id or not record.merkle_proof:
+        raise HTTPException(status_code=404, detail="该记录尚未进入 Merkle 锚定批次")
+
+    batch = db.get(models.HealthAnchorBatch, record.merkle_batch_id)
+    return {
+        "record_id": record.id,
+        "data_hash": record.data_hash,
+        "proof": json.loads(record.merkle_proof),
+        "merkle_root": batch.merkle_root if batch else None,
+        "batch_status": batch.status if batch else None,
+        "onchain_data_id": record.onchain_data_id,
+        "onchain_tx_hash": record.onchain_tx_hash,
+    }
 
 
 @router.put("/records/{record_id}", response_model=schemas.HealthDataResponse)
@@ -350,6 +1289,7 @@ async def update_health_record(
     if not record:
         raise HTTPException(status_code=404, detail="健康数据记录不存在")
 
+    previous_contribution = record_contribution(record)
     update_data = health_data.model_dump(exclude_unset=True)
     input_private_key = update_data.pop("private_key", None)
     private_key, _ = _resolve_effective_private_key(current_user, input_private_key)
@@ -360,95 +1300,169 @@ async def update_health_record(
     if "data_title" in update_data:
         record.data_title = update_data["data_title"]
 
+    previous_is_public = record.is_public
     if "is_public" in update_data:
         record.is_public = bool(update_data["is_public"])
 
     target_file_type = "pdf" if update_data.get("file_type", record.file_type) == "pdf" else "text"
+    # 类型未变且内容未更新时沿用持久化摘要，免去一次完整解密
+    new_digest = _persisted_digest(record) if record.file_type == target_file_type else None
+    if record.file_type != target_file_type:
+        replace_record_metric_points(record, None)
     record.file_type = target_file_type
 
     if not record.is_public and not explicit_private_key:
         raise HTTPException(status_code=400, detail="更新私密健康数据需要提供 private_key")
+    storage_key = public_storage_key if record.is_public else explicit_private_key
+    content_replaced = False
 
     if target_file_type == "text" and "data_content" in update_data:
+        new_digest = _compute_record_digest("text", data_content=update_data["data_content"] or "")
+        replace_record_metric_points(record, update_data["data_content"])
         record.data_content = None
         record.pdf_data = None
         record.pdf_size = None
         record.encrypted_pdf_data = None
-        if record.is_public:
-            record.encrypted_data_content = encrypt_text(update_data["data_content"] or "", public_storage_key)
-        else:
-            record.encrypted_data_content = encrypt_text(update_data["data_content"] or "", explicit_private_key)
+        payload_key, record.wrapped_data_key = new_record_data_key(storage_key)
+        record.encrypted_data_content = encrypt_text(update_data["data_content"] or "", payload_key)
+        content_replaced = True
 
     if target_file_type == "pdf" and "pdf_data_base64" in update_data:
         decoded_pdf, decoded_size, _ = _decode_pdf_data(update_data["pdf_data_base64"])
         if not decoded_pdf:
             raise HTTPException(status_code=400, detail="请上传 PDF 文件")
 
+        new_digest = _compute_record_digest("pdf", pdf_bytes=decoded_pdf)
+        replace_record_metric_points(record, None)
         record.pdf_size = decoded_size
         record.data_content = None
         record.encrypted_data_content = None
         record.pdf_data = None
-        if record.is_public:
-            record.encrypted_pdf_data = encrypt_binary(decoded_pdf, public_storage_key)
-        else:
-            record.encrypted_pdf_data = encrypt_binary(decoded_pdf, explicit_private_key)
+        payload_key, record.wrapped_data_key = new_record_data_key(storage_key)
+        record.encrypted_pdf_data = encrypt_binary(decoded_pdf, payload_key)
+        content_replaced = True
 
-    resolved_content, resolved_pdf_bytes, _ = _resolve_record_values(record, explicit_private_key)
-    source_payload = _build_source_payload(target_file_type, data_content=resolved_content, pdf_bytes=resolved_pdf_bytes)
-    data_hash_hex = _hash_payload(source_payload)
-    if chain_private_key and source_payload and data_hash_hex:
+    if record.is_public != previous_is_public and not content_replaced:
+        # 只切换公开状态：数据密钥换一层包装，正文与 PDF 不必重新加密
+        previous_storage_keys = _public_storage_keys() if previous_is_public else [explicit_private_key or private_key]
+        try:
+            reseal_record(record, previous_storage_keys, storage_key)
+        except ValueError as exc:
+            raise HTTPException(status_code=400, detail="切换公开状态需要提供正确的 private_key") from exc
+
+    if new_digest is None:
+        # 旧数据缺少持久化摘要（或切换了类型）且本次未更新内容：解密一次补算
+        resolved_content, resolved_pdf_bytes, _ = _resolve_record_values(record, explicit_private_key)
+        new_digest = _compute_record_digest(target_file_type, data_content=resolved_content, pdf_bytes=resolved_pdf_bytes)
+    previous_data_hash = record.data_hash
+    _set_record_digest(record, new_digest)
+    sync_record_metric_visibility(record)
+
+    data_hash_hex = record.data_hash
+    if merkle_anchoring_enabled():
+        # 内容摘要变化后重新进入 Merkle 锚定队列；未变化则保留原有证明
+        if data_hash_hex != previous_data_hash:
+            _invalidate_onchain_verification(record.onchain_data_id)
+            reset_record_anchor(record)
+            record.onchain_status = "pending" if chain_service.enabled and data_hash_hex else None
+    elif outbox_enabled():
+        # 摘要未变且已在链上时无需重发；排队期间的多次修改由发件箱合并为一次交易
+        if data_hash_hex and (data_hash_hex != previous_data_hash or not record.onchain_data_id):
+            _invalidate_onchain_verification(record.onchain_data_id)
+            if record.merkle_batch_id:
+                reset_record_anchor(record)
+            enqueue_chain_write(db, record, current_user, explicit_private_key)
+    elif chain_private_key and data_hash_hex:
+        if record.merkle_batch_id:
+            # 批次根哈希由平台钱包持有，切回逐条上链时为记录单独存证
+            reset_record_anchor(record)
         try:
             if record.onchain_data_id:
-                chain_result = chain_service.update_health_data(
+                chain_result = await async_chain_service.update_health_data(
                     owner_private_key=chain_private_key,
                     data_id_hex=record.onchain_data_id,
                     data_hash_hex=data_hash_hex,
-                    encrypted_digest_source=source_payload,
+                    encrypted_digest_hex=data_hash_hex,
                 )
             else:
-                chain_result = chain_service.store_health_data(
+                chain_result = await async_chain_service.store_health_data(
                     owner_private_key=chain_private_key,
                     data_hash_hex=data_hash_hex,
-                    encrypted_digest_source=source_payload,
+                    encrypted_digest_hex=data_hash_hex,
                     data_type=target_file_type,
                 )
             if chain_result:
+                _invalidate_onchain_verification(record.onchain_data_id)
                 record.onchain_tx_hash = chain_result.get("tx_hash")
                 record.onchain_data_id = chain_result.get("data_id") or record.onchain_data_id
+                record.onchain_status = "confirmed"
         except Exception as exc:  # noqa: BLE001
             raise HTTPException(status_code=400, detail=f"上链失败：{exc}") from exc
 
+    apply_summary_change(db, current_user.id, previous_contribution, record_contribution(record))
     db.commit()
     db.refresh(record)
-    return _serialize_record(record, private_key, current_user)
+    return await _serialize_record(record, private_key, current_user)
 
 
 @router.get("/public/records", response_model=List[schemas.HealthDataResponse])
 async def get_public_health_records(
+    response: Response,
     skip: int = 0,
     limit: int = 100,
+    include_pdf: bool = True,
+    fields: str = Query("full", pattern="^(full|meta)$"),
+    cursor: Optional[str] = None,
+    verify_onchain: bool = True,
     db: Session = Depends(get_db),
 ):
-    records = (
-        db.query(models.HealthData)
-        .filter(models.HealthData.is_public.is_(True))
-        .order_by(models.HealthData.created_at.desc())
-        .offset(skip)
-        .limit(limit)
-        .all()
+    query = db.query(models.HealthData).filter(models.HealthData.is_public.is_(True))
+    records, next_cursor = paginate_keyset(
+        _apply_record_projection(query, fields, include_pdf),
+        RECORD_CURSOR_COLUMNS,
+        limit=limit,
+        cursor=cursor,
+        offset=skip,
     )
-    return [_serialize_record(item) for item in records]
+    _set_next_cursor_header(response, next_cursor)
+    if fields == "meta":
+        return [_serialize_record_meta(item) for item in records]
+    return await _serialize_records(records, include_pdf=include_pdf, verify_onchain=verify_onchain)
 
 
 @router.get("/public/records/{record_id}", response_model=schemas.HealthDataResponse)
-async def get_public_health_record(record_id: int, db: Session = Depends(get_db)):
+async def get_public_health_record(record_id: int, include_pdf: bool = True, db: Session = Depends(get_db)):
     record = db.query(models.HealthData).filter(
         models.HealthData.id == record_id,
         models.HealthData.is_public.is_(True),
     ).first()
     if not record:
         raise HTTPException(status_code=404, detail="公开健康数据不存在")
-    return _serialize_record(record)
+    return await _serialize_record(record, include_pdf=include_pdf)
+
+
+@router.get("/public/records/{record_id}/pdf")
+async def download_public_health_record_pdf(
+    record_id: int,
+    range_header: Optional[str] = Header(None, alias="Range"),
+    db: Session = Depends(get_db),
+):
+    record = db.query(models.HealthData).filter(
+        models.HealthData.id == record_id,
+        models.HealthData.is_public.is_(True),
+    ).first()
+    if not record or record.file_type != "pdf":
+        raise HTTPException(status_code=404, detail="公开 PDF 健康档案不存在")
+
+    layout = segmented_pdf_layout(db, record.id)
+    if layout is not None:
+        return _build_segmented_pdf_response(record, layout, _public_storage_keys(), range_header)
+
+    _, pdf_bytes, _ = _resolve_record_values(record)
+    if not pdf_bytes:
+        raise HTTPException(status_code=404, detail="公开 PDF 健康档案不存在")
+
+    return _build_pdf_response(record, pdf_bytes, range_header)
 
 
 @router.delete("/records/{record_id}")
@@ -466,7 +1480,9 @@ async def delete_health_record(
     if not record:
         raise HTTPException(status_code=404, detail="健康数据记录不存在")
     
+    previous_contribution = record_contribution(record)
     db.delete(record)
+    apply_summary_change(db, current_user.id, previous_contribution, None)
     db.commit()
     return {"message": "健康数据记录已删除"}
 
@@ -478,13 +1494,11 @@ async def get_health_summary(
     current_user: models.User = Depends(get_current_user)
 ):
     """获取健康数据摘要统计"""
-    validated_key, _ = _resolve_effective_private_key(current_user, private_key)
+    _, explicit_private_key = _resolve_effective_private_key(current_user, private_key)
 
-    records = db.query(models.HealthData).filter(
-        models.HealthData.user_id == current_user.id
-    ).all()
+    user_summary, records_this_month = load_user_summary(db, current_user.id)
 
-    if not records:
+    if not user_summary.total_records:
         return {
             "total_records": 0,
             "latest_record": None,
@@ -493,33 +1507,61 @@ async def get_health_summary(
             "records_this_month": 0,
         }
 
-    total_records = len(records)
-    latest_record = records[0] if records else None
-
-    weights = []
-    heart_rates = []
-    for item in records:
-        content, _, _ = _resolve_record_values(item, validated_key)
-        metrics = _extract_metrics(content)
-        if metrics.get("weight") is not None:
-            weights.append(metrics.get("weight"))
-        if metrics.get("heart_rate") is not None:
-            heart_rates.append(metrics.get("heart_rate"))
-
+    # 私密记录的指标只有在提供了私钥时才参与统计，与逐条解密时的可见范围一致
+    include_private = bool(explicit_private_key)
     summary = {
-        "total_records": total_records,
-        "latest_record": latest_record.created_at if latest_record else None,
-        "average_weight": sum(weights) / len(weights) if weights else None,
-        "average_heart_rate": sum(heart_rates) / len(heart_rates) if heart_rates else None,
-        "records_this_month": len([
-            r for r in records
-            if r.created_at.month == datetime.now().month and r.created_at.year == datetime.now().year
-        ]),
+        "total_records": user_summary.total_records,
+        "latest_record": user_summary.latest_record_at,
+        "average_weight": summary_average(user_summary, "weight", include_private=include_private),
+        "average_heart_rate": summary_average(user_summary, "heart_rate", include_private=include_private),
+        "records_this_month": records_this_month,
     }
 
     return summary
 
 
+@router.get("/metrics/series", response_model=schemas.HealthMetricSeriesResponse)
+async def get_health_metric_series(
+    metric: str = Query(..., min_length=1, max_length=64),
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    bucket: str = Query("day", pattern="^(raw|day|week|month)$"),
+    max_points: Optional[int] = Query(None, ge=3, le=5000),
+    private_key: Optional[str] = None,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user)
+):
+    """按天/周/月聚合单个指标的时间序列，可选 LTTB 降采样到 max_points 个点供图表使用。"""
+    _, explicit_private_key = _resolve_effective_private_key(current_user, private_key)
+
+    samples = query_metric_samples(
+        db,
+        current_user.id,
+        metric,
+        start=datetime.combine(start_date, datetime.min.time()) if start_date else None,
+        # end_date 包含当天全部数据
+        end=datetime.combine(end_date + timedelta(days=1), datetime.min.time()) if end_date else None,
+        include_private=bool(explicit_private_key),
+    )
+    points = bucket_metric_samples(samples, bucket)
+
+    downsampled = False
+    if max_points and len(points) > max_points:
+        try:
+            points = lttb_downsample(points, max_points)
+        except RuntimeError as exc:
+            raise HTTPException(status_code=500, detail=str(exc)) from exc
+        downsampled = True
+
+    return {
+        "metric": metric,
+        "bucket": bucket,
+        "total_samples": len(samples),
+        "downsampled": downsampled,
+        "points": points,
+    }
+
+
 @router.post("/analyze")
 async def analyze_health_data(
     analysis_request: schemas.HealthAnalysisRequest,
@@ -528,7 +1570,7 @@ async def analyze_health_data(
     current_user: models.User = Depends(get_current_user)
 ):
     """分析健康数据并提供建议"""
-    validated_key, _ = _resolve_effective_private_key(current_user, private_key)
+    validated_key, explicit_private_key = _resolve_effective_private_key(current_user, private_key)
 
     query = db.query(models.HealthData).filter(models.HealthData.user_id == current_user.id)
 
@@ -537,16 +1579,19 @@ async def analyze_health_data(
     if analysis_request.end_date:
         query = query.filter(models.HealthData.created_at <= analysis_request.end_date)
 
-    records = query.order_by(models.HealthData.created_at.desc()).all()
-
-    if not records:
+    data_points = query.with_entities(func.count(models.HealthData.id)).scalar()
+    if not data_points:
         return {"analysis": "暂无数据可供分析", "recommendations": []}
 
     recommendations = []
 
-    latest_record = records[0]
-    latest_content, _, _ = _resolve_record_values(latest_record, validated_key)
-    metrics = _extract_metrics(latest_content)
+    latest_record = query.order_by(models.HealthData.created_at.desc(), models.HealthData.id.desc()).first()
+    if latest_record.metric_points:
+        metrics = record_metrics(latest_record, public_only=not explicit_private_key)
+    else:
+        # 尚未生成指标时序行的旧记录，回退为解密原文解析
+        latest_content, _, _ = _resolve_record_values(latest_record, validated_key, load_pdf=False)
+        metrics = _extract_metrics(latest_content)
     systolic = metrics.get("blood_pressure_systolic")
     diastolic = metrics.get("blood_pressure_diastolic")
     if systolic and diastolic:
@@ -576,8 +1621,8 @@ async def analyze_health_data(
             recommendations.append("您的血糖正常，请继续保持")
 
     return {
-        "analysis": f"基于您最近的{len(records)}条健康数据记录进行分析",
+        "analysis": f"基于您最近的{data_points}条健康数据记录进行分析",
         "recommendations": recommendations,
-        "data_points": len(records),
+        "data_points": data_points,
         "analysis_date": datetime.now().isoformat(),
     }
@@ -0,0 +1,316 @@
+import logging
+import threading
+from typing import Iterator, Optional
+
+from sqlalchemy import func, or_
+from sqlalchemy.orm import Session, undefer_group
+
+from app import models
+from app.config import settings
+from app.database import SessionLocal
+from app.features.auth.service import AuthService
+from app.features.blockchain.encryption import (
+    FERNET_TOKEN_PREFIX,
+    SEGMENTED_HEADER_BYTES,
+    SegmentLayout,
+    StorageKey,
+    decrypt_binary,
+    decrypt_text,
+    encrypt_binary,
+    encrypt_text,
+    generate_data_key,
+    is_legacy_ciphertext,
+    is_segmented_ciphertext,
+    iter_decrypt_range,
+    normalize_private_key,
+    rewrap_data_key,
+    segmented_layout,
+    unwrap_data_key,
+    wrap_data_key,
+)
+
+
+# 健康数据密文存储：公开记录的存储密钥、按记录推导可用的解密密钥、记录数据密钥的生成与重新包装，
+# 分段加密 PDF 的按区间读取，以及把旧 Fernet 密文改写为 AES-GCM 信封格式的后台迁移任务。
+# 迁移按主键游标分批推进，每行用比较后更新（WHERE 原密文 = 读到的密文），不会覆盖并发请求写入的新内容；
+# 找不到可用密钥的行（私钥从未托管在服务端）保持原样，读取时仍可自动识别旧格式。
+
+logger = logging.getLogger(__name__)
+
+_worker_thread: Optional[threading.Thread] = None
+_worker_stop = threading.Event()
+
+
+def public_storage_key(secret: Optional[str] = None) -> str:
+    """公开记录的存储密钥，由 SECRET_KEY（或指定的服务端密钥）派生。"""
+    secret = settings.SECRET_KEY if secret is None else secret
+    return f"health-data-public::{secret or 'health-data-default'}"
+
+
+def public_storage_keys() -> list[str]:
+    """读取公开记录时依次尝试的存储密钥：当前密钥，轮换期间再加上旧密钥。"""
+    keys = [public_storage_key()]
+    if settings.SECRET_KEY_PREVIOUS:
+        keys.append(public_storage_key(settings.SECRET_KEY_PREVIOUS))
+    return keys
+
+
+def new_record_data_key(storage_key: str) -> tuple[StorageKey, Optional[str]]:
+    """为新内容生成数据密钥，返回 (加密正文用的密钥, 要存入 wrapped_data_key 的值)。
+
+    STORAGE_ENCRYPTION_FORMAT=fernet 时不使用信封加密，正文仍直接由存储密钥加密。
+    """
+    if settings.STORAGE_ENCRYPTION_FORMAT == "fernet":
+        return storage_key, None
+    data_key = generate_data_key()
+    return data_key, wrap_data_key(data_key, storage_key)
+
+
+def record_payload_key(record: models.HealthData, storage_key: str) -> StorageKey:
+    """解密记录正文 / PDF 用的密钥：有数据密钥时先用存储密钥解包，存储密钥错误时抛出 ValueError。"""
+    if record.wrapped_data_key:
+        return unwrap_data_key(record.wrapped_data_key, storage_key)
+    return storage_key
+
+
+def reseal_record(record: models.HealthData, old_storage_keys: list[str], new_storage_key: str) -> None:
+    """记录改用新的存储密钥（切换公开状态、轮换密钥）：有数据密钥时只重新包装约 80 字节的密钥，
+    与正文和 PDF 大小无关；旧记录解密一次并顺带改为数据密钥格式。
+
+    old_storage_keys 依次尝试（轮换期间公开记录可能仍在旧密钥下），都不正确时抛出 ValueError。
+    """
+    if not (record.wrapped_data_key or record.encrypted_data_content or record.encrypted_pdf_data):
+        return
+    error = ValueError("私钥错误或数据已损坏，无法解密")
+    for old_storage_key in old_storage_keys:
+        try:
+            reseal_record_with_key(record, old_storage_key, new_storage_key)
+            return
+        except ValueError as exc:
+            error = exc
+    raise error
+
+
+def reseal_record_with_key(record: models.HealthData, old_storage_key: str, new_storage_key: str) -> None:
+    if record.wrapped_data_key:
+        record.wrapped_data_key = rewrap_data_key(record.wrapped_data_key, old_storage_key, new_storage_key)
+        return
+
+    # 先全部解密成功再改写字段，旧密钥不对时记录保持原样
+    content = decrypt_text(record.encrypted_data_content, old_storage_key) if record.encrypted_data_content else None
+    pdf_bytes = decrypt_binary(record.encrypted_pdf_data, old_storage_key) if record.encrypted_pdf_data else None
+    payload_key, wrapped_data_key = new_record_data_key(new_storage_key)
+    if content is not None:
+        record.encrypted_data_content = encrypt_text(content, payload_key)
+    if pdf_bytes is not None:
+        record.encrypted_pdf_data = encrypt_binary(pdf_bytes, payload_key)
+    record.wrapped_data_key = wrapped_data_key
+
+
+def rewrap_user_data_keys(db: Session, user_id: int, old_private_key: str, new_private_key: str) -> tuple[int, int]:
+    """用户私钥轮换：重新包装其全部私密记录的数据密钥，返回 (重新包装条数, 仍直接由旧私钥加密的旧记录条数)。
+
+    只读写 wrapped_data_key 列，不加载正文与 PDF；调用方负责提交。旧记录需要另行 reseal_record。
+    """
+    rows = (
+        db.query(models.HealthData.id, models.HealthData.wrapped_data_key)
+        .filter(models.HealthData.user_id == user_id, models.HealthData.is_public.is_(False))
+        .all()
+    )
+    rewrapped = 0
+    legacy = 0
+    for record_id, wrapped_data_key in rows:
+        if not wrapped_data_key:
+            legacy += 1
+            continue
+        db.query(models.HealthData).filter(
+            models.HealthData.id == record_id,
+            models.HealthData.wrapped_data_key == wrapped_data_key,
+        ).update(
+            {"wrapped_data_key": rewrap_data_key(wrapped_data_key, old_private_key, new_private_key)},
+            synchronize_session=False,
+        )
+        rewrapped += 1
+    return rewrapped, legacy
+
+
+def record_key_candidates(record: models.HealthData, user: Optional[models.User]) -> list[str]:
+    """服务端能拿到的、可能加密过该记录的密钥：公开记录用公共密钥，私密记录依次尝试托管私钥与私钥哈希派生的内部密钥。"""
+    if record.is_public:
+        return public_storage_keys()
+    keys: list[str] = []
+    if user is not None and user.encrypted_private_key:
+        try:
+            keys.append(normalize_private_key(AuthService.decrypt_private_key_from_storage(user.encrypted_private_key)))
+        except ValueError:
+            logger.warning("Stored private key of user %s cannot be decrypted", user.id)
+    if user is not None and user.private_key_hash:
+        keys.append(normalize_private_key(user.private_key_hash))
+    return keys
+
+
+def _read_pdf_slice(db: Session, record_id: int, offset: int, length: int) -> bytes:
+    # SQL 的 substr 从 1 开始计数；只把需要的密文段从数据库取回
+    value = db.query(func.substr(models.HealthData.encrypted_pdf_data, offset + 1, length)).filter(
+        models.HealthData.id == record_id
+    ).scalar()
+    return bytes(value or b"")
+
+
+def segmented_pdf_layout(db: Session, record_id: int) -> Optional[SegmentLayout]:
+    """分段加密 PDF 的布局（只读头部与长度）；记录不存在、没有 PDF 或是旧格式时返回 None。"""
+    row = db.query(
+        func.length(models.HealthData.encrypted_pdf_data),
+        func.substr(models.HealthData.encrypted_pdf_data, 1, SEGMENTED_HEADER_BYTES),
+    ).filter(models.HealthData.id == record_id).first()
+    if not row or not row[0] or not is_segmented_ciphertext(row[1]):
+        return None
+    return segmented_layout(bytes(row[1]), row[0])
+
+
+def iter_segmented_pdf(
+    record_id: int,
+    layout: SegmentLayout,
+    private_key: StorageKey,
+    start: int,
+    end: int,
+) -> Iterator[bytes]:
+    """流式解密 PDF 的明文区间；使用独立会话，响应体在请求处理函数返回后才被迭代。"""
+    db = SessionLocal()
+    try:
+        yield from iter_decrypt_range(
+            layout,
+            lambda offset, length: _read_pdf_slice(db, record_id, offset, length),
+            private_key,
+            start,
+            end,
+        )
+    finally:
+        db.close()
+
+
+def _legacy_rows_filter():
+    prefix = FERNET_TOKEN_PREFIX
+    return or_(
+        models.HealthData.encrypted_data_content.like(f"{prefix}%"),
+        func.substr(models.HealthData.encrypted_pdf_data, 1, len(prefix)) == prefix.encode("ascii"),
+    )
+
+
+def _find_record_key(record: models.HealthData, keys: list[str]) -> Optional[str]:
+    for key in keys:
+        try:
+            if record.encrypted_data_content:
+                decrypt_text(record.encrypted_data_content, key)
+            else:
+                decrypt_binary(record.encrypted_pdf_data, key)
+            return key
+        except ValueError:
+            continue
+    return None
+
+
+def migrate_record(db: Session, record: models.HealthData, user: Optional[models.User]) -> bool:
+    """把仍是 Fernet 的记录改写为数据密钥 + 信封格式，返回是否写入。调用方负责提交。
+
+    只由迁移任务调用，任务仅在 STORAGE_ENCRYPTION_FORMAT 为信封格式时启动。
+    """
+    content = record.encrypted_data_content
+    pdf = record.encrypted_pdf_data
+    if record.wrapped_data_key or not (is_legacy_ciphertext(content) or is_legacy_ciphertext(pdf)):
+        return False
+    storage_key = _find_record_key(record, record_key_candidates(record, user))
+    if storage_key is None:
+        return False
+
+    payload_key, wrapped_data_key = new_record_data_key(storage_key)
+    updates = {"wrapped_data_key": wrapped_data_key}
+    guards = [models.HealthData.wrapped_data_key.is_(None)]
+    if content:
+        updates["encrypted_data_content"] = encrypt_text(decrypt_text(content, storage_key), payload_key)
+        guards.append(models.HealthData.encrypted_data_content == content)
+    if pdf:
+        updates["encrypted_pdf_data"] = encrypt_binary(decrypt_binary(pdf, storage_key), payload_key)
+        guards.append(models.HealthData.encrypted_pdf_data == pdf)
+
+    updated = (
+        db.query(models.HealthData)
+        .filter(models.HealthData.id == record.id, *guards)
+        .update(updates, synchronize_session=False)
+    )
+    return bool(updated)
+
+
+def migrate_storage_batch(db: Session, after_id: int, limit: int) -> tuple[int, Optional[int]]:
+    """处理主键大于 after_id 的一批旧格式记录，返回 (改写条数, 本批最后的主键)；没有剩余记录时主键为 None。"""
+    record_ids = [
+        record_id
+        for (record_id,) in db.query(models.HealthData.id)
+        .filter(models.HealthData.id > after_id, _legacy_rows_filter())
+        .order_by(models.HealthData.id.asc())
+        .limit(limit)
+        .all()
+    ]
+    if not record_ids:
+        return 0, None
+
+    migrated = 0
+    for record_id in record_ids:
+        record = (
+            db.query(models.HealthData)
+            .options(undefer_group("pdf"))
+            .filter(models.HealthData.id == record_id)
+            .first()
+        )
+        if record is None:
+            continue
+        try:
+            if migrate_record(db, record, db.get(models.User, record.user_id)):
+                migrated += 1
+            db.commit()
+        except Exception:  # noqa: BLE001
+            logger.exception("Migrating storage encryption of record %s failed", record_id)
+            db.rollback()
+        # 逐行释放已加载的大字段
+        db.expunge_all()
+    return migrated, record_ids[-1]
+
+
+def _run_storage_migration_worker() -> None:
+    after_id = 0
+    total = 0
+    while not _worker_stop.is_set():
+        db = SessionLocal()
+        try:
+            migrated, last_id = migrate_storage_batch(db, after_id, settings.STORAGE_MIGRATION_BATCH_SIZE)
+        except Exception:  # noqa: BLE001
+            logger.exception("Storage encryption migration iteration failed")
+            db.rollback()
+            migrated, last_id = 0, after_id
+        finally:
+            db.close()
+        if last_id is None:
+            logger.info("Storage encryption migration finished, %s records rewritten", total)
+            return
+        total += migrated
+        after_id = last_id
+        _worker_stop.wait(settings.STORAGE_MIGRATION_PAUSE_SECONDS)
+
+
+def start_storage_migration_worker() -> None:
+    global _worker_thread
+    if not settings.STORAGE_MIGRATION_ENABLED or settings.STORAGE_ENCRYPTION_FORMAT == "fernet":
+        return
+    if _worker_thread is not None and _worker_thread.is_alive():
+        return
+    _worker_stop.clear()
+    _worker_thread = threading.Thread(
+        target=_run_storage_migration_worker,
+        name="storage-encryption-migration",
+        daemon=True,
+    )
+    _worker_thread.start()
+
+
+def stop_storage_migration_worker() -> None:
+    _worker_stop.set()
@@ -0,0 +1,214 @@
+from collections import Counter
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Iterable, Optional
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app import models
+
+
+# 用户健康摘要的增量维护：记录增删改时先对旧状态取快照，flush 后用“减旧加新”更新摘要行，
+# 与记录本身在同一事务内提交。摘要行缺失时（旧数据）直接按当前数据重建。
+
+SUMMARY_METRICS = ("weight", "heart_rate")
+
+
+@dataclass(frozen=True)
+class RecordContribution:
+    created_at: datetime
+    is_public: bool
+    metrics: dict[str, float] = field(default_factory=dict)
+
+
+def record_contribution(record: models.HealthData) -> RecordContribution:
+    return RecordContribution(
+        created_at=record.created_at,
+        is_public=bool(record.is_public),
+        metrics={
+            point.metric: float(point.value)
+            for point in record.metric_points
+            if point.metric in SUMMARY_METRICS
+        },
+    )
+
+
+def _year_month(value: datetime) -> str:
+    return value.strftime("%Y-%m")
+
+
+def _visibility_suffix(is_public: bool) -> str:
+    return "public" if is_public else "private"
+
+
+def _adjust_month_count(db: Session, user_id: int, year_month: str, delta: int) -> None:
+    row = (
+        db.query(models.UserHealthMonthCount)
+        .filter(
+            models.UserHealthMonthCount.user_id == user_id,
+            models.UserHealthMonthCount.year_month == year_month,
+        )
+        .with_for_update()
+        .first()
+    )
+    if row is None:
+        row = models.UserHealthMonthCount(user_id=user_id, year_month=year_month, record_count=0)
+        db.add(row)
+    row.record_count = max(0, (row.record_count or 0) + delta)
+
+
+def _apply_record_totals(summary: models.UserHealthSummary, contribution: RecordContribution, sign: int) -> None:
+    summary.total_records = max(0, (summary.total_records or 0) + sign)
+    suffix = _visibility_suffix(contribution.is_public)
+    for metric, value in contribution.metrics.items():
+        sum_attr = f"{metric}_sum_{suffix}"
+        count_attr = f"{metric}_count_{suffix}"
+        setattr(summary, sum_attr, (getattr(summary, sum_attr) or 0) + sign * value)
+        setattr(summary, count_attr, max(0, (getattr(summary, count_attr) or 0) + sign))
+
+
+def _apply_contribution(db: Session, summary: models.UserHealthSummary, contribution: RecordContribution, sign: int) -> None:
+    _apply_record_totals(summary, contribution, sign)
+    _adjust_month_count(db, summary.user_id, _year_month(contribution.created_at), sign)
+
+
+def _latest_record_at(db: Session, user_id: int) -> Optional[datetime]:
+    # 走 (user_id, created_at, id) 复合索引，只在删除/改动了最新记录时才需要
+    return db.query(func.max(models.HealthData.created_at)).filter(models.HealthData.user_id == user_id).scalar()
+
+
+def rebuild_user_summary(db: Session, user_id: int) -> models.UserHealthSummary:
+    """按当前记录与指标时序表全量重建某个用户的摘要（回填与自愈使用）。"""
+    db.flush()
+    summary = db.get(models.UserHealthSummary, user_id, with_for_update=True)
+    if summary is None:
+        summary = models.UserHealthSummary(user_id=user_id)
+        db.add(summary)
+
+    total_records, latest_record_at = (
+        db.query(func.count(models.HealthData.id), func.max(models.HealthData.created_at))
+        .filter(models.HealthData.user_id == user_id)
+        .one()
+    )
+    summary.total_records = total_records or 0
+    summary.latest_record_at = latest_record_at
+
+    for metric in SUMMARY_METRICS:
+        for suffix in ("public", "private"):
+            setattr(summary, f"{metric}_sum_{suffix}", 0.0)
+            setattr(summary, f"{metric}_count_{suffix}", 0)
+    metric_rows = (
+        db.query(
+            models.HealthMetricPoint.metric,
+            models.HealthMetricPoint.is_public,
+            func.sum(models.HealthMetricPoint.value),
+            func.count(models.HealthMetricPoint.id),
+        )
+        .filter(
+            models.HealthMetricPoint.user_id == user_id,
+            models.HealthMetricPoint.metric.in_(SUMMARY_METRICS),
+        )
+        .group_by(models.HealthMetricPoint.metric, models.HealthMetricPoint.is_public)
+        .all()
+    )
+    for metric, is_public, value_sum, value_count in metric_rows:
+        suffix = _visibility_suffix(bool(is_public))
+        setattr(summary, f"{metric}_sum_{suffix}", float(value_sum or 0))
+        setattr(summary, f"{metric}_count_{suffix}", value_count or 0)
+
+    month_counts: dict[str, int] = {}
+    created_rows = (
+        db.query(models.HealthData.created_at)
+        .filter(models.HealthData.user_id == user_id)
+        .yield_per(1000)
+    )
+    for (created_at,) in created_rows:
+        year_month = _year_month(created_at)
+        month_counts[year_month] = month_counts.get(year_month, 0) + 1
+
+    db.query(models.UserHealthMonthCount).filter(models.UserHealthMonthCount.user_id == user_id).delete(
+        synchronize_session=False
+    )
+    db.add_all(
+        models.UserHealthMonthCount(user_id=user_id, year_month=year_month, record_count=count)
+        for year_month, count in month_counts.items()
+    )
+    db.flush()
+    return summary
+
+
+def apply_summary_change(
+    db: Session,
+    user_id: int,
+    before: Optional[RecordContribution],
+    after: Optional[RecordContribution],
+) -> None:
+    """在调用方事务内把一条记录从 before 状态变为 after 状态的影响累加到摘要上。"""
+    db.flush()
+    summary = db.get(models.UserHealthSummary, user_id, with_for_update=True)
+    if summary is None:
+        # 旧用户还没有摘要行：flush 后的数据已包含本次变更，直接重建即可
+        rebuild_user_summary(db, user_id)
+        return
+
+    if before is not None:
+        _apply_contribution(db, summary, before, -1)
+    if after is not None:
+        _apply_contribution(db, summary, after, 1)
+
+    if after is not None and (summary.latest_record_at is None or after.created_at > summary.latest_record_at):
+        summary.latest_record_at = after.created_at
+    elif before is not None and summary.latest_record_at is not None and before.created_at >= summary.latest_record_at:
+        summary.latest_record_at = _latest_record_at(db, user_id)
+
+
+def add_summary_contributions(db: Session, user_id: int, contributions: Iterable[RecordContribution]) -> None:
+    """批量新增记录时一次性累加，按月计数合并后每个月份只更新一行。"""
+    contributions = list(contributions)
+    if not contributions:
+        return
+
+    db.flush()
+    summary = db.get(models.UserHealthSummary, user_id, with_for_update=True)
+    if summary is None:
+        rebuild_user_summary(db, user_id)
+        return
+
+    month_deltas: Counter[str] = Counter()
+    for contribution in contributions:
+        _apply_record_totals(summary, contribution, 1)
+        month_deltas[_year_month(contribution.created_at)] += 1
+    for year_month, delta in month_deltas.items():
+        _adjust_month_count(db, user_id, year_month, delta)
+
+    latest = max(contribution.created_at for contribution in contributions)
+    if summary.latest_record_at is None or latest > summary.latest_record_at:
+        summary.latest_record_at = latest
+
+
+def load_user_summary(db: Session, user_id: int) -> tuple[models.UserHealthSummary, int]:
+    """读取摘要与本月记录数；摘要行缺失时按当前数据重建并提交。"""
+    summary = db.get(models.UserHealthSummary, user_id)
+    if summary is None:
+        summary = rebuild_user_summary(db, user_id)
+        db.commit()
+
+    month_row = (
+        db.query(models.UserHealthMonthCount.record_count)
+        .filter(
+            models.UserHealthMonthCount.user_id == user_id,
+            models.UserHealthMonthCount.year_month == _year_month(datetime.now()),
+        )
+        .first()
+    )
+    return summary, month_row[0] if month_row else 0
+
+
+def summary_average(summary: models.UserHealthSummary, metric: str, *, include_private: bool) -> Optional[float]:
+    value_sum = getattr(summary, f"{metric}_sum_public") or 0
+    value_count = getattr(summary, f"{metric}_count_public") or 0
+    if include_private:
+        value_sum += getattr(summary, f"{metric}_sum_private") or 0
+        value_count += getattr(summary, f"{metric}_count_private") or 0
+    return value_sum / value_count if value_count else None
@@ -11,6 +11,7 @@ from sqlalchemy.orm import Session
 from app import models, schemas
 from app.database import get_db
 from app.features.auth.dependencies import get_current_user
+from app.pagination import paginate_keyset
 
 try:
     from pypdf import PdfReader
@@ -262,6 +263,7 @@ async def list_articles(
     category: Optional[str] = None,
     keyword: Optional[str] = None,
     sort_by: str = Query("latest", pattern="^(latest|hot)$"),
+    cursor: Optional[str] = None,
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_user),
 ):
@@ -283,11 +285,17 @@ async def list_articles(
     total = query.count()
 
     if sort_by == "hot":
-        query = query.order_by(desc(models.HealthArticle.view_count), desc(models.HealthArticle.created_at))
+        cursor_columns = (models.HealthArticle.view_count, models.HealthArticle.created_at, models.HealthArticle.id)
     else:
-        query = query.order_by(desc(models.HealthArticle.created_at))
-
-    articles = query.offset((page - 1) * page_size).limit(page_size).all()
+        cursor_columns = (models.HealthArticle.created_at, models.HealthArticle.id)
+
+    articles, next_cursor = paginate_keyset(
+        query,
+        cursor_columns,
+        limit=page_size,
+        cursor=cursor,
+        offset=(page - 1) * page_size,
+    )
     article_ids = [article.id for article in articles]
     count_map = _favorite_count_map(db, article_ids)
     view_map = _view_count_map(db, article_ids)
@@ -306,6 +314,7 @@ async def list_articles(
         total=total,
         page=page,
         page_size=page_size,
+        next_cursor=next_cursor,
     )
 
 
@@ -396,17 +405,19 @@ async def unfavorite_article(
 async def list_favorites(
     page: int = Query(1, ge=1),
     page_size: int = Query(12, ge=1, le=100),
+    cursor: Optional[str] = None,
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_user),
 ):
     favorites_query = db.query(models.ArticleFavorite).filter(models.ArticleFavorite.user_id == current_user.id)
     total = favorites_query.count()
 
-    favorites = (
-        favorites_query.order_by(desc(models.ArticleFavorite.created_at))
-        .offset((page - 1) * page_size)
-        .limit(page_size)
-        .all()
+    favorites, next_cursor = paginate_keyset(
+        favorites_query,
+        (models.ArticleFavorite.created_at, models.ArticleFavorite.id),
+        limit=page_size,
+        cursor=cursor,
+        offset=(page - 1) * page_size,
     )
 
     articles = [favorite.article for favorite in favorites if favorite.article]
@@ -428,6 +439,7 @@ async def list_favorites(
         total=total,
         page=page,
         page_size=page_size,
+        next_cursor=next_cursor,
     )
 
 
@@ -3,6 +3,12 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from app.database import init_db
+from app.features.blockchain.async_service import async_chain_service
+from app.features.blockchain.indexer import start_chain_indexer, stop_chain_indexer
+from app.features.blockchain.service import chain_health_monitor, chain_service
+from app.features.health_data.anchoring import start_anchor_worker, stop_anchor_worker
+from app.features.health_data.outbox import start_outbox_worker, stop_outbox_worker
+from app.features.health_data.storage import start_storage_migration_worker, stop_storage_migration_worker
 from app.features.admin.router import router as admin_system_router
 from app.features.ai.router import router as ai_assistant_router
 from app.features.auth.router import router as auth_router
@@ -28,6 +34,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
  
@@ -42,6 +49,22 @@ app.include_router(admin_system_router, prefix="/api/admin/system", tags=["管
 @app.on_event("startup")
 def on_startup() -> None:
     init_db()
+    if chain_service.enabled:
+        chain_health_monitor.start()
+    start_anchor_worker()
+    start_outbox_worker()
+    start_storage_migration_worker()
+    start_chain_indexer()
+
+
+@app.on_event("shutdown")
+async def on_shutdown() -> None:
+    stop_anchor_worker()
+    stop_outbox_worker()
+    stop_storage_migration_worker()
+    stop_chain_indexer()
+    chain_health_monitor.stop()
+    await async_chain_service.close()
  
 @app.get("/")
 async def root():
@@ -49,7 +72,11 @@ async def root():
  
 @app.get("/api/health")
 async def health_check():
-    return {"status": "healthy", "version": "1.0.0"}
+    return {
+        "status": "healthy",
+        "version": "1.0.0",
+        "chain": chain_service.pool.health_state() if chain_service.enabled else "disabled",
+    }
  
 if __name__ == "__main__":
     import uvicorn
@@ -1,5 +1,5 @@
-from sqlalchemy import Boolean, Column, DateTime, Enum, ForeignKey, Integer, LargeBinary, String, Text, UniqueConstraint
-from sqlalchemy.orm import relationship
+from sqlalchemy import BigInteger, Boolean, Column, DateTime, Enum, Float, ForeignKey, Index, Integer, LargeBinary, String, Text, UniqueConstraint
+from sqlalchemy.orm import deferred, relationship
 from sqlalchemy.sql import func
 
 from app.database import Base
@@ -22,6 +22,7 @@ class User(Base):
     """用户账号表：保存登录信息，并通过 role_id 关联身份表。"""
 
     __tablename__ = "users"
+    __table_args__ = (Index("ix_users_created_id", "created_at", "id"),)
 
     id = Column(Integer, primary_key=True, index=True)
     username = Column(String(50), unique=True, index=True, nullable=False)
@@ -53,29 +54,205 @@ class HealthData(Base):
     """健康数据表：统一存储文本健康信息与 PDF 文件。"""
 
     __tablename__ = "health_data_user"
+    __table_args__ = (
+        # 游标分页用的复合索引：个人记录列表与公开记录流
+        Index("ix_health_data_user_created_id", "user_id", "created_at", "id"),
+        Index("ix_health_data_public_created_id", "is_public", "created_at", "id"),
+        # Merkle 批量锚定：挑选待锚定记录、按批次回写交易信息
+        Index("ix_health_data_anchor_batch", "merkle_batch_id", "onchain_data_id", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
     data_title = Column(String(255), nullable=True)
     data_content = Column(Text, nullable=True)
     encrypted_data_content = Column(Text, nullable=True)
-    pdf_data = Column(LargeBinary, nullable=True)
-    encrypted_pdf_data = Column(LargeBinary, nullable=True)
+    # PDF 大字段默认延迟加载，列表等场景无需把整份文件从数据库拉出来；需要时用 undefer_group("pdf")
+    pdf_data = deferred(Column(LargeBinary, nullable=True), group="pdf")
+    encrypted_pdf_data = deferred(Column(LargeBinary, nullable=True), group="pdf")
+    # 信封加密：正文 / PDF 由记录自己的随机数据密钥加密，这里存用私钥或公共存储密钥包装后的数据密钥；
+    # 为空表示旧记录，正文直接由私钥或公共存储密钥加密
+    wrapped_data_key = Column(Text, nullable=True)
     file_type = Column(Enum("text", "pdf", name="health_data_file_type"), nullable=False, default="text", index=True)
     pdf_size = Column(Integer, nullable=True)
     is_public = Column(Boolean, default=False, nullable=False, index=True)
+    # 写入时计算并保存的规范载荷摘要，链上校验与完整性审计无需再解密原文
+    data_hash = Column(String(66), nullable=True)
+    data_hash_version = Column(String(32), nullable=True)
     onchain_data_id = Column(String(66), nullable=True)
     onchain_tx_hash = Column(String(66), nullable=True)
+    # 上链进度：pending 排队中、confirmed 已确认、failed 重试耗尽；未启用链上存证时为空
+    onchain_status = Column(String(16), nullable=True, index=True)
+    # Merkle 批量锚定模式下记录所属批次与包含证明（JSON：leaf_index、leaf_count、siblings）
+    merkle_batch_id = Column(Integer, ForeignKey("health_anchor_batches.id", ondelete="SET NULL"), nullable=True)
+    merkle_proof = Column(Text, nullable=True)
     created_at = Column(DateTime, server_default=func.now(), nullable=False)
     updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now(), nullable=False)
 
     user = relationship("User", back_populates="health_records")
+    metric_points = relationship("HealthMetricPoint", back_populates="record", cascade="all, delete-orphan")
+
+
+class HealthAnchorBatch(Base):
+    """Merkle 锚定批次表：一个时间窗口内的记录摘要组成一棵树，只把根哈希写上链。"""
+
+    __tablename__ = "health_anchor_batches"
+
+    id = Column(Integer, primary_key=True, index=True)
+    merkle_root = Column(String(66), nullable=False)
+    leaf_count = Column(Integer, nullable=False)
+    status = Column(Enum("pending", "anchored", "failed", name="health_anchor_batch_status"), nullable=False, default="pending")
+    onchain_data_id = Column(String(66), nullable=True)
+    onchain_tx_hash = Column(String(66), nullable=True)
+    error_message = Column(String(500), nullable=True)
+    created_at = Column(DateTime, server_default=func.now(), nullable=False)
+    anchored_at = Column(DateTime, nullable=True)
+
+
+class ChainWriteOutbox(Base):
+    """链上写入发件箱：记录先提交入库，后台任务按此表签名、发送并确认交易，失败按退避重试。"""
+
+    __tablename__ = "chain_write_outbox"
+    __table_args__ = (Index("ix_chain_write_outbox_status_next", "status", "next_attempt_at", "id"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    record_id = Column(Integer, ForeignKey("health_data_user.id", ondelete="CASCADE"), nullable=False, index=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    status = Column(
+        Enum("pending", "processing", "done", "failed", name="chain_write_outbox_status"),
+        nullable=False,
+        default="pending",
+    )
+    attempts = Column(Integer, default=0, nullable=False)
+    next_attempt_at = Column(DateTime, nullable=False)
+    # 用户未在服务端保存私钥时，用服务端密钥加密暂存本次提供的私钥，任务结束即清除
+    encrypted_signing_key = Column(Text, nullable=True)
+    tx_hash = Column(String(66), nullable=True)
+    last_error = Column(String(500), nullable=True)
+    created_at = Column(DateTime, server_default=func.now(), nullable=False)
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now(), nullable=False)
+
+
+class ChainHealthRecord(Base):
+    """链上 healthRecords 的本地镜像：由事件索引器在确认深度之后写入，校验时按 data_id 查表代替 RPC。"""
+
+    __tablename__ = "chain_health_records"
+
+    data_id = Column(String(66), primary_key=True)
+    data_hash = Column(String(66), nullable=False)
+    encrypted_digest = Column(String(66), nullable=False)
+    timestamp = Column(BigInteger, nullable=False)
+    owner = Column(String(42), nullable=False, index=True)
+    is_active = Column(Boolean, default=True, nullable=False)
+    data_type = Column(String(255), nullable=True)
+    status = Column(Integer, default=0, nullable=False)
+    block_number = Column(BigInteger, nullable=False)
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now(), nullable=False)
+
+
+class ChainIndexedEvent(Base):
+    """已处理的合约事件及应用前的镜像快照，链重组时按倒序恢复。"""
+
+    __tablename__ = "chain_indexed_events"
+    __table_args__ = (UniqueConstraint("tx_hash", "log_index", name="uq_chain_indexed_event_log"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    block_number = Column(BigInteger, nullable=False, index=True)
+    block_hash = Column(String(66), nullable=False)
+    tx_hash = Column(String(66), nullable=False)
+    log_index = Column(Integer, nullable=False)
+    event_name = Column(String(32), nullable=False)
+    data_id = Column(String(66), nullable=False, index=True)
+    # 事件应用前的镜像行（JSON），为空表示事件之前没有该记录
+    previous_state = Column(Text, nullable=True)
+    created_at = Column(DateTime, server_default=func.now(), nullable=False)
+
+
+class ChainIndexerCheckpoint(Base):
+    """索引器进度：最后处理完的区块号与区块哈希，启动时从这里续扫并检测重组。"""
+
+    __tablename__ = "chain_indexer_checkpoints"
+
+    name = Column(String(64), primary_key=True)
+    block_number = Column(BigInteger, nullable=False)
+    block_hash = Column(String(66), nullable=True)
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now(), nullable=False)
+
+
+class SecretKeyRotationCheckpoint(Base):
+    """SECRET_KEY 轮换任务的断点：每个阶段记录已处理到的主键与计数，中断后从断点继续。"""
+
+    __tablename__ = "secret_key_rotation_checkpoints"
+    __table_args__ = (UniqueConstraint("rotation_id", "phase", name="uq_secret_key_rotation_phase"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    # 由新旧密钥派生的标识（不含密钥本身），同一次轮换重复运行时命中同一组断点
+    rotation_id = Column(String(32), nullable=False)
+    phase = Column(String(32), nullable=False)
+    last_id = Column(Integer, nullable=False, default=0)
+    rows_rotated = Column(Integer, nullable=False, default=0)
+    rows_skipped = Column(Integer, nullable=False, default=0)
+    rows_failed = Column(Integer, nullable=False, default=0)
+    completed_at = Column(DateTime, nullable=True)
+    created_at = Column(DateTime, server_default=func.now(), nullable=False)
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now(), nullable=False)
+
+
+class HealthMetricPoint(Base):
+    """健康指标时序表：把记录里的 metrics 拆成 (指标, 时间, 数值) 行，聚合统计直接走 SQL。"""
+
+    __tablename__ = "health_metric_points"
+    __table_args__ = (Index("ix_health_metric_points_user_metric_time", "user_id", "metric", "recorded_at"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    record_id = Column(Integer, ForeignKey("health_data_user.id", ondelete="CASCADE"), nullable=False, index=True)
+    metric = Column(String(64), nullable=False)
+    recorded_at = Column(DateTime, nullable=False)
+    value = Column(Float, nullable=False)
+    # 与所属记录保持一致，未提供私钥时只统计公开记录的指标
+    is_public = Column(Boolean, default=False, nullable=False)
+
+    record = relationship("HealthData", back_populates="metric_points")
+
+
+class UserHealthSummary(Base):
+    """用户健康摘要物化表：记录增删改时在同一事务内增量维护，/summary 按主键直接读取。"""
+
+    __tablename__ = "user_health_summary"
+
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    total_records = Column(Integer, default=0, nullable=False)
+    latest_record_at = Column(DateTime, nullable=True)
+    # 公开与私密记录分开累计，未提供私钥时只用公开部分计算平均值
+    weight_sum_public = Column(Float, default=0, nullable=False)
+    weight_count_public = Column(Integer, default=0, nullable=False)
+    weight_sum_private = Column(Float, default=0, nullable=False)
+    weight_count_private = Column(Integer, default=0, nullable=False)
+    heart_rate_sum_public = Column(Float, default=0, nullable=False)
+    heart_rate_count_public = Column(Integer, default=0, nullable=False)
+    heart_rate_sum_private = Column(Float, default=0, nullable=False)
+    heart_rate_count_private = Column(Integer, default=0, nullable=False)
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now(), nullable=False)
+
+
+class UserHealthMonthCount(Base):
+    """用户按月记录数计数表：配合摘要表回答“本月记录数”。"""
+
+    __tablename__ = "user_health_month_counts"
+    __table_args__ = (UniqueConstraint("user_id", "year_month", name="uq_user_health_month"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
+    year_month = Column(String(7), nullable=False)
+    record_count = Column(Integer, default=0, nullable=False)
 
 
 class ChatMessage(Base):
     """聊天记录表：保存用户与 AI 助手的对话消息。"""
 
     __tablename__ = "chat_messages"
+    __table_args__ = (Index("ix_chat_messages_user_created_id", "user_id", "created_at", "id"),)
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
@@ -90,6 +267,10 @@ class HealthArticle(Base):
     """健康知识文章表：存储科普文章内容与基础统计信息。"""
 
     __tablename__ = "health_articles"
+    __table_args__ = (
+        Index("ix_health_articles_created_id", "created_at", "id"),
+        Index("ix_health_articles_hot_created_id", "view_count", "created_at", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     title = Column(String(200), nullable=False, index=True)
@@ -126,7 +307,10 @@ class ArticleFavorite(Base):
     """文章收藏表：记录用户收藏的健康文章。"""
 
     __tablename__ = "article_favorites"
-    __table_args__ = (UniqueConstraint("user_id", "article_id", name="uq_article_favorite_user_article"),)
+    __table_args__ = (
+        UniqueConstraint("user_id", "article_id", name="uq_article_favorite_user_article"),
+        Index("ix_article_favorites_user_created_id", "user_id", "created_at", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
@@ -0,0 +1,76 @@
+import base64
+import binascii
+import json
+from datetime import datetime
+from typing import Any, Optional, Sequence
+
+from fastapi import HTTPException
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import Query
+
+
+# 游标分页（keyset）：按 (排序列..., id) 记住上一页最后一行的位置，
+# 下一页直接 WHERE (created_at, id) < (上次值) 走复合索引，翻页深度不再影响耗时。
+
+
+def _encode_value(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return {"dt": value.isoformat()}
+    return value
+
+
+def _decode_value(value: Any) -> Any:
+    if isinstance(value, dict) and "dt" in value:
+        return datetime.fromisoformat(value["dt"])
+    return value
+
+
+def encode_cursor(values: Sequence[Any]) -> str:
+    payload = json.dumps([_encode_value(item) for item in values], separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str, expected_length: int) -> list[Any]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")).decode("utf-8"))
+        if not isinstance(values, list) or len(values) != expected_length:
+            raise ValueError("cursor length mismatch")
+        return [_decode_value(item) for item in values]
+    except (ValueError, TypeError, binascii.Error, UnicodeError) as exc:
+        raise HTTPException(status_code=400, detail="分页游标无效") from exc
+
+
+def _keyset_condition(columns: Sequence[Any], values: Sequence[Any], descending: bool):
+    # (a, b, c) < (x, y, z) 展开为 a<x OR (a=x AND b<y) OR (a=x AND b=y AND c<z)，兼容 MySQL 与 SQLite
+    clauses = []
+    for position, column in enumerate(columns):
+        equals = [columns[index] == values[index] for index in range(position)]
+        compare = column < values[position] if descending else column > values[position]
+        clauses.append(and_(*equals, compare))
+    return or_(*clauses)
+
+
+def paginate_keyset(
+    query: Query,
+    columns: Sequence[Any],
+    *,
+    limit: int,
+    cursor: Optional[str] = None,
+    offset: int = 0,
+    descending: bool = True,
+) -> tuple[list[Any], Optional[str]]:
+    """按给定列做游标分页；未传 cursor 时退化为 offset 分页以兼容旧参数。返回 (本页数据, 下一页游标)。"""
+    if cursor:
+        query = query.filter(_keyset_condition(columns, decode_cursor(cursor, len(columns)), descending))
+    query = query.order_by(*[column.desc() if descending else column.asc() for column in columns])
+    if not cursor and offset:
+        query = query.offset(offset)
+
+    rows = query.limit(limit + 1).all()
+    if len(rows) <= limit:
+        return rows, None
+
+    rows = rows[:limit]
+    last = rows[-1]
+    return rows, encode_cursor([getattr(last, column.key) for column in columns])
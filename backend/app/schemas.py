@@ -86,6 +86,7 @@ class AdminUserListResponse(BaseModel):
     total: int
     page: int
     page_size: int
+    next_cursor: Optional[str] = None
 
 
 ARTICLE_CATEGORIES = [
@@ -137,6 +138,7 @@ class HealthArticleListResponse(BaseModel):
     total: int
     page: int
     page_size: int
+    next_cursor: Optional[str] = None
 
 
 class FavoriteResponse(BaseModel):
@@ -232,8 +234,12 @@ class HealthDataResponse(HealthDataBase):
     id: int
     user_id: int
     requires_private_key: bool = False
+    pdf_download_url: Optional[str] = None
+    payload_included: bool = True
+    data_hash: Optional[str] = None
     onchain_data_id: Optional[str] = None
     onchain_tx_hash: Optional[str] = None
+    onchain_status: Optional[str] = None
     onchain_verified: Optional[bool] = None
     onchain_verification_message: Optional[str] = None
     created_at: datetime
@@ -242,10 +248,34 @@ class HealthDataResponse(HealthDataBase):
     class Config:
         from_attributes = True
 
+class HealthDataImportError(BaseModel):
+    line: int
+    error: str
+
+class HealthDataImportResponse(BaseModel):
+    format: str
+    imported: int
+    failed: int
+    errors: List[HealthDataImportError]
+
 class HealthAnalysisRequest(BaseModel):
     start_date: Optional[date] = None
     end_date: Optional[date] = None
 
+class HealthMetricSeriesPoint(BaseModel):
+    timestamp: datetime
+    value: float
+    min: float
+    max: float
+    count: int
+
+class HealthMetricSeriesResponse(BaseModel):
+    metric: str
+    bucket: str
+    total_samples: int
+    downsampled: bool = False
+    points: List[HealthMetricSeriesPoint]
+
 # AI聊天Schema
 class ChatMessage(BaseModel):
     message: str
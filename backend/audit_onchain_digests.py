@@ -0,0 +1,62 @@
+import argparse
+
+from app.database import SessionLocal
+from app.features.blockchain.service import chain_service
+from app.features.health_data.router import RECORD_DIGEST_VERSION
+from app import models
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="用持久化摘要核对链上存证，全程不需要用户私钥")
+    parser.add_argument("--batch-size", type=int, default=200)
+    args = parser.parse_args()
+
+    if not chain_service.enabled:
+        print("Blockchain service is not configured.")
+        return
+
+    totals = {"matched": 0, "mismatched": 0, "missing_onchain": 0, "no_digest": 0}
+    db = SessionLocal()
+    try:
+        last_id = 0
+        while True:
+            rows = (
+                db.query(
+                    models.HealthData.id,
+                    models.HealthData.onchain_data_id,
+                    models.HealthData.data_hash,
+                    models.HealthData.data_hash_version,
+                )
+                .filter(models.HealthData.id > last_id, models.HealthData.onchain_data_id.isnot(None))
+                .order_by(models.HealthData.id.asc())
+                .limit(args.batch_size)
+                .all()
+            )
+            if not rows:
+                break
+            last_id = rows[-1].id
+
+            onchain_records = chain_service.get_health_records_batch(
+                data_id_hexes=[row.onchain_data_id for row in rows]
+            )
+            for row in rows:
+                if not row.data_hash or row.data_hash_version != RECORD_DIGEST_VERSION:
+                    totals["no_digest"] += 1
+                    continue
+                onchain_record = onchain_records.get(row.onchain_data_id)
+                if not onchain_record:
+                    totals["missing_onchain"] += 1
+                    print(f"record {row.id}: not found on chain ({row.onchain_data_id})")
+                elif onchain_record.get("data_hash", "").lower() != row.data_hash.lower():
+                    totals["mismatched"] += 1
+                    print(f"record {row.id}: digest mismatch ({row.onchain_data_id})")
+                else:
+                    totals["matched"] += 1
+    finally:
+        db.close()
+
+    print("Audit finished: " + ", ".join(f"{key}={value}" for key, value in totals.items()))
+
+
+if __name__ == "__main__":
+    main()
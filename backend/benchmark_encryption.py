@@ -0,0 +1,124 @@
+import argparse
+import os
+import time
+import tracemalloc
+
+from app.features.blockchain import encryption
+
+
+def _per_call_us(operation, calls: int) -> float:
+    started = time.perf_counter()
+    for _ in range(calls):
+        operation()
+    return (time.perf_counter() - started) * 1_000_000 / calls
+
+
+def _per_record_us(decrypt, tokens: list[str], private_key: str) -> float:
+    started = time.perf_counter()
+    for token in tokens:
+        decrypt(token, private_key)
+    return (time.perf_counter() - started) * 1_000_000 / len(tokens)
+
+
+def _decrypt_uncached(cipher_text: str, private_key: str) -> str:
+    # 旧实现：每条记录都重新标准化私钥、计算 SHA-256 并构造 Fernet
+    fernet = encryption._derive_fernet(encryption.normalize_private_key(private_key))
+    return fernet.decrypt(cipher_text.encode("utf-8")).decode("utf-8")
+
+
+def _compare_formats(private_key: str, sizes: list[int], rounds: int) -> None:
+    # Fernet 令牌与 AES-GCM 信封：二进制列存储的字节数与加解密吞吐
+    print("format    size(B)   stored(B)   encrypt MB/s   decrypt MB/s")
+    fernet = encryption.build_fernet_from_private_key(private_key)
+    formats = {
+        "fernet": (fernet.encrypt, lambda token: fernet.decrypt(token)),
+        "aesgcm": (
+            lambda raw: encryption.encrypt_envelope(raw, private_key),
+            lambda envelope: encryption.decrypt_envelope(envelope, private_key),
+        ),
+    }
+    for size in sizes:
+        raw = os.urandom(size)
+        calls = max(5, min(2000, 20_000_000 // max(size, 1)))
+        for name, (encrypt, decrypt) in formats.items():
+            stored = encrypt(raw)
+            encrypt_us = min(_per_call_us(lambda: encrypt(raw), calls) for _ in range(rounds))
+            decrypt_us = min(_per_call_us(lambda: decrypt(stored), calls) for _ in range(rounds))
+            print(f"{name:8s} {size:8d} {len(stored):11d} {size / encrypt_us:14.1f} {size / decrypt_us:14.1f}")
+
+
+def _peak_kib(operation) -> float:
+    tracemalloc.start()
+    try:
+        operation()
+        return tracemalloc.get_traced_memory()[1] / 1024
+    finally:
+        tracemalloc.stop()
+
+
+def _compare_range_reads(private_key: str, size: int) -> None:
+    # 读取 PDF 中间 1 KiB：Fernet 需要整体解密，分段信封只解密覆盖区间的段
+    raw = os.urandom(size)
+    token = encryption.build_fernet_from_private_key(private_key).encrypt(raw)
+    segmented = encryption.encrypt_segmented(raw, private_key)
+    layout = encryption.segmented_layout(segmented[: encryption.SEGMENTED_HEADER_BYTES], len(segmented))
+    start = size // 2
+
+    def fernet_range() -> bytes:
+        return encryption.decrypt_binary(token, private_key)[start : start + 1024]
+
+    def segmented_range() -> bytes:
+        chunks = encryption.iter_decrypt_range(
+            layout, lambda offset, length: segmented[offset : offset + length], private_key, start, start + 1023
+        )
+        return b"".join(chunks)
+
+    assert fernet_range() == segmented_range() == raw[start : start + 1024]
+    print(f"range read of 1 KiB from {size} B")
+    for name, operation in (("fernet", fernet_range), ("segmented", segmented_range)):
+        print(f"{name:9s}: {_per_call_us(operation, 20):10.1f} us/read, peak {_peak_kib(operation):9.1f} KiB")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="逐条解密的单条耗时：每次派生 Fernet 与缓存 Fernet 对比；Fernet 与 AES-GCM 信封对比")
+    parser.add_argument("--records", type=int, default=200, help="模拟列表页的记录条数")
+    parser.add_argument("--payload-bytes", type=int, default=512, help="每条记录明文大小")
+    parser.add_argument("--rounds", type=int, default=20)
+    parser.add_argument(
+        "--format-sizes",
+        default="1024,65536,1048576",
+        help="格式对比使用的明文大小（字节，逗号分隔）",
+    )
+    args = parser.parse_args()
+
+    private_key = "0x" + os.urandom(32).hex()
+    payload = os.urandom(args.payload_bytes // 2).hex()
+    # 旧格式令牌，用于对比派生与缓存 Fernet 的开销
+    fernet = encryption.build_fernet_from_private_key(private_key)
+    tokens = [fernet.encrypt(payload.encode("utf-8")).decode("utf-8") for _ in range(args.records)]
+
+    # 两种实现交替执行、各取最好成绩，减小机器抖动的影响
+    uncached = cached = float("inf")
+    for _ in range(args.rounds):
+        uncached = min(uncached, _per_record_us(_decrypt_uncached, tokens, private_key))
+        cached = min(cached, _per_record_us(encryption.decrypt_text, tokens, private_key))
+    derive = min(
+        _per_call_us(lambda: encryption._derive_fernet(encryption.normalize_private_key(private_key)), 2000)
+        for _ in range(args.rounds)
+    )
+    lookup = min(_per_call_us(lambda: encryption.build_fernet_from_private_key(private_key), 2000) for _ in range(args.rounds))
+
+    print(f"records={args.records} payload={args.payload_bytes}B rounds={args.rounds}")
+    print(f"cipher derive   : {derive:8.2f} us/call")
+    print(f"cipher lookup   : {lookup:8.2f} us/call")
+    print(f"decrypt, derive : {uncached:8.2f} us/record")
+    print(f"decrypt, cached : {cached:8.2f} us/record")
+    print(f"speedup         : {uncached / cached:8.2f}x")
+    print(f"cache           : {encryption.cipher_cache_stats()}")
+    print()
+    _compare_formats(private_key, [int(size) for size in args.format_sizes.split(",") if size.strip()], min(args.rounds, 5))
+    print()
+    _compare_range_reads(private_key, 6 * 1024 * 1024)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""pytest 公共夹具：测试使用临时 SQLite 数据库，不依赖 MySQL 与链上节点。
+
+必须在导入 app 之前设置环境变量，Settings 在导入时读取配置。
+"""
+
+import itertools
+import os
+import tempfile
+
+_TEST_DB_DIR = tempfile.mkdtemp(prefix="health-test-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_TEST_DB_DIR, 'test.db')}"
+# 后台任务在测试里由用例直接调用，不随应用启动
+os.environ["STORAGE_MIGRATION_ENABLED"] = "false"
+os.environ["CHAIN_INDEXER_ENABLED"] = "false"
+os.environ.pop("HEALTH_DATA_CONTRACT_ADDRESS", None)
+os.environ.pop("HEALTH_DATA_CONTRACT_ABI_JSON", None)
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.database import SessionLocal, init_db
+
+_user_counter = itertools.count(1)
+
+
+@pytest.fixture(scope="session")
+def client():
+    from app.main import app
+
+    with TestClient(app) as test_client:
+        yield test_client
+
+
+@pytest.fixture
+def db():
+    init_db()
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.rollback()
+        session.close()
+
+
+@pytest.fixture
+def user(client):
+    """注册并登录一个新用户，返回 dict(id, headers, private_key)。"""
+    index = next(_user_counter)
+    username = f"tester{index}"
+    response = client.post(
+        "/api/auth/register",
+        json={"username": username, "email": f"{username}@example.com", "password": "test123456"},
+    )
+    assert response.status_code == 200, response.text
+    body = response.json()
+    token = client.post(
+        "/api/auth/login",
+        data={"username": username, "password": "test123456"},
+    ).json()["access_token"]
+    return {
+        "id": body["id"],
+        "headers": {"Authorization": f"Bearer {token}"},
+        "private_key": body["generated_private_key"],
+    }
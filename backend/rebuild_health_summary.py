@@ -0,0 +1,55 @@
+import argparse
+
+from app.database import SessionLocal, init_db
+from app.features.health_data.metrics import replace_record_metric_points
+from app.features.health_data.router import _resolve_record_values
+from app.features.health_data.summary import rebuild_user_summary
+from app import models
+
+
+def _backfill_metric_points(db, user_id: int) -> int:
+    """为还没有指标行的旧文本记录补建指标；私密记录没有用户私钥无法解密，只能跳过。"""
+    records = (
+        db.query(models.HealthData)
+        .filter(
+            models.HealthData.user_id == user_id,
+            models.HealthData.file_type == "text",
+            ~models.HealthData.metric_points.any(),
+        )
+        .all()
+    )
+    filled = 0
+    for record in records:
+        content, _, requires_private_key = _resolve_record_values(record, load_pdf=False)
+        if requires_private_key or not content:
+            continue
+        replace_record_metric_points(record, content)
+        filled += 1
+    return filled
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="重建 user_health_summary 与按月计数")
+    parser.add_argument("--user-id", type=int, default=None, help="只重建指定用户")
+    parser.add_argument("--backfill-metrics", action="store_true", help="先为旧的公开文本记录补建指标时序行")
+    args = parser.parse_args()
+
+    init_db()
+    db = SessionLocal()
+    try:
+        if args.user_id is not None:
+            user_ids = [args.user_id]
+        else:
+            user_ids = [row.id for row in db.query(models.User.id).order_by(models.User.id.asc()).all()]
+
+        for user_id in user_ids:
+            filled = _backfill_metric_points(db, user_id) if args.backfill_metrics else 0
+            summary = rebuild_user_summary(db, user_id)
+            db.commit()
+            print(f"user {user_id}: total_records={summary.total_records}, backfilled_metric_records={filled}")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+import argparse
+import os
+import sys
+
+from app.config import settings
+from app.database import init_db
+from app.features.health_data.key_rotation import PHASES, run_secret_key_rotation
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=(
+            "把 SECRET_KEY_PREVIOUS 加密的托管私钥与公开记录改为当前 SECRET_KEY；"
+            "可中断，重跑时从断点继续。全部完成且 failed 为 0 后再移除 SECRET_KEY_PREVIOUS"
+        )
+    )
+    parser.add_argument("--chunk-size", type=int, default=500, help="每块读取并提交的行数")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="重新加密的进程数")
+    parser.add_argument("--phase", choices=PHASES, action="append", help="只执行指定阶段，可重复；默认全部")
+    args = parser.parse_args()
+
+    # 密钥只从环境变量读取，不出现在命令行参数（进程列表可见）里
+    old_secret = settings.SECRET_KEY_PREVIOUS
+    new_secret = settings.SECRET_KEY
+    if not old_secret:
+        print("SECRET_KEY_PREVIOUS is not set, nothing to rotate.")
+        sys.exit(1)
+    if old_secret == new_secret:
+        print("SECRET_KEY_PREVIOUS equals SECRET_KEY.")
+        sys.exit(1)
+
+    init_db()
+
+    def report(phase, checkpoint, rows_per_second: float) -> None:
+        print(
+            f"{phase}: last_id={checkpoint.last_id} rotated={checkpoint.rows_rotated} "
+            f"skipped={checkpoint.rows_skipped} failed={checkpoint.rows_failed} {rows_per_second:.1f} rows/s",
+            flush=True,
+        )
+
+    summary = run_secret_key_rotation(
+        old_secret,
+        new_secret,
+        phases=tuple(args.phase or PHASES),
+        chunk_size=args.chunk_size,
+        workers=max(args.workers, 1),
+        progress=report,
+    )
+    for phase, counts in summary.items():
+        print(f"{phase}: {counts}")
+    if any(counts["failed"] for counts in summary.values()):
+        sys.exit(2)
+
+
+if __name__ == "__main__":
+    main()
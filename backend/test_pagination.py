@@ -0,0 +1,79 @@
+"""游标（keyset）分页。"""
+
+from datetime import datetime
+
+import pytest
+from fastapi import HTTPException
+
+from app import models
+from app.pagination import decode_cursor, encode_cursor, paginate_keyset
+
+
+def test_cursor_round_trip_keeps_datetimes():
+    values = [datetime(2026, 1, 2, 3, 4, 5, 678000), 42]
+    assert decode_cursor(encode_cursor(values), 2) == values
+
+
+@pytest.mark.parametrize("cursor", ["garbage", encode_cursor([1]), encode_cursor([1, 2, 3]), "%%%"])
+def test_decode_cursor_rejects_invalid(cursor):
+    with pytest.raises(HTTPException) as excinfo:
+        decode_cursor(cursor, 2)
+    assert excinfo.value.status_code == 400
+
+
+def test_paginate_keyset_breaks_ties_by_id(db, user):
+    created_at = datetime(2026, 1, 1)
+    for index in range(7):
+        db.add(
+            models.HealthData(
+                user_id=user["id"],
+                data_title=f"r{index}",
+                file_type="text",
+                # 前后两条共用同一时间，验证按 id 打破并列
+                created_at=created_at.replace(second=index // 2),
+            )
+        )
+    db.flush()
+    query = db.query(models.HealthData).filter(models.HealthData.user_id == user["id"])
+    columns = (models.HealthData.created_at, models.HealthData.id)
+
+    seen, cursor = [], None
+    while True:
+        rows, cursor = paginate_keyset(query, columns, limit=3, cursor=cursor)
+        seen.extend(rows)
+        if cursor is None:
+            break
+
+    assert len(seen) == 7
+    assert [(row.created_at, row.id) for row in seen] == sorted(
+        ((row.created_at, row.id) for row in seen), reverse=True
+    )
+
+    rows, cursor = paginate_keyset(query, columns, limit=2, offset=6)
+    assert [row.id for row in rows] == [seen[-1].id] and cursor is None
+
+
+def test_record_listing_cursor_header(client, user):
+    for index in range(5):
+        response = client.post(
+            "/api/health/records",
+            headers=user["headers"],
+            json={"data_content": f'{{"metrics": {{"weight": {70 + index}}}}}', "private_key": user["private_key"]},
+        )
+        assert response.status_code == 200, response.text
+
+    seen, cursor = [], None
+    while True:
+        params = {"limit": 2, "fields": "meta"}
+        if cursor:
+            params["cursor"] = cursor
+        response = client.get("/api/health/records", headers=user["headers"], params=params)
+        assert response.status_code == 200, response.text
+        seen.extend(item["id"] for item in response.json())
+        cursor = response.headers.get("x-next-cursor")
+        if not cursor:
+            break
+    assert seen == sorted(seen, reverse=True) and len(seen) == 5
+
+    response = client.get("/api/health/records", headers=user["headers"], params={"cursor": "garbage"})
+    assert response.status_code == 400
@@ -0,0 +1,91 @@
+"""multipart PDF 上传与 Range 分段下载。"""
+
+import os
+
+import pytest
+from fastapi import HTTPException
+
+from app.features.health_data.router import (
+    _PdfPayloadHasher,
+    _build_source_payload,
+    _hash_payload,
+    _parse_range_header,
+)
+
+PDF = b"%PDF-1.4\n" + os.urandom(200_000)
+
+
+@pytest.mark.parametrize(
+    "header, expected",
+    [
+        (None, None),
+        ("bytes=0-99", (0, 99)),
+        ("bytes=100-", (100, 999)),
+        ("bytes=-10", (990, 999)),
+        ("bytes=-5000", (0, 999)),
+        ("bytes=900-5000", (900, 999)),
+        # 不支持或语法无效：忽略并返回完整内容
+        ("items=0-1", None),
+        ("bytes=0-1,5-6", None),
+        ("bytes=abc", None),
+        ("bytes=-", None),
+        ("bytes=5-1", None),
+        ("bytes=+1-2", None),
+    ],
+)
+def test_parse_range_header(header, expected):
+    assert _parse_range_header(header, 1000) == expected
+
+
+@pytest.mark.parametrize("header", ["bytes=1000-", "bytes=5000-6000", "bytes=-0"])
+def test_parse_range_header_unsatisfiable(header):
+    with pytest.raises(HTTPException) as excinfo:
+        _parse_range_header(header, 1000)
+    assert excinfo.value.status_code == 416
+    assert excinfo.value.headers["Content-Range"] == "bytes */1000"
+
+
+def test_incremental_hash_matches_payload_hash():
+    hasher = _PdfPayloadHasher()
+    for offset in range(0, len(PDF), 7001):
+        hasher.update(PDF[offset : offset + 7001])
+    assert hasher.hexdigest() == _hash_payload(_build_source_payload("pdf", pdf_bytes=PDF))
+
+
+def test_upload_and_ranged_download(client, user):
+    response = client.post(
+        "/api/health/records/upload",
+        headers=user["headers"],
+        files={"file": ("report.pdf", PDF, "application/pdf")},
+        data={"private_key": user["private_key"], "data_title": "report"},
+    )
+    assert response.status_code == 200, response.text
+    record_id = response.json()["id"]
+    url = f"/api/health/records/{record_id}/pdf"
+    params = {"private_key": user["private_key"]}
+
+    full = client.get(url, headers=user["headers"], params=params)
+    assert full.status_code == 200
+    assert full.content == PDF
+
+    partial = client.get(url, headers={**user["headers"], "Range": "bytes=10-99"}, params=params)
+    assert partial.status_code == 206
+    assert partial.content == PDF[10:100]
+    assert partial.headers["content-range"] == f"bytes 10-99/{len(PDF)}"
+
+    malformed = client.get(url, headers={**user["headers"], "Range": "bytes=oops"}, params=params)
+    assert malformed.status_code == 200
+    assert malformed.content == PDF
+
+    beyond = client.get(url, headers={**user["headers"], "Range": "bytes=999999999-"}, params=params)
+    assert beyond.status_code == 416
+
+
+def test_upload_rejects_non_pdf(client, user):
+    response = client.post(
+        "/api/health/records/upload",
+        headers=user["headers"],
+        files={"file": ("note.pdf", b"hello", "application/pdf")},
+        data={"private_key": user["private_key"]},
+    )
+    assert response.status_code == 400
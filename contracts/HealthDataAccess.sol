@@ -56,6 +56,9 @@ contract HealthDataAccess {
     
     // owner => 该 owner 拥有的全部 dataId 列表
     mapping(address => bytes32[]) public userRecords;
+
+    // 批量写入单笔交易的最大条数，避免超出区块 gas 上限
+    uint256 public constant MAX_BATCH_SIZE = 100;
     
     // 数据授权事件
     event DataStored(
@@ -213,6 +216,52 @@ contract HealthDataAccess {
         
         emit DataUpdated(record.owner, dataId, block.timestamp);
     }
+
+    /**
+     * @dev 批量存储健康数据（一笔交易写入多条，逐条触发 DataStored 事件）
+     * @param dataHashes 数据哈希数组
+     * @param encryptedData 加密数据数组
+     * @param dataTypes 数据类型数组
+     * 注意：dataId 仍由“调用人 + 数据哈希 + 时间”生成，同一批次内 dataHash 不能重复
+     */
+    function storeHealthDataBatch(
+        bytes32[] memory dataHashes,
+        bytes32[] memory encryptedData,
+        string[] memory dataTypes
+    ) public returns (bytes32[] memory dataIds) {
+        require(
+            dataHashes.length == encryptedData.length && dataHashes.length == dataTypes.length,
+            "Length mismatch"
+        );
+        require(dataHashes.length > 0 && dataHashes.length <= MAX_BATCH_SIZE, "Invalid batch size");
+
+        dataIds = new bytes32[](dataHashes.length);
+        for (uint256 i = 0; i < dataHashes.length; i++) {
+            dataIds[i] = storeHealthData(dataHashes[i], encryptedData[i], dataTypes[i]);
+        }
+    }
+
+    /**
+     * @dev 批量更新健康数据（每条单独校验写权限，任一条失败整笔回滚）
+     * @param dataIds 数据ID数组
+     * @param newDataHashes 新的数据哈希数组
+     * @param newEncryptedData 新的加密数据数组
+     */
+    function updateHealthDataBatch(
+        bytes32[] memory dataIds,
+        bytes32[] memory newDataHashes,
+        bytes32[] memory newEncryptedData
+    ) public {
+        require(
+            dataIds.length == newDataHashes.length && dataIds.length == newEncryptedData.length,
+            "Length mismatch"
+        );
+        require(dataIds.length > 0 && dataIds.length <= MAX_BATCH_SIZE, "Invalid batch size");
+
+        for (uint256 i = 0; i < dataIds.length; i++) {
+            updateHealthData(dataIds[i], newDataHashes[i], newEncryptedData[i]);
+        }
+    }
     
     /**
      * @dev 授权访问权限